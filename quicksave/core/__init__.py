@@ -16,6 +16,6 @@ QS_DIR = pathlib.Path.home() / ".quicksave"
 QS_DIR.mkdir(exist_ok=True)
 
 from .snapshot import dump
-from .restore  import restore, verify_only
+from .restore  import restore, restore_headless, verify_only
 
-__all__ = ["dump", "restore", "verify_only", "QS_DIR"]
\ No newline at end of file
+__all__ = ["dump", "restore", "restore_headless", "verify_only", "QS_DIR"]
\ No newline at end of file
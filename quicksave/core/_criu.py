@@ -3,7 +3,10 @@
 非 root 时自动插入 --unprivileged，并去掉需要特权的选项。
 """
 import os
-from typing import List
+import pathlib
+from typing import Dict, List
+
+from quicksave.utils import protobuf as pb
 
 _ROOT_ONLY = {"--tcp-established", "--track-mem"}
 
@@ -15,4 +18,24 @@ def build(*args: str) -> List[str]:
         cmd = [str(a) for a in cmd if a not in _ROOT_ONLY]
     else:
         cmd = [str(a) for a in cmd]
-    return cmd
\ No newline at end of file
+    return cmd
+
+
+def dump_stats(images_dir: pathlib.Path) -> Dict[str, float]:
+    """
+    读取 CRIU 写在镜像目录中的 stats-dump，返回各阶段耗时（秒）：
+    freezing（停住并 seize 全部任务）、frozen（任务被冻结的总时长）、memdump、memwrite。
+    文件不存在或无法解析时返回空字典。
+    """
+    try:
+        data = (images_dir / "stats-dump").read_bytes()
+        entry = next(pb.entries(data), None)
+        stats = pb.first(pb.decode(entry), 1) if entry is not None else None
+    except (OSError, ValueError, IndexError):
+        return {}
+    if stats is None:
+        return {}
+    fields = pb.decode(stats)
+    names = {1: "freezing", 2: "frozen", 3: "memdump", 4: "memwrite"}
+    return {name: pb.first(fields, num) / 1e6 for num, name in names.items()
+            if pb.first(fields, num) is not None}
@@ -0,0 +1,40 @@
+"""
+扇出恢复时每个 PID 命名空间中的 init（由 unshare --pid --fork 以 PID 1 运行）。
+
+以 -d 方式运行传入的 criu restore 命令，把结果写到标准输出：
+    ready <命名空间内的 PID>      或      failed <返回码>
+随后留在命名空间中回收孤儿进程；恢复出的进程全部退出后结束，命名空间随之销毁。
+
+用法：python _nsinit.py <pidfile> criu restore ...（直接按路径运行，不导入 quicksave）
+"""
+import os
+import subprocess
+import sys
+
+
+def main() -> int:
+    pidfile, cmd = sys.argv[1], sys.argv[2:]
+    rc = subprocess.run(cmd, stdin=subprocess.DEVNULL).returncode
+    if rc != 0:
+        print(f"failed {rc}", flush=True)
+        return rc
+    try:
+        with open(pidfile, "r") as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        print("failed pidfile", flush=True)
+        return 1
+    print(f"ready {pid}", flush=True)
+    sys.stdout.close()
+    # criu -d 退出后，恢复出的进程树由本进程（命名空间的 init）接管
+    while True:
+        try:
+            os.wait()
+        except ChildProcessError:
+            return 0
+        except InterruptedError:
+            continue
+
+
+if __name__ == "__main__":
+    sys.exit(main())
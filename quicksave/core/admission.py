@@ -0,0 +1,220 @@
+"""
+全机范围的快照任务准入队列。
+
+监控线程、调度线程、GUI、托盘以及任意多个 `quicksave dump` 进程都通过这里排队，
+基于 QS_DIR/locks 下的文件锁实现，不需要常驻服务：
+- slot-<n>.lock   同时运行的任务数上限（admission.max_concurrent）
+- queue/*.ticket  等待中的任务，文件名按 优先级-时间 排序，持有者退出后锁自动释放
+- tree-*.lock     同一进程树同一时刻只允许一个任务，任务结束时删除
+"""
+import asyncio
+import contextlib
+import fcntl
+import os
+import pathlib
+import time
+from typing import List
+
+from quicksave.utils import metrics
+from quicksave.utils.config import get_section
+from quicksave.utils.logger import log
+from . import QS_DIR
+
+__all__ = ["PRIORITIES", "AdmissionError", "admit", "admit_async", "idle"]
+
+# 数值越小越优先：交互 > 定时 > 自动
+PRIORITIES = {"interactive": 0, "scheduled": 1, "auto": 2}
+
+LOCK_DIR = QS_DIR / "locks"
+DEFAULTS = {
+    "max_concurrent": 1,
+    "poll_interval": 0.2,
+}
+
+_WAIT_SECONDS = metrics.histogram("quicksave_admission_wait_seconds",
+                                  "Time a snapshot job waited for an admission slot", ("priority",))
+_QUEUE_DEPTH = metrics.gauge("quicksave_admission_queue_depth",
+                             "Snapshot jobs waiting for an admission slot (host-wide)")
+_RUNNING = metrics.gauge("quicksave_admission_running",
+                         "Snapshot jobs admitted by this process and still running")
+
+
+class AdmissionError(RuntimeError):
+    """同一进程树已有快照任务在运行"""
+
+
+def _flock(path: pathlib.Path, mode: int):
+    """打开并以非阻塞方式加锁；失败返回 None"""
+    f = open(path, "a+")
+    try:
+        fcntl.flock(f, mode | fcntl.LOCK_NB)
+        return f
+    except OSError:
+        f.close()
+        return None
+
+
+def _flock_path(path: pathlib.Path, mode: int):
+    """
+    同 _flock，并确认加锁的仍是该路径上的文件：释放者会在持锁时删除锁文件，
+    打开后、加锁前文件被删除时换成新文件重试。
+    """
+    while True:
+        f = _flock(path, mode)
+        if f is None:
+            return None
+        try:
+            if os.stat(path).st_ino == os.fstat(f.fileno()).st_ino:
+                return f
+        except FileNotFoundError:
+            pass
+        f.close()
+
+
+def _tree_key(pid: int) -> str:
+    """进程树标识：leader PID + 启动时间，避免 PID 复用造成误判"""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            start = f.read().rsplit(")", 1)[1].split()[19]
+        return f"{pid}-{start}"
+    except (OSError, IndexError):
+        return str(pid)
+
+
+class _Ticket:
+    def __init__(self, pids: List[int], priority: str):
+        if priority not in PRIORITIES:
+            raise ValueError(f"unknown priority: {priority}")
+        self.priority = priority
+        self.cfg = get_section("admission", DEFAULTS)
+        self.queue_dir = LOCK_DIR / "queue"
+        self.queue_dir.mkdir(parents=True, exist_ok=True)
+        self.tree_lock = None
+        self.tree_path = LOCK_DIR / f"tree-{_tree_key(pids[0])}.lock"
+        self.slot = None
+        self.ticket_file = None
+        self.ticket_path = None
+        self.t0 = time.monotonic()
+
+        self.tree_lock = _flock_path(self.tree_path, fcntl.LOCK_EX)
+        if self.tree_lock is None:
+            raise AdmissionError(f"进程树 {pids[0]} 已有快照任务在运行")
+
+        name = f"{PRIORITIES[priority]}-{time.time_ns():020d}-{os.getpid()}-{id(self):x}.ticket"
+        try:
+            self._enqueue(name)
+        except BaseException:
+            self.release()
+            raise
+
+    def _enqueue(self, name: str) -> None:
+        """
+        在队列目录外创建票据并加锁，再改名进入队列：其它等待者看到的票据总是
+        已加锁的，不会在加锁前把它当作持有者已退出的票据删除。
+        """
+        staging = LOCK_DIR / f".{name}"
+        f = _flock(staging, fcntl.LOCK_EX)
+        if f is None:
+            raise OSError(f"无法锁定排队票据 {staging}")
+        self.ticket_path = self.queue_dir / name
+        os.rename(staging, self.ticket_path)
+        self.ticket_file = f
+
+    def _live_tickets(self) -> List[str]:
+        """列出仍有持有者的排队票据，顺带清理持有者已退出的票据"""
+        live = []
+        for p in sorted(self.queue_dir.glob("*.ticket")):
+            if p == self.ticket_path:
+                live.append(p.name)
+                continue
+            probe = _flock(p, fcntl.LOCK_SH)
+            if probe is None:
+                live.append(p.name)
+            else:
+                probe.close()
+                p.unlink(missing_ok=True)
+        return live
+
+    def try_admit(self) -> bool:
+        live = self._live_tickets()
+        _QUEUE_DEPTH.set(len(live))
+        limit = max(1, int(self.cfg["max_concurrent"]))
+        if self.ticket_path.name not in live:
+            # 票据被外部删除（例如手动清理队列目录）：以原名重新排队，保留原来的位置
+            log.warning("排队票据 %s 已丢失，重新排队", self.ticket_path.name)
+            self._drop_ticket()
+            self._enqueue(self.ticket_path.name)
+            return False
+        if live.index(self.ticket_path.name) >= limit:
+            return False
+        for n in range(limit):
+            slot = _flock(LOCK_DIR / f"slot-{n}.lock", fcntl.LOCK_EX)
+            if slot is not None:
+                self.slot = slot
+                waited = time.monotonic() - self.t0
+                _WAIT_SECONDS.observe(waited, priority=self.priority)
+                _RUNNING.inc()
+                self._drop_ticket()
+                if waited > 1:
+                    log.info("快照任务排队 %.1f s 后开始（优先级 %s）", waited, self.priority)
+                return True
+        return False
+
+    def _drop_ticket(self):
+        if self.ticket_file is not None:
+            self.ticket_path.unlink(missing_ok=True)
+            self.ticket_file.close()
+            self.ticket_file = None
+
+    def release(self):
+        self._drop_ticket()
+        if self.slot is not None:
+            self.slot.close()
+            self.slot = None
+            _RUNNING.dec()
+        if self.tree_lock is not None:
+            # 持锁时删除，等待者会发现所锁的文件已不在原路径上并重试（见 _flock_path）
+            self.tree_path.unlink(missing_ok=True)
+            self.tree_lock.close()
+            self.tree_lock = None
+
+
+def idle() -> bool:
+    """全机没有正在运行或排队的快照任务（供后台维护任务判断空闲）"""
+    if not LOCK_DIR.exists():
+        return True
+    for p in [*LOCK_DIR.glob("slot-*.lock"), *(LOCK_DIR / "queue").glob("*.ticket")]:
+        try:
+            f = open(p, "r")               # 不用 _flock：它会重新创建刚被删除的票据
+        except OSError:
+            continue
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except OSError:
+                return False
+    return True
+
+
+@contextlib.contextmanager
+def admit(pids: List[int], priority: str = "interactive"):
+    """阻塞直到获得运行名额；同一进程树已在运行时抛出 AdmissionError"""
+    ticket = _Ticket(pids, priority)
+    try:
+        while not ticket.try_admit():
+            time.sleep(ticket.cfg["poll_interval"])
+        yield
+    finally:
+        ticket.release()
+
+
+@contextlib.asynccontextmanager
+async def admit_async(pids: List[int], priority: str = "interactive"):
+    """admit() 的协程版本，等待期间不阻塞事件循环"""
+    ticket = _Ticket(pids, priority)
+    try:
+        while not ticket.try_admit():
+            await asyncio.sleep(ticket.cfg["poll_interval"])
+        yield
+    finally:
+        ticket.release()
@@ -0,0 +1,372 @@
+"""
+基于 asyncio 的 dump / restore / verify。
+
+与同步版本行为一致，但子进程由 asyncio.create_subprocess_exec 启动，
+一个事件循环即可驱动大量并发操作。每个操作可以传入 progress 回调
+（或用 stream() 以异步迭代器形式获取进度）；任务被取消时，
+CRIU 进程所在的进程组会被一并杀掉，线程池中的打包/解包在下一个数据块处中止。
+"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import os
+import pathlib
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from time import perf_counter
+from typing import AsyncIterator, Callable, List, NamedTuple
+
+from quicksave.utils import fileio, governor, metrics, zdict
+from quicksave.utils.compress import compress_dir, decompress_file
+from quicksave.utils.logger import log, log_context
+from . import outcomes
+from ._criu import build as criu_cmd
+from .admission import admit_async
+from .cache import get_cache
+from .refs import pick_reference
+from .restore import _PIDFILE, _fix_permissions
+from .freezer import CgroupFreezer, enabled as freezer_enabled
+from .snapshot import snapshot_path, _freeze, _published, _record_phases, _record_sizes
+
+__all__ = ["Progress", "dump_async", "restore_async", "verify_async", "stream"]
+
+
+class Progress(NamedTuple):
+    phase: str               # criu-dump / compress / decompress / criu-restore / done
+    done: int = 0            # 已处理字节数
+    total: int | None = None
+    eta: float | None = None  # 预计剩余秒数
+    result: object = None     # 仅 done 事件携带操作结果
+
+
+ProgressCallback = Callable[[Progress], None]
+
+
+class _Reporter:
+    """把字节计数换算成带 ETA 的 Progress 事件"""
+
+    def __init__(self, callback: ProgressCallback | None, phase: str, total: int | None):
+        self.callback = callback
+        self.phase = phase
+        self.total = total
+        self.done = 0
+        self.t0 = time.monotonic()
+        self.emit()
+
+    def advance(self, n: int):
+        self.done += n
+        self.emit()
+
+    def emit(self):
+        if self.callback is None:
+            return
+        eta = None
+        elapsed = time.monotonic() - self.t0
+        # 预估的总量可能略小于实际处理的字节数
+        self.total = max(self.total, self.done) if self.total else self.total
+        if self.total and self.done and elapsed > 0:
+            eta = max(0.0, (self.total - self.done) / (self.done / elapsed))
+        self.callback(Progress(self.phase, self.done, self.total, eta))
+
+
+def _killpg(proc: asyncio.subprocess.Process):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _spawn(*cmd, governed: bool = False, **kwargs) -> asyncio.subprocess.Process:
+    """
+    每个子进程单独成为进程组组长，取消时可以整组杀掉。
+    governed 为 True 时放入资源调控（见 governor）。
+    """
+    cmd = [str(c) for c in cmd]
+    if governed:
+        cmd, kwargs["preexec_fn"] = governor.wrap(cmd)
+    log.debug("执行命令: %s", " ".join(cmd))
+    return await asyncio.create_subprocess_exec(*cmd, start_new_session=True, **kwargs)
+
+
+async def _abort(procs: List[asyncio.subprocess.Process]):
+    """杀掉所有进程组并回收子进程（不受再次取消影响）"""
+    for p in procs:
+        _killpg(p)
+    await asyncio.shield(asyncio.gather(*(p.wait() for p in procs), return_exceptions=True))
+
+
+async def _wait_all(procs: List[asyncio.subprocess.Process], what: str):
+    """等待子进程结束；被取消时杀掉所有进程组；任一失败则抛出异常"""
+    try:
+        codes = await asyncio.gather(*(p.wait() for p in procs))
+    except asyncio.CancelledError:
+        await _abort(procs)
+        raise
+    if any(codes):
+        raise RuntimeError(f"{what} 失败，返回码 {codes}")
+
+
+async def _run(cmd: List[str], what: str, governed: bool = False) -> bytes:
+    proc = await _spawn(*cmd, governed=governed, stdin=asyncio.subprocess.DEVNULL,
+                        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    try:
+        _out, err = await proc.communicate()
+    except asyncio.CancelledError:
+        await _abort([proc])
+        raise
+    if proc.returncode != 0:
+        raise RuntimeError(f"{what} 失败: {err.decode('utf-8', errors='ignore').strip()}")
+    return _out
+
+
+# ---------- 压缩 / 解压 ----------
+async def _in_thread(func, *args, rep: _Reporter) -> None:
+    """
+    在线程池中运行 compress_dir / decompress_file，进度转发回事件循环。
+    被取消时通过进度回调中止工作线程，并等待其退出后再向上抛出。
+    """
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+
+    def tick(n: int):
+        if cancelled.is_set():
+            raise asyncio.CancelledError()
+        loop.call_soon_threadsafe(rep.advance, n)
+
+    # 线程池不继承 contextvars，显式复制以保留日志中的快照 / 阶段信息
+    ctx = contextvars.copy_context()
+    fut = loop.run_in_executor(None, ctx.run, functools.partial(func, *args, progress=tick))
+    try:
+        await asyncio.shield(fut)
+    except asyncio.CancelledError:
+        cancelled.set()
+        with contextlib.suppress(BaseException):
+            await fut
+        raise
+
+
+async def _compress_async(src_dir: pathlib.Path, dst_file: pathlib.Path,
+                          progress: ProgressCallback | None, app: str | None = None,
+                          ref: pathlib.Path | None = None) -> None:
+    rep = _Reporter(progress, "compress", metrics.dir_size(src_dir))
+    await _in_thread(functools.partial(compress_dir, ref=ref), src_dir, dst_file, app, rep=rep)
+
+
+async def _decompress_async(qsnap: pathlib.Path, dst_dir: pathlib.Path,
+                            progress: ProgressCallback | None) -> None:
+    """进度按读入的压缩字节计算"""
+    rep = _Reporter(progress, "decompress", qsnap.stat().st_size)
+    await _in_thread(decompress_file, qsnap, dst_dir, rep=rep)
+
+
+@contextlib.asynccontextmanager
+async def _lease(path: pathlib.Path):
+    """fileio.lease 的协程版本：在线程中等待 flock，不阻塞事件循环"""
+    lease = fileio.lease(path)
+    fut = asyncio.ensure_future(asyncio.to_thread(lease.__enter__))
+    try:
+        await asyncio.shield(fut)
+    except asyncio.CancelledError:
+        # 线程仍在等待租约，拿到后立即释放
+        def release(f: asyncio.Future):
+            if not f.cancelled() and f.exception() is None:
+                lease.__exit__(None, None, None)
+        fut.add_done_callback(release)
+        raise
+    try:
+        yield
+    finally:
+        lease.__exit__(None, None, None)
+
+
+async def _extract_async(op: str, qsnap: pathlib.Path, workdir: pathlib.Path,
+                         progress: ProgressCallback | None) -> None:
+    loop = asyncio.get_running_loop()
+    cache = get_cache()
+    async with _lease(qsnap):
+        if cache is not None and await loop.run_in_executor(None, cache.checkout, qsnap, workdir):
+            return
+        await _decompress_async(qsnap, workdir, progress)
+        # 命中缓存时镜像与缓存共享 inode，只在解压后、写入缓存前修复权限
+        await asyncio.to_thread(_fix_permissions, workdir)
+        metrics.BYTES_IN.inc(qsnap.stat().st_size, op=op)
+        metrics.BYTES_OUT.inc(metrics.dir_size(workdir), op=op)
+        if cache is not None:
+            await loop.run_in_executor(None, cache.store, qsnap, workdir)
+
+
+async def _criu_restore_async(workdir: pathlib.Path, with_pty: bool) -> int:
+    pidfile = workdir / _PIDFILE
+    base = criu_cmd("restore", "-D", str(workdir), "--shell-job", "--ext-unix-sk",
+                    "-d", "--pidfile", str(pidfile), "-o", "restore.log")
+    cmd = (["script", "-q", "-c", " ".join(base), "/dev/null"]
+           if with_pty and os.geteuid() == 0 else base)
+    # 验证用的恢复（with_pty）受资源调控，正式恢复不受限制
+    await _run(cmd, "criu restore", governed=with_pty)
+    return int(pidfile.read_text().strip())
+
+
+# ---------- 公共接口 ----------
+async def dump_async(pids: List[int], label: str | None = None,
+                     progress: ProgressCallback | None = None,
+                     priority: str = "interactive",
+                     freeze_cgroup: bool | None = None) -> pathlib.Path:
+    """dump() 的协程版本"""
+    if not pids:
+        raise ValueError("pids list cannot be empty")
+    async with admit_async(pids, priority):
+        out_file = snapshot_path(label)
+        with log_context(snapshot=out_file.name):
+            return await _dump_async(pids, out_file, label, progress,
+                                     freezer_enabled(freeze_cgroup))
+
+
+async def _dump_async(pids: List[int], out_file: pathlib.Path, label: str | None,
+                      progress: ProgressCallback | None, freeze_cgroup: bool) -> pathlib.Path:
+    tmp_dump = pathlib.Path(tempfile.mkdtemp(prefix="qs_dmp_"))
+    leader = str(pids[0])
+    t0 = perf_counter()
+    ok = False
+    try:
+        app = await asyncio.to_thread(zdict.app_key, pids[0])
+        ref = await asyncio.to_thread(pick_reference, app, label)
+        prof = await asyncio.to_thread(outcomes.profile, pids)
+        _Reporter(progress, "criu-dump", None)
+        fz = await asyncio.to_thread(CgroupFreezer.prepare, pids[0]) if freeze_cgroup else None
+        extra = fz.criu_args() if fz is not None else []
+        freeze = None
+        dumped = False
+        try:
+            if os.geteuid() == 0:
+                await _run(criu_cmd("pre-dump", "-t", leader, "-D", tmp_dump,
+                                    "--track-mem", "--shell-job", *extra), "criu pre-dump")
+                t_freeze = perf_counter()
+                if fz is not None:
+                    freeze = await asyncio.to_thread(_freeze, fz)
+                await _run(criu_cmd("dump", "-t", leader, "-D", tmp_dump, "--shell-job",
+                                    "--tcp-established", "--ext-unix-sk", *extra), "criu dump")
+            else:
+                t_freeze = perf_counter()
+                if fz is not None:
+                    freeze = await asyncio.to_thread(_freeze, fz)
+                await _run(criu_cmd("dump", "-t", leader, "-D", tmp_dump,
+                                    "--shell-job", "--ext-unix-sk", *extra), "criu dump")
+            dumped = True
+        except RuntimeError as e:
+            await asyncio.to_thread(outcomes.record, "dump", False, prof, error=str(e))
+            raise
+        finally:
+            if fz is not None:
+                await asyncio.to_thread(fz.release, dumped)
+        metrics.FREEZE_SECONDS.observe(perf_counter() - t_freeze)
+        _record_phases(tmp_dump, "cgroup" if fz is not None else "ptrace", freeze)
+
+        image_bytes = metrics.dir_size(tmp_dump)
+        await _compress_async(tmp_dump, out_file, progress, app, ref)
+        _record_sizes(image_bytes, out_file)
+        ok = True
+    except BaseException:
+        out_file.unlink(missing_ok=True)
+        raise
+    finally:
+        shutil.rmtree(tmp_dump, ignore_errors=True)
+        metrics.record_op("dump", ok, perf_counter() - t0)
+    if progress:
+        size = out_file.stat().st_size
+        progress(Progress("done", size, size, 0.0, out_file))
+    log.info("async dump finished => %s", out_file)
+    await asyncio.to_thread(outcomes.record, "dump", True, prof, snapshot=out_file.name)
+    _published(out_file)
+    return out_file
+
+
+async def restore_async(qsnap: pathlib.Path,
+                        progress: ProgressCallback | None = None) -> int:
+    """无终端恢复的协程版本，返回恢复出的进程 PID；失败时抛出异常"""
+    with log_context(snapshot=qsnap.name):
+        return await _restore_async(qsnap, progress)
+
+
+async def _restore_async(qsnap: pathlib.Path, progress: ProgressCallback | None) -> int:
+    if not qsnap.exists():
+        raise FileNotFoundError(qsnap)
+    cache = get_cache()
+    tmp = cache.workdir("qs_res_") if cache else pathlib.Path(tempfile.mkdtemp(prefix="qs_res_"))
+    t0 = perf_counter()
+    ok = False
+    try:
+        await _extract_async("restore", qsnap, tmp, progress)
+        _Reporter(progress, "criu-restore", None)
+        pid = await _criu_restore_async(tmp, with_pty=False)
+        ok = True
+        if progress:
+            progress(Progress("done", result=pid))
+        log.info("async restore finished: %s => pid %d", qsnap.name, pid)
+        return pid
+    finally:
+        await asyncio.to_thread(outcomes.record, "restore", ok, snapshot=qsnap.name,
+                                error=tmp / "restore.log")
+        shutil.rmtree(tmp, ignore_errors=True)
+        metrics.record_op("restore", ok, perf_counter() - t0)
+
+
+async def verify_async(qsnap: pathlib.Path,
+                       progress: ProgressCallback | None = None) -> bool:
+    """verify_only() 的协程版本"""
+    with log_context(snapshot=qsnap.name):
+        return await _verify_async(qsnap, progress)
+
+
+async def _verify_async(qsnap: pathlib.Path, progress: ProgressCallback | None) -> bool:
+    cache = get_cache()
+    tmp = cache.workdir("qs_ver_") if cache else pathlib.Path(tempfile.mkdtemp(prefix="qs_ver_"))
+    t0 = perf_counter()
+    ok = False
+    try:
+        await _extract_async("verify", qsnap, tmp, progress)
+        _Reporter(progress, "criu-restore", None)
+        pid = await _criu_restore_async(tmp, with_pty=True)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        ok = True
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        log.error("验证快照失败: %s", e)
+    finally:
+        await asyncio.to_thread(outcomes.record, "verify", ok, snapshot=qsnap.name,
+                                error=tmp / "restore.log")
+        shutil.rmtree(tmp, ignore_errors=True)
+        metrics.record_op("verify", ok, perf_counter() - t0)
+    if progress:
+        progress(Progress("done", result=ok))
+    return ok
+
+
+async def stream(func, *args, **kwargs) -> AsyncIterator[Progress]:
+    """
+    以异步迭代器形式运行 dump_async / restore_async / verify_async：
+        async for ev in stream(dump_async, [pid]):
+            ...
+    最后一个事件的 phase 为 "done"，其 result 为操作结果；操作失败时迭代抛出异常。
+    提前退出迭代会取消该操作。
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    task = asyncio.ensure_future(func(*args, progress=queue.put_nowait, **kwargs))
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while True:
+            ev = await queue.get()
+            if ev is None:
+                break
+            yield ev
+        task.result()
+    finally:
+        if not task.done():
+            task.cancel()
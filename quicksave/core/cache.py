@@ -0,0 +1,173 @@
+"""
+恢复缓存：保留最近 / 最常恢复的快照解压后的镜像目录。
+
+缓存以 .qsnap 的内容哈希为键，快照被改写后自动失效；总大小受 max_bytes 约束，
+超出时优先淘汰只被恢复过一次的条目，其次按最久未使用淘汰。
+命中时把镜像硬链接进 CRIU 的工作目录并对页镜像发出 WILLNEED 预读，
+从而完全跳过 decompress_file。条目与工作目录共享 inode，写入缓存前镜像的权限
+已经修复好，命中后不应再修改。
+"""
+import fcntl
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from quicksave.utils import metrics
+from quicksave.utils.config import get_section
+from quicksave.utils.digest import file_digest
+from quicksave.utils.logger import log
+from . import QS_DIR
+
+__all__ = ["RestoreCache", "get_cache"]
+
+DEFAULTS = {
+    "enabled": False,
+    "max_bytes": 8 << 30,
+    "dir": str(QS_DIR / "cache"),
+}
+
+_HITS = metrics.counter("quicksave_restore_cache_requests_total",
+                        "Restore cache lookups by result", ("result",))
+_BYTES = metrics.gauge("quicksave_restore_cache_bytes",
+                       "Bytes held by the restore cache")
+
+
+def _link_tree(src: pathlib.Path, dst: pathlib.Path, link: bool = True) -> None:
+    """把 src 下的文件硬链接到 dst；跨文件系统或 link 为 False 时复制"""
+    for root, dirs, files in os.walk(src):
+        rel = pathlib.Path(root).relative_to(src)
+        for d in dirs:
+            (dst / rel / d).mkdir(exist_ok=True)
+        for f in files:
+            s, d = pathlib.Path(root) / f, dst / rel / f
+            try:
+                if link:
+                    os.link(s, d)
+                    continue
+            except OSError:
+                pass
+            shutil.copy2(s, d)
+
+
+def _readahead(workdir: pathlib.Path) -> None:
+    """对页镜像（其次是其它镜像）发出 POSIX_FADV_WILLNEED"""
+    files = sorted(workdir.rglob("*.img"),
+                   key=lambda p: not p.name.startswith("pages-"))
+    for path in files:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+class RestoreCache:
+    def __init__(self, root: pathlib.Path, max_bytes: int):
+        self.root = pathlib.Path(root)
+        self.max_bytes = int(max_bytes)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_file = self.root / "index.json"
+
+    # ---------- 索引 ----------
+    @contextmanager
+    def _index(self):
+        """在文件锁下读写索引，允许多个 quicksave 进程共享同一缓存"""
+        with open(self.index_file, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                index = json.loads(f.read() or "{}")
+            except ValueError:
+                index = {}
+            yield index
+            f.seek(0)
+            f.truncate()
+            json.dump(index, f, indent=1)
+        _BYTES.set(sum(e["size"] for e in index.values()))
+
+    def workdir(self, prefix: str) -> pathlib.Path:
+        """在缓存所在文件系统上创建工作目录，使硬链接可用"""
+        work = self.root / ".work"
+        work.mkdir(exist_ok=True)
+        return pathlib.Path(tempfile.mkdtemp(prefix=prefix, dir=work))
+
+    # ---------- 查询 / 写入 ----------
+    def checkout(self, qsnap: pathlib.Path, dst: pathlib.Path, link: bool = True) -> bool:
+        """
+        命中时把镜像放入 dst 并预读，返回 True；未命中返回 False。
+        link 为 False 时复制而不是硬链接，调用者可以修改 dst 中文件的权限。
+        """
+        key = file_digest(qsnap)
+        entry_dir = self.root / key
+        with self._index() as index:
+            entry = index.get(key)
+            if entry is None or not entry_dir.is_dir():
+                index.pop(key, None)
+                _HITS.inc(result="miss")
+                return False
+            entry["hits"] += 1
+            entry["last_used"] = time.time()
+            # _evict 同样持有索引锁：在锁内链接，条目不会在链接途中被删除。
+            # 复制较慢，先在锁内链接出一份固定住 inode，再在锁外复制
+            target = dst if link else pathlib.Path(
+                tempfile.mkdtemp(prefix=f".{key[:12]}_pin_", dir=self.root))
+            _link_tree(entry_dir, target)
+        if not link:
+            try:
+                _link_tree(target, dst, link=False)
+            finally:
+                shutil.rmtree(target, ignore_errors=True)
+        _readahead(dst)
+        _HITS.inc(result="hit")
+        log.info("恢复缓存命中: %s (%s)", qsnap.name, key[:12])
+        return True
+
+    def store(self, qsnap: pathlib.Path, src: pathlib.Path, link: bool = True) -> None:
+        """把刚解压出的镜像目录纳入缓存，必要时淘汰旧条目；link 的含义同 checkout"""
+        key = file_digest(qsnap)
+        size = metrics.dir_size(src)
+        if size > self.max_bytes:
+            log.info("镜像 %.1f MiB 超过缓存上限，不缓存", size / 2**20)
+            return
+        staging = pathlib.Path(tempfile.mkdtemp(prefix=f".{key[:12]}_", dir=self.root))
+        _link_tree(src, staging, link)
+        with self._index() as index:
+            if key in index and (self.root / key).is_dir():
+                shutil.rmtree(staging, ignore_errors=True)
+                return
+            self._evict(index, self.max_bytes - size)
+            os.replace(staging, self.root / key)
+            index[key] = {"size": size, "hits": 1, "last_used": time.time(),
+                          "source": qsnap.name}
+        log.info("已缓存解压镜像: %s (%.1f MiB)", qsnap.name, size / 2**20)
+
+    def _evict(self, index: dict, budget: int) -> None:
+        used = sum(e["size"] for e in index.values())
+        # 只恢复过一次的先淘汰，其余按最久未使用
+        for key in sorted(index, key=lambda k: (index[k]["hits"] > 1, index[k]["last_used"])):
+            if used <= budget:
+                break
+            log.info("淘汰恢复缓存: %s", index[key].get("source", key))
+            shutil.rmtree(self.root / key, ignore_errors=True)
+            used -= index.pop(key)["size"]
+
+
+def get_cache() -> RestoreCache | None:
+    """按配置返回恢复缓存；未启用时返回 None"""
+    cfg = get_section("restore_cache", DEFAULTS)
+    if not cfg["enabled"]:
+        return None
+    try:
+        return RestoreCache(pathlib.Path(cfg["dir"]).expanduser(), cfg["max_bytes"])
+    except OSError as e:
+        log.warning("恢复缓存不可用: %s", e)
+        return None
@@ -1,11 +1,18 @@
 import argparse
+import json
 import sys
 import pathlib
+from datetime import datetime
 
+from quicksave.utils import fileio
 from .snapshot import dump
-from .restore import restore, verify_only
+from .restore import restore, restore_headless, verify_only
 from .compat import check_compatibility, explain_compat
 from .proctree import get_process_tree
+from .verify import parse_since, select_snapshots, verify_many
+from .inspector import inspect_snapshot, format_report
+from . import hibernate, outcomes
+from .fanout import restore_instances
 
 def parse() -> argparse.Namespace:
     p = argparse.ArgumentParser("quicksave")
@@ -14,10 +21,47 @@ def parse() -> argparse.Namespace:
     d = sub.add_parser("dump", help="dump <pid> …")
     d.add_argument("pid", nargs="+", type=int)
     d.add_argument("--compat", action="store_true", help="check compatibility before dump")
+    d.add_argument("--freeze-cgroup", action="store_true", default=None,
+                   help="freeze the tree via a cgroup instead of ptrace seize")
 
     r = sub.add_parser("restore", help="restore <qsnap>")
     r.add_argument("file", type=str)
     r.add_argument("--verify", action="store_true")
+    r.add_argument("--headless", action="store_true",
+                   help="run criu directly instead of opening a terminal")
+    r.add_argument("--instances", type=int, metavar="N",
+                   help="restore N instances, each in its own PID namespace (root)")
+    r.add_argument("--parallel", type=int, help="concurrent restores with --instances")
+    r.add_argument("--net-ns", action="store_true", default=None,
+                   help="also give each instance its own network namespace")
+    r.add_argument("--json", action="store_true", help="print --instances results as JSON")
+
+    v = sub.add_parser("verify", help="verify [qsnap …] | --all | --label L | --since T")
+    v.add_argument("file", nargs="*", type=str)
+    v.add_argument("--all", action="store_true", help="verify every snapshot in QS_DIR")
+    v.add_argument("--label", type=str, help="only snapshots named <label>_*")
+    v.add_argument("--since", type=parse_since, help="only snapshots newer than 2h/3d/ISO date")
+    v.add_argument("-j", "--jobs", type=int, help="concurrency (default: sized to CPU and RAM)")
+    v.add_argument("--force", action="store_true", help="ignore cached verdicts")
+    v.add_argument("--json", action="store_true", help="print results as JSON")
+
+    i = sub.add_parser("inspect", help="inspect <qsnap | image dir>")
+    i.add_argument("file", type=str)
+    i.add_argument("--json", action="store_true", help="print the report as JSON")
+    i.add_argument("--vmas", action="store_true", help="list VMAs of every process")
+
+    h = sub.add_parser("hibernate", help="hibernate <pid> … (dump and stop, listed as hibernated)")
+    h.add_argument("pid", nargs="+", type=int)
+
+    hl = sub.add_parser("hibernated", help="list hibernated processes")
+    hl.add_argument("--json", action="store_true", help="print the list as JSON")
+
+    w = sub.add_parser("wake", help="wake <snapshot> … | --all")
+    w.add_argument("snapshot", nargs="*", type=str, help="snapshot file name or path")
+    w.add_argument("--all", action="store_true", help="wake every hibernated process")
+
+    c = sub.add_parser("compat", help="list learned compatibility per application")
+    c.add_argument("--json", action="store_true", help="print the list as JSON")
     return p.parse_args()
 
 def main() -> None:
@@ -29,15 +73,101 @@ def main() -> None:
         if ns.compat:
             report = check_compatibility(all_pids)
             print(explain_compat(report))
-            if ("通过" not in explain_compat(report)):
+            risky = "通过" not in explain_compat(report)
+            prof = outcomes.profile(ns.pid)
+            if prof is not None:
+                cfg = outcomes.settings()
+                pred = outcomes.predict(prof)
+                print(f"历史记录预测成功率 {pred['probability']:.0%}"
+                      f"（{prof['key']}，{pred['samples']} 次记录）")
+                for sig in pred["errors"]:
+                    print(f"  常见错误: {sig}")
+                # 记录足够时以实际结果为准
+                if pred["samples"] >= int(cfg["min_samples"]):
+                    risky = pred["probability"] < float(cfg["deprioritize_below"])
+            if risky:
                 print("强制快照风险较高，是否继续？(y/N): ", end="")
                 if input().strip().lower() != "y":
                     sys.exit(1)
-        dump(ns.pid)
+        dump(ns.pid, freeze_cgroup=ns.freeze_cgroup)
     elif ns.cmd == "restore":
         path = pathlib.Path(ns.file).expanduser()
-        ok = verify_only(path) if ns.verify else restore(path)
+        if ns.instances:
+            results = restore_instances(path, ns.instances, ns.parallel, ns.net_ns)
+            if ns.json:
+                print(json.dumps(results, indent=2, ensure_ascii=False))
+            else:
+                for r in results:
+                    if r["ok"]:
+                        print(f"{r['instance']:>3} OK   pid {r['pid']}  {r['ready_seconds']:.3f} s")
+                    else:
+                        print(f"{r['instance']:>3} FAIL {r['error']}")
+            ok = all(r["ok"] for r in results)
+        elif ns.verify:
+            ok = verify_only(path)
+        elif ns.headless:
+            pid = restore_headless(path)
+            if pid is not None:
+                print(pid)
+            ok = pid is not None
+        else:
+            ok = restore(path)
+        sys.exit(0 if ok else 1)
+    elif ns.cmd == "verify":
+        paths = [pathlib.Path(f).expanduser() for f in ns.file]
+        if ns.all or ns.label or ns.since or not paths:
+            paths += select_snapshots(ns.label, ns.since)
+        results = verify_many(paths, jobs=ns.jobs, force=ns.force)
+        if ns.json:
+            print(json.dumps(results, indent=2, ensure_ascii=False))
+        else:
+            for r in results:
+                state = "OK  " if r["ok"] else "FAIL"
+                note = " (cached)" if r["cached"] else ""
+                print(f"{state} {r['path']}{note}")
+        sys.exit(0 if all(r["ok"] for r in results) else 1)
+    elif ns.cmd == "inspect":
+        report = inspect_snapshot(pathlib.Path(ns.file).expanduser())
+        if ns.json:
+            print(json.dumps(report, indent=2, ensure_ascii=False))
+        else:
+            print(format_report(report, vmas=ns.vmas))
+    elif ns.cmd == "hibernate":
+        for pid in ns.pid:
+            print(hibernate.hibernate(pid))
+    elif ns.cmd == "hibernated":
+        entries = hibernate.hibernated()
+        if ns.json:
+            print(json.dumps(entries, indent=2, ensure_ascii=False))
+        else:
+            for e in entries:
+                since = datetime.fromtimestamp(e["hibernated_at"]).strftime("%Y-%m-%d %H:%M")
+                print(f"{e['snapshot']}  {e['name']} (pid {e['pid']})  "
+                      f"{e['rss'] / 2**20:.1f} MiB  {since}")
+    elif ns.cmd == "wake":
+        names = [pathlib.Path(s).name for s in ns.snapshot]
+        if ns.all:
+            names += [e["snapshot"] for e in hibernate.hibernated() if e["snapshot"] not in names]
+        ok = True
+        for name in names:
+            try:
+                pid = hibernate.wake(name)
+            except (KeyError, FileNotFoundError, fileio.SnapshotBusy) as e:
+                print(f"{name}: {e.args[0]}", file=sys.stderr)
+                pid = None
+            if pid is not None:
+                print(f"{name} {pid}")
+            ok = ok and pid is not None
         sys.exit(0 if ok else 1)
+    elif ns.cmd == "compat":
+        entries = outcomes.profiles()
+        if ns.json:
+            print(json.dumps(entries, indent=2, ensure_ascii=False))
+        else:
+            for e in entries:
+                print(f"{e['key']}  {e['exe']}  成功 {e['successes']} / 失败 {e['failures']}")
+                for sig, n in e["errors"].items():
+                    print(f"    {n}× {sig}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+回收本机保存的 zstd 字典（见 utils.zdict）。
+
+新快照内嵌所用字典的副本，解压时不需要本机字典；只有没有内嵌副本的快照仍依赖
+~/.quicksave/dicts/ 中的对应版本。Rebaser 定期调用 prune()，删除其余的旧版本。
+"""
+import json
+import pathlib
+import struct
+import tarfile
+from typing import Dict, Set
+
+from quicksave.utils import zdict
+from quicksave.utils.compress import read_header
+from quicksave.utils.logger import log
+from .refs import REFS_DIR
+from .tiering import snapshot_dirs
+
+
+def _local_dictionary(path: pathlib.Path) -> dict | None:
+    """快照依赖的本机字典 {app, version, id}；内嵌了字典或没有用字典时返回 None"""
+    with open(path, "rb") as f:
+        header = read_header(f)
+        if header is None:
+            raise ValueError(f"旧格式快照无法确定所用字典: {path.name}")
+        members = header.get("members", {})
+        if zdict.EMBED_NAME in members or zdict.META_NAME not in members:
+            return None
+        with tarfile.open(fileobj=f, mode="r:") as tar:
+            meta = json.loads(tar.extractfile(zdict.META_NAME).read().decode("utf-8"))
+    return meta.get("dictionary")
+
+
+def in_use() -> Dict[str, Set[int]]:
+    """应用 → 仍被快照依赖的本机字典版本；无法读取某个快照时抛出异常"""
+    used: Dict[str, Set[int]] = {}
+    for directory in [*snapshot_dirs(), REFS_DIR]:
+        for path in directory.glob("*.qsnap"):
+            try:
+                info = _local_dictionary(path)
+            except FileNotFoundError:
+                continue                     # 扫描期间被删除
+            if info:
+                used.setdefault(info["app"], set()).add(int(info["version"]))
+    return used
+
+
+def prune() -> int:
+    """删除没有快照依赖的旧版本字典，返回删除的数量；无法确定时不删除"""
+    try:
+        used = in_use()
+    except (OSError, ValueError, KeyError, struct.error, tarfile.TarError) as e:
+        log.warning("无法确定快照所用的 zstd 字典，暂不回收: %s", e)
+        return 0
+    return zdict.prune(used)
@@ -0,0 +1,165 @@
+"""
+从同一个“黄金”快照扇出恢复多个实例，用于预热一池相同的工作进程
+（加载好模型的 Python 解释器、完成 JIT 预热的 JVM 等）。
+
+- 快照只解压一次（可命中恢复缓存，从缓存复制而不是硬链接，设为只读不影响缓存），
+  镜像目录对所有实例共享并设为只读；
+  每个实例的日志与 pidfile 放在各自的 CRIU 工作目录（-W）中
+- 每个实例在独立的 PID 与挂载命名空间中恢复（unshare），原 PID 不会冲突；
+  net_ns 为 true 时再加上网络与 UTS 命名空间，避免监听端口冲突
+- 命名空间的 init 为 _nsinit.py：CRIU 返回后报告就绪，并留下来回收孤儿进程
+- 同时进行的恢复不超过 parallel 个；每个实例报告从启动到就绪的耗时
+
+需要 root。配置见 config.json 的 "fanout" 小节。
+"""
+import os
+import pathlib
+import selectors
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from quicksave.utils import metrics
+from quicksave.utils.config import get_section
+from quicksave.utils.logger import log, log_context
+from . import _nsinit, outcomes
+from ._criu import build as criu_cmd
+from .cache import get_cache
+from .restore import _PIDFILE, _extract, _make_workdir
+
+__all__ = ["restore_instances"]
+
+DEFAULTS = {
+    "parallel": 0,             # 同时进行的恢复数，0 表示按 CPU 数
+    "timeout": 120,            # 单个实例等待就绪的秒数
+    "net_ns": False,
+}
+
+_READY_SECONDS = metrics.histogram("quicksave_fanout_ready_seconds",
+                                   "Time from launch until a fan-out instance was restored")
+
+
+def _host_pid(init_pid: int, ns_pid: int) -> int | None:
+    """在 init 的后代中找到命名空间内 PID 为 ns_pid 的进程，返回其宿主 PID"""
+    pending = [init_pid]
+    while pending:
+        pid = pending.pop()
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("NSpid:") and int(line.split()[-1]) == ns_pid \
+                            and pid != init_pid:
+                        return pid
+            with open(f"/proc/{pid}/task/{pid}/children", "r") as f:
+                pending += [int(c) for c in f.read().split()]
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def _make_readonly(directory: pathlib.Path) -> None:
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            os.chmod(os.path.join(root, name), 0o444)
+    for root, dirs, _files in os.walk(directory, topdown=False):
+        for name in dirs:
+            os.chmod(os.path.join(root, name), 0o555)
+    os.chmod(directory, 0o555)
+
+
+def _launch(index: int, images: pathlib.Path, workdir: pathlib.Path, cfg: dict) -> dict:
+    """恢复一个实例，返回其报告"""
+    result = {"instance": index, "ok": False, "pid": None, "ns_pid": None,
+              "ready_seconds": None, "error": None}
+    inst = workdir / f"instance-{index}"
+    inst.mkdir()
+    pidfile = inst / _PIDFILE
+    # --kill-child：失败时结束 unshare 即销毁整个命名空间
+    unshare = ["unshare", "--pid", "--fork", "--kill-child", "--mount-proc"]
+    if cfg["net_ns"]:
+        unshare += ["--net", "--uts"]
+    cmd = [*unshare, sys.executable, _nsinit.__file__, str(pidfile),
+           *criu_cmd("restore", "-D", str(images), "-W", str(inst),
+                     "--shell-job", "--ext-unix-sk", "-d",
+                     "--pidfile", str(pidfile), "-o", "restore.log")]
+    t0 = time.perf_counter()
+    with open(inst / "init.log", "wb") as err:
+        proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                stderr=err, start_new_session=True)
+    try:
+        line = _readline(proc, float(cfg["timeout"]))
+    finally:
+        proc.stdout.close()
+    elapsed = time.perf_counter() - t0
+    status, _, value = line.partition(" ")
+    if status == "ready":
+        result.update(ok=True, ns_pid=int(value), ready_seconds=elapsed,
+                      pid=_host_pid(proc.pid, int(value)))
+        _READY_SECONDS.observe(elapsed)
+        log.info("实例 %d 已就绪: pid=%s（命名空间内 %s），用时 %.3f s",
+                 index, result["pid"], value, elapsed)
+    else:
+        result["error"] = line or "no status"
+        log.error("实例 %d 恢复失败: %s，见 %s", index, result["error"], inst)
+        proc.kill()
+        proc.wait()
+    metrics.record_op("restore", result["ok"], elapsed)
+    return result
+
+
+def _readline(proc: subprocess.Popen, timeout: float) -> str:
+    """读取 init 报告的状态行；超时返回 timeout"""
+    with selectors.DefaultSelector() as sel:
+        sel.register(proc.stdout, selectors.EVENT_READ)
+        if not sel.select(timeout):
+            return "timeout"
+    return proc.stdout.readline().decode("utf-8", errors="replace").strip()
+
+
+def restore_instances(qsnap: pathlib.Path, instances: int,
+                      parallel: int | None = None, net_ns: bool | None = None) -> List[dict]:
+    """
+    从 qsnap 恢复 instances 个实例，返回每个实例的报告：
+    {instance, ok, pid（宿主 PID）, ns_pid, ready_seconds, error}
+    """
+    if os.geteuid() != 0:
+        raise PermissionError("扇出恢复需要 root（每个实例使用独立的 PID 命名空间）")
+    if instances < 1:
+        raise ValueError("instances 至少为 1")
+    cfg = get_section("fanout", DEFAULTS)
+    if net_ns is not None:
+        cfg["net_ns"] = net_ns
+    parallel = parallel or int(cfg["parallel"]) or os.cpu_count() or 1
+    parallel = max(1, min(parallel, instances))
+
+    cache = get_cache()
+    workdir = _make_workdir("qs_fan_", cache)
+    images = workdir / "images"
+    images.mkdir()
+    t0 = time.perf_counter()
+    try:
+        with log_context(snapshot=qsnap.name, phase="extract"):
+            _extract("restore", qsnap, images, cache, private=True)
+            _make_readonly(images)
+        log.info("镜像已解压（%.3f s），开始恢复 %d 个实例，并发 %d",
+                 time.perf_counter() - t0, instances, parallel)
+        with log_context(snapshot=qsnap.name, phase="criu-restore"), \
+                ThreadPoolExecutor(max_workers=parallel) as pool:
+            results = list(pool.map(lambda i: _launch(i, images, workdir, cfg), range(instances)))
+    finally:
+        # 所有 CRIU 均已返回，镜像不再需要；实例日志另行保留
+        os.chmod(images, 0o755)
+        shutil.rmtree(images, ignore_errors=True)
+    ok = sum(r["ok"] for r in results)
+    # 整次扇出只算一次观测：有实例就绪即说明快照可以恢复，其余失败多为资源或端口冲突
+    outcomes.record("restore", ok > 0, snapshot=qsnap.name,
+                    error=workdir / "instance-0" / "restore.log")
+    log.info("扇出恢复完成：%d/%d 个实例就绪，共 %.3f s", ok, instances, time.perf_counter() - t0)
+    if ok == instances:
+        shutil.rmtree(workdir, ignore_errors=True)
+    else:
+        log.info("失败实例的 CRIU 日志保留在 %s", workdir)
+    return results
@@ -0,0 +1,158 @@
+"""
+用 cgroup v2 一次冻结整棵进程树，代替 CRIU 逐个 ptrace seize 时的停止过程。
+
+dump 前把目标进程树放进专用 cgroup（进程树已独占所在 cgroup 时直接使用它），
+由我们写 cgroup.freeze 冻结并计时，再以 --freeze-cgroup 交给 CRIU：cgroup 已冻结时
+CRIU 只做 seize，stats-dump 中的 freezing_time 即为 seize 耗时，两者可以分开统计。
+dump 失败时解冻，并把进程移回原来的 cgroup。
+
+配置见 config.json 的 "freezer" 小节；cgroup 不可用或无权限时退回 ptrace 方式。
+"""
+import os
+import pathlib
+import time
+from typing import Dict, List
+
+from quicksave.utils.config import get_section
+from quicksave.utils.logger import log
+from .proctree import get_process_tree
+
+CGROUP_ROOT = pathlib.Path("/sys/fs/cgroup")
+
+DEFAULTS = {
+    "enabled": False,          # dump 默认是否使用 cgroup 冻结
+    "timeout": 10,             # 等待 cgroup 冻结完成的秒数
+}
+
+
+def _cgroup_of(pid: int) -> pathlib.Path | None:
+    try:
+        with open(f"/proc/{pid}/cgroup", "r") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    return CGROUP_ROOT / line.strip()[3:].lstrip("/")
+    except OSError:
+        pass
+    return None
+
+
+def _procs(cg: pathlib.Path) -> List[int]:
+    return [int(p) for p in (cg / "cgroup.procs").read_text().split()]
+
+
+def _write(path: pathlib.Path, value: str) -> None:
+    with open(path, "w") as f:
+        f.write(value)
+
+
+def enabled(freeze_cgroup: bool | None) -> bool:
+    """调用方显式指定时以其为准，否则读取配置"""
+    if freeze_cgroup is not None:
+        return freeze_cgroup
+    return bool(get_section("freezer", DEFAULTS)["enabled"])
+
+
+class CgroupFreezer:
+    """
+    进程树的 cgroup 冻结器：
+        fz = CgroupFreezer.prepare(leader)   # 不可用时为 None
+        fz.freeze(); criu dump ... *fz.criu_args(); fz.release(ok)
+    """
+
+    def __init__(self, cgroup: pathlib.Path, origin: Dict[int, pathlib.Path], timeout: float):
+        self.cgroup = cgroup
+        self.origin = origin            # 被移动的进程 → 原 cgroup；为空表示使用已有 cgroup
+        self.timeout = timeout
+        self.frozen = False
+
+    @classmethod
+    def prepare(cls, leader: int) -> "CgroupFreezer | None":
+        timeout = float(get_section("freezer", DEFAULTS)["timeout"])
+        try:
+            return cls._prepare(leader, timeout)
+        except OSError as e:
+            log.warning("无法使用 cgroup 冻结进程树，改用 ptrace: %s", e)
+            return None
+
+    @classmethod
+    def _prepare(cls, leader: int, timeout: float) -> "CgroupFreezer | None":
+        current = _cgroup_of(leader)
+        if current is None or not (CGROUP_ROOT / "cgroup.controllers").exists():
+            log.warning("未找到 cgroup v2，改用 ptrace 冻结进程树")
+            return None
+        tree = set(get_process_tree(leader))
+        if current != CGROUP_ROOT and set(_procs(current)) <= tree:
+            log.info("进程树独占 cgroup %s，直接冻结", current)
+            return cls(current, {}, timeout)
+
+        parent = current.parent if current != CGROUP_ROOT else CGROUP_ROOT
+        cg = parent / f"quicksave-freeze-{leader}"
+        cg.mkdir(exist_ok=True)
+        fz = cls(cg, {}, timeout)
+        try:
+            # 移动期间新 fork 的子进程仍留在原 cgroup，重复到进程树稳定为止
+            for _ in range(5):
+                pending = [p for p in get_process_tree(leader) if p not in fz.origin]
+                if not pending:
+                    break
+                for pid in pending:
+                    origin = _cgroup_of(pid)
+                    if origin is None:
+                        continue                       # 已退出
+                    _write(cg / "cgroup.procs", str(pid))
+                    fz.origin[pid] = origin
+        except OSError:
+            fz.release(ok=False)
+            raise
+        log.info("已将 %d 个进程移入 %s", len(fz.origin), cg)
+        return fz
+
+    def criu_args(self) -> List[str]:
+        return ["--freeze-cgroup", str(self.cgroup)]
+
+    def freeze(self) -> float:
+        """冻结 cgroup 并等待完成，返回耗时（秒）"""
+        t0 = time.perf_counter()
+        _write(self.cgroup / "cgroup.freeze", "1")
+        self.frozen = True
+        events = self.cgroup / "cgroup.events"
+        deadline = t0 + self.timeout
+        while "frozen 1" not in events.read_text():
+            if time.perf_counter() > deadline:
+                self.thaw()
+                raise TimeoutError(f"{self.timeout:.0f} 秒内未能冻结 {self.cgroup}")
+            time.sleep(0.001)
+        return time.perf_counter() - t0
+
+    def thaw(self) -> None:
+        if self.frozen:
+            try:
+                _write(self.cgroup / "cgroup.freeze", "0")
+            except OSError as e:
+                log.error("解冻 %s 失败: %s", self.cgroup, e)
+            self.frozen = False
+
+    def release(self, ok: bool) -> None:
+        """
+        dump 结束后调用。失败时解冻并把进程移回原 cgroup；
+        成功时进程已被 CRIU 结束，删除专用 cgroup。
+        """
+        if not ok:
+            self.thaw()
+            for pid, origin in self.origin.items():
+                try:
+                    _write(origin / "cgroup.procs", str(pid))
+                except OSError:
+                    pass                                # 已退出
+        if not self.origin:
+            return
+        # 被结束的进程要等父进程回收后 cgroup 才为空
+        for _ in range(50):
+            try:
+                os.rmdir(self.cgroup)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.02)
+        log.warning("专用 cgroup %s 仍有进程，未删除", self.cgroup)
@@ -0,0 +1,268 @@
+"""
+空闲进程休眠：把长时间空闲、占用大量内存的进程 dump 下来（CRIU dump 后进程即结束），
+腾出内存，需要时再恢复。
+
+- 策略：进程名在 match 中、整棵进程树 RSS 不小于 min_rss
+- 空闲：interval 次检查之间整棵树的 CPU 时间增量不超过 cpu_epsilon 秒，
+  持续 idle_seconds 后休眠
+- 内存压力：/proc/pressure/memory 的 some avg10 超过 psi_limit 时，空闲满
+  pressure_idle_seconds 的进程也可休眠，按 RSS 从大到小每次只休眠一个，
+  下一轮检查时重新评估压力
+- 休眠的进程记录在 QS_DIR/hibernated.json 中，通过 CLI（quicksave hibernated /
+  wake）、GUI 的快照列表或 ProcessMonitor.wake 恢复
+
+配置见 config.json 的 "hibernate" 小节。
+"""
+import contextlib
+import fcntl
+import json
+import os
+import pathlib
+import threading
+import time
+from typing import Dict, List
+
+import psutil
+
+from quicksave.utils import fileio, metrics
+from quicksave.utils.config import get_section
+from quicksave.utils.logger import log
+from . import QS_DIR
+from .refs import remove_snapshot
+from .restore import restore_headless
+from .snapshot import dump
+from .tiering import snapshot_dirs
+
+REGISTRY = QS_DIR / "hibernated.json"
+LABEL = "hibernate"
+PSI_FILE = pathlib.Path("/proc/pressure/memory")
+
+DEFAULTS = {
+    "enabled": False,
+    "match": [],                       # 进程名（小写），为空时不休眠任何进程
+    "min_rss": 256 << 20,              # 整棵进程树的 RSS 下限（字节）
+    "idle_seconds": 3600,
+    "cpu_epsilon": 0.5,                # 两次检查间 CPU 时间增量不超过该秒数视为空闲
+    "psi_limit": 10.0,                 # some avg10（%），为 0 时不看内存压力
+    "pressure_idle_seconds": 300,
+}
+
+_HIBERNATED = metrics.gauge("quicksave_hibernated_processes",
+                            "Process trees currently hibernated to disk")
+_HIBERNATED_BYTES = metrics.gauge("quicksave_hibernated_rss_bytes",
+                                  "Resident memory released by hibernated process trees")
+
+
+def settings() -> dict:
+    cfg = get_section("hibernate", DEFAULTS)
+    cfg["match"] = [str(n).lower() for n in cfg["match"]]
+    return cfg
+
+
+def memory_pressure() -> float | None:
+    """/proc/pressure/memory 中 some avg10 的值（%），内核不支持 PSI 时为 None"""
+    try:
+        with open(PSI_FILE, "r") as f:
+            for line in f:
+                if line.startswith("some "):
+                    fields = dict(kv.split("=", 1) for kv in line.split()[1:])
+                    return float(fields["avg10"])
+    except (OSError, KeyError, ValueError):
+        pass
+    return None
+
+
+# ---------- 休眠记录 ----------
+@contextlib.contextmanager
+def _locked():
+    """持有休眠记录的文件锁，产出当前记录；修改后在退出时写回"""
+    REGISTRY.parent.mkdir(parents=True, exist_ok=True)
+    with open(REGISTRY.with_suffix(".lock"), "a+") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            entries = json.loads(REGISTRY.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            entries = {}
+        before = json.dumps(entries, sort_keys=True)
+        yield entries
+        if json.dumps(entries, sort_keys=True) != before:
+            tmp = REGISTRY.with_name(f".{REGISTRY.name}.{os.getpid()}")
+            tmp.write_text(json.dumps(entries, indent=2, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, REGISTRY)
+
+
+def _locate(name: str) -> pathlib.Path | None:
+    """快照可能已被降级到冷层目录"""
+    for directory in snapshot_dirs():
+        path = directory / name
+        if path.exists():
+            return path
+    return None
+
+
+def _update_gauges(entries: Dict[str, dict]) -> None:
+    _HIBERNATED.set(len(entries))
+    _HIBERNATED_BYTES.set(sum(e.get("rss", 0) for e in entries.values()))
+
+
+def hibernated() -> List[dict]:
+    """当前休眠的进程，最近休眠的在前；快照已被删除的记录随之清除"""
+    with _locked() as entries:
+        for name in [n for n in entries if _locate(n) is None]:
+            log.info("休眠快照 %s 已不存在，清除记录", name)
+            del entries[name]
+        _update_gauges(entries)
+        out = [dict(e, snapshot=name, path=str(_locate(name))) for name, e in entries.items()]
+    return sorted(out, key=lambda e: -e["hibernated_at"])
+
+
+def is_hibernated(path: pathlib.Path) -> bool:
+    with _locked() as entries:
+        return path.name in entries
+
+
+def hibernate(pid: int, rss: int | None = None) -> pathlib.Path:
+    """dump pid 所在的进程树（进程随之结束）并记录为休眠"""
+    proc = psutil.Process(pid)
+    name = proc.name()
+    cmdline = proc.cmdline()
+    if rss is None:
+        rss = _tree_usage(proc)[1]
+    path = dump([pid], label=f"{LABEL}-{pid}", priority="auto")
+    with _locked() as entries:
+        entries[path.name] = {
+            "pid": pid,
+            "name": name,
+            "cmdline": cmdline,
+            "rss": rss,
+            "hibernated_at": time.time(),
+        }
+        _update_gauges(entries)
+    log.info("进程 %s (pid=%d) 已休眠到 %s，释放约 %.1f MiB", name, pid, path.name, rss / 2**20)
+    return path
+
+
+def wake(name: str) -> int | None:
+    """
+    恢复休眠的快照 name（文件名），返回恢复出的 PID，失败返回 None。
+    成功后删除该快照，避免同一进程被再次恢复。
+    另一个进程或线程正在恢复同一快照时抛出 fileio.SnapshotBusy。
+    """
+    path = _locate(name)
+    if path is None:
+        raise FileNotFoundError(name)
+    # 在记录中标记“正在恢复”，CLI、GUI 与守护进程同时 wake 时只有一个会恢复；
+    # 标记者已退出（例如恢复中途崩溃）的标记视为无效
+    with _locked() as entries:
+        if name not in entries:
+            raise KeyError(f"{name} 不是休眠的快照")
+        entry = entries[name]
+        waker = entry.get("waking")
+        if waker and psutil.pid_exists(waker["pid"]):
+            raise fileio.SnapshotBusy(f"{name} 正在被 pid {waker['pid']} 恢复")
+        token = f"{os.getpid()}-{threading.get_native_id()}-{time.time_ns()}"
+        entry["waking"] = {"pid": os.getpid(), "token": token}
+    pid = None
+    try:
+        pid = restore_headless(path)
+    finally:
+        with _locked() as entries:
+            current = entries.get(name)
+            if current is not None and (current.get("waking") or {}).get("token") == token:
+                del current["waking"]
+                if pid is not None:
+                    del entries[name]
+            _update_gauges(entries)
+    if pid is None:
+        return None
+    try:
+        remove_snapshot(path)
+    except OSError as e:
+        log.warning("删除休眠快照 %s 失败: %s", name, e)
+    log.info("进程 %s 已从休眠中恢复: pid=%d（休眠了 %.0f 分钟）", entry["name"], pid,
+             (time.time() - entry["hibernated_at"]) / 60)
+    return pid
+
+
+# ---------- 空闲检测 ----------
+def _tree_usage(proc: psutil.Process) -> tuple[float, int]:
+    """整棵进程树的 CPU 时间（秒）与 RSS（字节）"""
+    cpu, rss = 0.0, 0
+    for p in [proc, *proc.children(recursive=True)]:
+        try:
+            with p.oneshot():
+                t = p.cpu_times()
+                cpu += t.user + t.system
+                rss += p.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return cpu, rss
+
+
+class Hibernator:
+    """
+    由 ProcessMonitor 周期调用 check()：
+    记录每个匹配进程树的 CPU 时间，空闲足够久的进程树被休眠。
+    """
+
+    def __init__(self, cfg: dict | None = None):
+        self.cfg = cfg or settings()
+        self._seen: Dict[int, list] = {}     # pid → [启动时间, CPU 时间, 开始空闲的时间]
+
+    def _candidates(self) -> List[tuple]:
+        """返回 [(空闲秒数, rss, pid, 进程名)]，只含匹配策略的进程树的根进程"""
+        match = set(self.cfg["match"])
+        procs = {}
+        for proc in psutil.process_iter(["pid", "ppid", "name", "create_time"]):
+            name = (proc.info["name"] or "").lower()
+            if name in match:
+                procs[proc.info["pid"]] = proc
+        now = time.time()
+        out, alive = [], set()
+        for pid, proc in procs.items():
+            if proc.info["ppid"] in procs or pid == os.getpid():
+                continue                           # 随父进程一起处理
+            try:
+                cpu, rss = _tree_usage(proc)
+            except psutil.Error:
+                continue
+            alive.add(pid)
+            seen = self._seen.get(pid)
+            if seen is None or seen[0] != proc.info["create_time"]:
+                self._seen[pid] = [proc.info["create_time"], cpu, now]
+                continue
+            if cpu - seen[1] > float(self.cfg["cpu_epsilon"]):
+                seen[2] = now
+            seen[1] = cpu
+            if rss >= int(self.cfg["min_rss"]):
+                out.append((now - seen[2], rss, pid, proc.info["name"]))
+        for pid in set(self._seen) - alive:
+            del self._seen[pid]
+        return out
+
+    def check(self) -> List[pathlib.Path]:
+        """休眠满足条件的进程树，返回生成的快照"""
+        if not self.cfg["match"]:
+            return []
+        candidates = self._candidates()
+        idle = float(self.cfg["idle_seconds"])
+        chosen = [c for c in candidates if c[0] >= idle]
+        limit = float(self.cfg["psi_limit"])
+        psi = memory_pressure() if limit > 0 else None
+        if psi is not None and psi >= limit:
+            soon = float(self.cfg["pressure_idle_seconds"])
+            pressured = [c for c in candidates if soon <= c[0] < idle]
+            if pressured:
+                # 内存压力下先休眠最大的一个，下一轮再看压力是否缓解
+                chosen.append(max(pressured, key=lambda c: c[1]))
+                log.info("内存压力 %.1f%% 超过 %.1f%%，提前休眠空闲进程", psi, limit)
+        out = []
+        for idle_for, rss, pid, name in sorted(chosen, key=lambda c: -c[1]):
+            log.info("进程 %s (pid=%d) 已空闲 %.0f 秒，RSS %.1f MiB，开始休眠",
+                     name, pid, idle_for, rss / 2**20)
+            try:
+                out.append(hibernate(pid, rss))
+            except Exception as e:
+                log.error("休眠进程 %s (pid=%d) 失败: %s", name, pid, e)
+            self._seen.pop(pid, None)
+        return out
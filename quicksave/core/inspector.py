@@ -0,0 +1,323 @@
+"""
+不恢复、不完整解压即可查看快照内容：包含哪些进程、每个 VMA 的大小与实际转储量、
+打开了多少 FD、映射了哪些文件、哪些内存是共享的。
+
+只解码需要的镜像（pstree、core、mm、pagemap、files、fdinfo），页数据本身不读取：
+- 镜像目录：直接 mmap 各镜像文件
+- v2 快照：按 tar 头随机访问，只解压 meta.tar，页镜像大小取自快照头部
+- 旧格式快照：只能顺序解压整个包，但不落盘
+"""
+import bisect
+import io
+import json
+import mmap
+import pathlib
+import re
+import tarfile
+import tempfile
+import time
+from typing import Dict, List
+
+from quicksave.utils import codecs, protobuf as pb, zdict
+from quicksave.utils.compress import RefSource, decode_member, read_header
+from quicksave.utils.sparse import saved_bytes
+
+__all__ = ["inspect_snapshot", "format_report"]
+
+PAGE = 4096
+
+_WANTED = re.compile(r"(pstree|files|reg-files)\.img$|(core|mm|pagemap|fdinfo)-\d+\.img$")
+_PAGES = re.compile(r"pages-\d+\.img$")
+
+# criu/include/image.h 中的 VMA 状态位
+_VMA_KINDS = [
+    (1 << 1, "stack"), (1 << 2, "vsyscall"), (1 << 3, "vdso"), (1 << 12, "vvar"),
+    (1 << 5, "heap"), (1 << 10, "sysvipc"), (1 << 11, "socket"), (1 << 13, "aio"),
+    (1 << 14, "memfd"), (1 << 7, "file-shared"), (1 << 6, "file"),
+    (1 << 8, "anon-shared"), (1 << 9, "anon"),
+]
+_VMA_SHARED = (1 << 7) | (1 << 8)
+_MAP_SHARED = 0x01
+_PE_PRESENT = 1 << 2
+
+
+class _Images:
+    """快照中需要的镜像（名称 → 内容）以及页镜像的大小信息"""
+
+    def __init__(self, fmt: str):
+        self.format = fmt
+        self.codecs: dict = {}
+        self.ref: str | None = None
+        self.images: Dict[str, object] = {}
+        self.pages: Dict[str, dict] = {}
+        self._maps: List[mmap.mmap] = []
+        self._dict_members: Dict[str, bytes] = {}
+        self._meta: dict = {}
+        self._dictionary: bytes | None = None
+
+    @staticmethod
+    def wants(name: str) -> bool:
+        name = name[2:] if name.startswith("./") else name
+        if name.endswith(".zst"):
+            name = name[:-4]
+        return name in (zdict.META_NAME, zdict.EMBED_NAME) or bool(_WANTED.match(name))
+
+    def add(self, name: str, data) -> None:
+        name = name[2:] if name.startswith("./") else name
+        if name == zdict.META_NAME:
+            self._meta = json.loads(bytes(data).decode("utf-8"))
+        elif name == zdict.EMBED_NAME:
+            self._dictionary = bytes(data)
+        elif name.endswith(".img.zst"):
+            self._dict_members[name[:-4]] = bytes(data)
+        else:
+            self.images[name] = data
+
+    def finish(self) -> None:
+        """还原用 zstd 字典压缩的小镜像（字典信息记录在 quicksave.json 中）"""
+        if self._dict_members and "dictionary" not in self._meta:
+            raise ValueError("快照中的 .zst 镜像缺少字典信息 (quicksave.json)")
+        if self._dict_members:
+            self.images.update(zdict.decompress_blobs(self._dict_members, self._meta,
+                                                      self._dictionary))
+        self._dict_members.clear()
+
+    def close(self) -> None:
+        self.images.clear()
+        for m in self._maps:
+            m.close()
+
+
+def _load_dir(path: pathlib.Path) -> _Images:
+    imgs = _Images("dir")
+    for p in sorted(path.iterdir()):
+        if _PAGES.match(p.name):
+            st = p.stat()
+            imgs.pages[p.name] = {"size": st.st_size, "stored": st.st_blocks * 512}
+        elif imgs.wants(p.name):
+            with open(p, "rb") as f:
+                if p.stat().st_size == 0:
+                    imgs.add(p.name, b"")
+                    continue
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            imgs._maps.append(m)
+            imgs.add(p.name, m)
+    imgs.finish()
+    return imgs
+
+
+def _load_v2(path: pathlib.Path, f, header: dict, scratch: pathlib.Path) -> _Images:
+    imgs = _Images("v2")
+    imgs.codecs = header.get("codecs", {})
+    members = header.get("members", {})
+    ref = header.get("ref")
+    refs = None
+    if ref:
+        imgs.ref = ref["name"]
+        if any(e.get("delta") and e.get("bundle") for e in members.values()):
+            refs = RefSource.locate(path, ref, scratch)
+    # 非流模式：逐个读取 tar 头并 seek 跳过成员数据，页数据不会被读取
+    with tarfile.open(fileobj=f, mode="r:") as tar:
+        for m in tar:
+            entry = members.get(m.name, {"codec": "none"})
+            if _PAGES.match(m.name):
+                size = entry.get("size", m.size)
+                imgs.pages[m.name] = {
+                    "size": size, "stored": m.size, "codec": entry["codec"],
+                    "zero": saved_bytes(entry["extents"], size) if "extents" in entry else 0,
+                    "delta": bool(entry.get("delta")),
+                }
+            elif entry.get("bundle"):
+                buf = io.BytesIO()
+                decode_member(tar.extractfile(m), entry, buf, m.name, refs)
+                buf.seek(0)
+                with tarfile.open(fileobj=buf, mode="r:") as inner:
+                    for im in inner:
+                        if im.isfile() and imgs.wants(im.name):
+                            imgs.add(im.name, inner.extractfile(im).read())
+            elif m.isfile() and imgs.wants(m.name):
+                imgs.add(m.name, tar.extractfile(m).read())
+    imgs.finish()
+    return imgs
+
+
+def _load_legacy(f) -> _Images:
+    head = f.read(512)
+    f.seek(0)
+    name = codecs.detect(head)
+    if name is None:
+        raise ValueError("无法识别的快照格式")
+    imgs = _Images("legacy")
+    imgs.codecs = {"all": name}
+    with codecs.get(name).open_reader(f) as stream:
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            for m in tar:
+                base = m.name[2:] if m.name.startswith("./") else m.name
+                if _PAGES.match(base):
+                    imgs.pages[base] = {"size": m.size}
+                elif m.isfile() and imgs.wants(m.name):
+                    imgs.add(m.name, tar.extractfile(m).read())
+    imgs.finish()
+    return imgs
+
+
+def _load(path: pathlib.Path) -> _Images:
+    if path.is_dir():
+        return _load_dir(path)
+    with open(path, "rb") as f:
+        header = read_header(f)
+        if header is None:
+            return _load_legacy(f)
+        with tempfile.TemporaryDirectory(prefix="qs_inspect_") as scratch:
+            return _load_v2(path, f, header, pathlib.Path(scratch))
+
+
+def _messages(imgs: _Images, name: str) -> List[pb.Fields]:
+    data = imgs.images.get(name)
+    return [pb.decode(e) for e in pb.entries(data)] if data is not None else []
+
+
+def _file_names(imgs: _Images) -> Dict[int, str]:
+    names = {}
+    for e in _messages(imgs, "files.img"):
+        reg = pb.first(e, 3)
+        if reg is not None:
+            names[pb.first(e, 2)] = pb.string(pb.decode(reg), 6)
+    for e in _messages(imgs, "reg-files.img"):
+        names[pb.first(e, 1)] = pb.string(e, 6)
+    return names
+
+
+def _vma_kind(status: int) -> str:
+    for bit, kind in _VMA_KINDS:
+        if status & bit:
+            return kind
+    return "other"
+
+
+def _prot(prot: int) -> str:
+    return "".join(c if prot & bit else "-" for bit, c in ((1, "r"), (2, "w"), (4, "x")))
+
+
+def _process(imgs: _Images, tree: pb.Fields, files: Dict[int, str]) -> dict:
+    pid = pb.first(tree, 1, 0)
+    proc = {
+        "pid": pid,
+        "ppid": pb.first(tree, 2, 0),
+        "pgid": pb.first(tree, 3, 0),
+        "sid": pb.first(tree, 4, 0),
+        "threads": len(pb.ints(tree, 5)) or 1,
+        "comm": "",
+        "fds": None,
+    }
+    core = _messages(imgs, f"core-{pid}.img")
+    files_id = pid
+    if core:
+        tc = pb.first(core[0], 3)
+        if tc is not None:
+            proc["comm"] = pb.string(pb.decode(tc), 6)
+        ids = pb.first(core[0], 4)
+        if ids is not None:
+            files_id = pb.first(pb.decode(ids), 2, pid)
+    for name in (f"fdinfo-{files_id}.img", f"fdinfo-{pid}.img"):
+        if name in imgs.images:
+            proc["fds"] = len(_messages(imgs, name))
+            break
+
+    vmas = []
+    mm = _messages(imgs, f"mm-{pid}.img")
+    for raw in (mm[0].get(14, []) if mm else []):
+        v = pb.decode(raw)
+        start, end = pb.first(v, 1, 0), pb.first(v, 2, 0)
+        status, flags = pb.first(v, 7, 0), pb.first(v, 6, 0)
+        vma = {
+            "start": start, "end": end, "size": end - start,
+            "prot": _prot(pb.first(v, 5, 0)),
+            "kind": _vma_kind(status),
+            "shared": bool(flags & _MAP_SHARED or status & _VMA_SHARED),
+            "file": files.get(pb.first(v, 4)) if status & ((1 << 6) | (1 << 7)) else None,
+            "dumped": 0,
+        }
+        vmas.append(vma)
+    vmas.sort(key=lambda x: x["start"])
+
+    # pagemap：首条为 pagemap_head，其后每条为一段连续页
+    starts = [v["start"] for v in vmas]
+    for e in _messages(imgs, f"pagemap-{pid}.img")[1:]:
+        flags = pb.first(e, 4)
+        present = flags & _PE_PRESENT if flags is not None else not pb.first(e, 3, 0)
+        if not present:
+            continue
+        addr = pb.first(e, 1, 0)
+        end = addr + pb.first(e, 2, 0) * PAGE
+        i = max(0, bisect.bisect_right(starts, addr) - 1)
+        while addr < end and i < len(vmas):
+            v = vmas[i]
+            lo, hi = max(addr, v["start"]), min(end, v["end"])
+            if hi > lo:
+                v["dumped"] += hi - lo
+                addr = hi
+            i += 1
+
+    proc.update(
+        vmas=vmas,
+        vm_bytes=sum(v["size"] for v in vmas),
+        dumped_bytes=sum(v["dumped"] for v in vmas),
+        shared_bytes=sum(v["size"] for v in vmas if v["shared"]),
+    )
+    return proc
+
+
+def inspect_snapshot(path: pathlib.Path) -> dict:
+    """解析快照（.qsnap 或已解压的镜像目录），返回可直接序列化为 JSON 的报告"""
+    t0 = time.perf_counter()
+    imgs = _load(path)
+    try:
+        files = _file_names(imgs)
+        procs = [_process(imgs, tree, files) for tree in _messages(imgs, "pstree.img")]
+    finally:
+        imgs.close()
+    return {
+        "snapshot": str(path),
+        "format": imgs.format,
+        "codecs": imgs.codecs,
+        "ref": imgs.ref,
+        "size": path.stat().st_size if path.is_file() else None,
+        "pages": imgs.pages,
+        "processes": procs,
+        "files": sorted(set(files.values())),
+        "elapsed": round(time.perf_counter() - t0, 3),
+    }
+
+
+def _mib(n: int | None) -> str:
+    return "-" if n is None else f"{n / 2**20:.1f} MiB"
+
+
+def format_report(report: dict, vmas: bool = False) -> str:
+    """把报告排成表格；vmas 为 True 时列出每个进程的 VMA（按转储量降序）"""
+    codec = ", ".join(f"{k}={v}" for k, v in report["codecs"].items()) or "-"
+    lines = [f"{report['snapshot']}  格式 {report['format']}  压缩 {codec}"
+             f"  文件 {_mib(report['size'])}  解析 {report['elapsed']:.3f} s"
+             + (f"  差分参考 {report['ref']}" if report.get("ref") else ""), ""]
+    lines.append(f"{'PID':>7} {'PPID':>7} {'COMM':<16} {'THR':>4} {'VMAS':>5} {'FDS':>5}"
+                 f" {'VIRT':>12} {'DUMPED':>12} {'SHARED':>12}")
+    for p in report["processes"]:
+        lines.append(f"{p['pid']:>7} {p['ppid']:>7} {p['comm'][:16]:<16} {p['threads']:>4}"
+                     f" {len(p['vmas']):>5} {'-' if p['fds'] is None else p['fds']:>5}"
+                     f" {_mib(p['vm_bytes']):>12} {_mib(p['dumped_bytes']):>12}"
+                     f" {_mib(p['shared_bytes']):>12}")
+    if report["pages"]:
+        lines += ["", f"{'PAGES':<20} {'SIZE':>12} {'STORED':>12} {'ZERO':>12}"]
+        for name, info in sorted(report["pages"].items()):
+            lines.append(f"{name:<20} {_mib(info['size']):>12} {_mib(info.get('stored')):>12}"
+                         f" {_mib(info.get('zero')):>12}" + ("  delta" if info.get("delta") else ""))
+    if vmas:
+        for p in report["processes"]:
+            lines += ["", f"[{p['pid']}] {p['comm']}",
+                      f"{'START':>16} {'END':>16} {'SIZE':>12} {'DUMPED':>12} PROT {'KIND':<12} FILE"]
+            for v in sorted(p["vmas"], key=lambda v: v["dumped"], reverse=True):
+                lines.append(f"{v['start']:>16x} {v['end']:>16x} {_mib(v['size']):>12}"
+                             f" {_mib(v['dumped']):>12} {v['prot']:<4} {v['kind']:<12}"
+                             f" {v['file'] or ''}")
+    return "\n".join(lines)
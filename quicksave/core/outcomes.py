@@ -0,0 +1,265 @@
+"""
+从实际的 dump / 验证 / 恢复结果中学习兼容性。
+
+每次操作的结果连同兼容性特征（compat.check_compatibility）与 CRIU 错误签名
+记录在 QS_DIR/compat.json 中，按应用（zdict.app_key）与可执行文件版本分组：
+- dump 时记录快照名 → 应用，验证 / 恢复时据此找回所属应用
+- CRIU 失败的 dump、验证与恢复的成败都是一次观测；只保留每个应用最近 window 次
+- 预测成功率：以固定规则（explain_compat）为起点，按各特征的历史成功率修正得到
+  先验，再与该应用自己的观测做 Beta 平滑
+监控与调度在 dump 前调用 gate()：样本足够且成功率很低时跳过，偏低时降为 auto 优先级。
+被跳过的应用每隔 retry_after 秒仍放行一次试探，使内核、CRIU 升级或配置修正后的
+结果能进入记录，不会因为一次性的原因被永久跳过。
+
+配置见 config.json 的 "outcomes" 小节。
+"""
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import pathlib
+import re
+import time
+from collections import Counter
+from typing import List
+
+from quicksave.utils import metrics, zdict
+from quicksave.utils.config import get_section
+from quicksave.utils.logger import log
+from . import QS_DIR
+from .admission import PRIORITIES
+from .compat import check_compatibility, explain_compat
+from .proctree import get_process_tree
+
+DB_FILE = QS_DIR / "compat.json"
+
+DEFAULTS = {
+    "enabled": True,
+    "window": 50,              # 每个应用保留的最近观测数
+    "prior_weight": 3,         # 先验相当于多少次观测
+    "min_samples": 3,          # 该应用的观测少于此数时不跳过也不降级
+    "skip_below": 0.15,
+    "deprioritize_below": 0.5,
+    "retry_after": 86400,      # 被跳过的应用距上次观测或试探超过该秒数时放行一次
+    "max_snapshots": 1000,     # 记录的快照名 → 应用映射上限
+}
+
+_SKIPPED = metrics.counter("quicksave_predicted_skips_total",
+                           "Automatic dumps skipped or deprioritized by learned compatibility",
+                           ("action",))
+
+_ERROR_LINE = re.compile(r"Error \((?:criu/)?([^:)]+)(?::\d+)?\):\s*(.*)")
+
+
+def settings() -> dict:
+    return get_section("outcomes", DEFAULTS)
+
+
+# ---------- 特征与签名 ----------
+def _exe_version(exe: str) -> str:
+    """可执行文件的版本标识：大小与修改时间变化（升级）即视为新版本"""
+    try:
+        st = os.stat(exe)
+    except OSError:
+        return "unknown"
+    return hashlib.sha1(f"{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:8]
+
+
+def _ipc_bucket(n: int) -> str:
+    return "0-10" if n <= 10 else "11-30" if n <= 30 else ">30"
+
+
+def profile(pids: List[int]) -> dict | None:
+    """进程树 pids[0] 的应用标识与兼容性特征；进程不存在时返回 None"""
+    app = zdict.app_key(pids[0])
+    if app is None:
+        return None
+    try:
+        exe = os.readlink(f"/proc/{pids[0]}/exe")
+    except OSError:
+        return None
+    report = check_compatibility(get_process_tree(pids[0]))
+    version = _exe_version(exe)
+    return {
+        "key": f"{app}@{version}",
+        "exe": exe,
+        "version": version,
+        "features": [f"x11={report['x11']}", f"wayland={report['wayland']}",
+                     f"gpu={report['gpu']}", f"blacklist={report['blacklist']}",
+                     f"ipc={_ipc_bucket(report['ipc'])}"],
+        "heuristic_ok": "通过" in explain_compat(report),
+    }
+
+
+def signature(text: str | bytes | None) -> str | None:
+    """
+    从 CRIU 输出中提取错误签名：第一条 "Error (file.c:line): msg"，
+    去掉行号、数字与十六进制值，同类错误得到相同签名。
+    """
+    if not text:
+        return None
+    if isinstance(text, bytes):
+        text = text.decode("utf-8", errors="ignore")
+    lines = [l.strip() for l in text.splitlines() if l.strip()]
+    for line in lines:
+        m = _ERROR_LINE.search(line)
+        if m:
+            return _normalize(f"{m.group(1)}: {m.group(2)}")
+    return _normalize(lines[-1]) if lines else None
+
+
+def _normalize(s: str) -> str:
+    s = re.sub(r"0x[0-9a-fA-F]+", "X", s)
+    s = re.sub(r"\d+", "N", s)
+    return s[:160]
+
+
+# ---------- 记录 ----------
+@contextlib.contextmanager
+def _db():
+    """在文件锁下读写记录，修改后在退出时原子写回"""
+    DB_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(DB_FILE.with_suffix(".lock"), "a+") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            db = json.loads(DB_FILE.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            db = {}
+        for k in ("apps", "features", "snapshots"):
+            db.setdefault(k, {})
+        before = json.dumps(db, sort_keys=True)
+        yield db
+        if json.dumps(db, sort_keys=True) != before:
+            tmp = DB_FILE.with_name(f".{DB_FILE.name}.{os.getpid()}")
+            tmp.write_text(json.dumps(db, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, DB_FILE)
+
+
+def _observed(op: str, ok: bool) -> bool:
+    """成功的 dump 不说明能否恢复，不算观测"""
+    return op != "dump" or not ok
+
+
+def record(op: str, ok: bool, prof: dict | None = None, snapshot: str | None = None,
+           error: str | bytes | pathlib.Path | None = None) -> None:
+    """
+    记录一次结果。dump 传入 profile()，验证 / 恢复传入快照文件名；
+    error 为 CRIU 的错误输出或日志文件路径，失败时从中提取签名。
+    """
+    cfg = settings()
+    if not cfg["enabled"]:
+        return
+    try:
+        if isinstance(error, pathlib.Path):
+            error = error.read_text(errors="ignore") if error.exists() else None
+        sig = None if ok else signature(error)
+        with _db() as db:
+            if prof is None and snapshot is not None:
+                prof = db["snapshots"].get(snapshot)
+            if prof is None:
+                return
+            if op == "dump" and ok and snapshot is not None:
+                db["snapshots"][snapshot] = prof
+                for old in list(db["snapshots"])[:-int(cfg["max_snapshots"])]:
+                    del db["snapshots"][old]
+            if not _observed(op, ok):
+                return
+            entry = db["apps"].setdefault(prof["key"], {"exe": prof["exe"],
+                                                        "version": prof["version"],
+                                                        "recent": []})
+            # 只保留观测，成功的 dump 不占用窗口
+            entry["recent"] = [r for r in entry["recent"] if _observed(r[1], r[2])]
+            entry["recent"] = (entry["recent"] + [[time.time(), op, ok, sig]])[-int(cfg["window"]):]
+            for f in prof["features"]:
+                counts = db["features"].setdefault(f, [0, 0])
+                counts[0 if ok else 1] += 1
+    except OSError as e:
+        log.warning("记录兼容性结果失败: %s", e)
+        return
+    if not ok:
+        log.info("已记录 %s 失败 (%s)：%s", op, prof["key"], sig or "无错误签名")
+
+
+# ---------- 预测 ----------
+def predict(prof: dict) -> dict:
+    """
+    返回 {probability, samples, prior, errors}：
+    samples 为该应用的观测数，errors 为最常见的错误签名。
+    """
+    cfg = settings()
+    with _db() as db:
+        entry = db["apps"].get(prof["key"], {})
+        features = {f: db["features"].get(f, [0, 0]) for f in prof["features"]}
+    heuristic = 0.8 if prof["heuristic_ok"] else 0.4
+    weight = float(cfg["prior_weight"])
+    rates = [(weight * heuristic + s) / (weight + s + f) for s, f in features.values()]
+    prior = sum(rates) / len(rates) if rates else heuristic
+
+    obs = [r for r in entry.get("recent", []) if _observed(r[1], r[2])]
+    successes = sum(1 for r in obs if r[2])
+    probability = (weight * prior + successes) / (weight + len(obs))
+    errors = Counter(r[3] for r in obs if not r[2] and r[3])
+    return {"probability": probability, "samples": len(obs), "prior": prior,
+            "errors": [sig for sig, _n in errors.most_common(3)]}
+
+
+def gate(pids: List[int], priority: str) -> str | None:
+    """
+    自动任务 dump 前调用：返回实际使用的优先级，预计必然失败时返回 None（跳过）。
+    """
+    cfg = settings()
+    if not cfg["enabled"]:
+        return priority
+    prof = profile(pids)
+    if prof is None:
+        return priority
+    pred = predict(prof)
+    if pred["samples"] < int(cfg["min_samples"]):
+        return priority
+    p = pred["probability"]
+    reason = "；".join(pred["errors"]) or "无错误签名"
+    if p < float(cfg["skip_below"]):
+        if _retry_due(prof["key"], float(cfg["retry_after"])):
+            log.info("%s 预测成功率 %.0f%%，但已超过 %d 秒没有新结果，以 auto 优先级试探一次",
+                     prof["key"], p * 100, int(cfg["retry_after"]))
+            _SKIPPED.inc(action="retry")
+            return "auto"
+        log.info("跳过 %s 的快照：预测成功率 %.0f%%（%d 次记录，常见错误：%s）",
+                 prof["key"], p * 100, pred["samples"], reason)
+        _SKIPPED.inc(action="skip")
+        return None
+    if p < float(cfg["deprioritize_below"]) and PRIORITIES[priority] < PRIORITIES["auto"]:
+        log.info("%s 预测成功率 %.0f%%，降为 auto 优先级", prof["key"], p * 100)
+        _SKIPPED.inc(action="deprioritize")
+        return "auto"
+    return priority
+
+
+def _retry_due(key: str, retry_after: float) -> bool:
+    """距该应用最近一次观测或试探已超过 retry_after 秒时记下本次试探并返回 True"""
+    now = time.time()
+    with _db() as db:
+        entry = db["apps"].get(key)
+        if entry is None:
+            return True
+        last = max([r[0] for r in entry["recent"]] + [entry.get("retried_at", 0)])
+        if now - last < retry_after:
+            return False
+        entry["retried_at"] = now
+    return True
+
+
+def profiles() -> List[dict]:
+    """各应用的记录汇总，供 CLI 展示"""
+    with _db() as db:
+        apps = dict(db["apps"])
+    out = []
+    for key, entry in apps.items():
+        obs = [r for r in entry["recent"] if _observed(r[1], r[2])]
+        errors = Counter(r[3] for r in obs if not r[2] and r[3])
+        out.append({"key": key, "exe": entry["exe"], "version": entry["version"],
+                    "successes": sum(1 for r in obs if r[2]),
+                    "failures": sum(1 for r in obs if not r[2]),
+                    "errors": dict(errors.most_common(3))})
+    return sorted(out, key=lambda e: e["key"])
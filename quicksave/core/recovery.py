@@ -0,0 +1,36 @@
+"""
+守护进程启动时清理上次崩溃或被杀留下的中间文件：
+- .<名称>.part      写入被中断的快照（仍在写入的持有文件锁，不会被删除）
+- .<名称>.tier / .rebase  降级、重建时已写完但未替换原文件的结果，原快照完好
+- <名称>.bak        旧版本恢复时改名的快照，改回 .qsnap
+"""
+from quicksave.utils import fileio
+from quicksave.utils.logger import log
+from .refs import REFS_DIR
+from .tiering import snapshot_dirs
+
+# 降级（tiering.demote）与重建（refs.rebase）的中间结果
+_STAGED = (".tier", ".rebase")
+
+
+def clean_interrupted() -> int:
+    """返回处理的文件数"""
+    done = 0
+    for directory in [*snapshot_dirs(), REFS_DIR]:
+        if not directory.exists():
+            continue
+        done += fileio.remove_partials(directory)
+        for suffix in _STAGED:
+            for staged in directory.glob(f".*.qsnap{suffix}"):
+                staged.unlink(missing_ok=True)
+                log.info("删除未完成替换的中间文件 %s", staged.name)
+                done += 1
+        for bak in directory.glob("*.bak"):
+            qsnap = bak.with_suffix(".qsnap")
+            if qsnap.exists():
+                log.warning("%s 与 %s 同时存在，保留两者", bak.name, qsnap.name)
+                continue
+            bak.rename(qsnap)
+            log.info("恢复被中断时改名的快照 %s", qsnap.name)
+            done += 1
+    return done
@@ -0,0 +1,126 @@
+"""
+差分快照的参考管理。
+
+开启 delta 后，自动 / 定时快照以同一应用（zdict.app_key）最近的完整快照为参考，
+只保存与它的差异（见 utils.delta）。参考快照被删除时，如果仍有快照
+依赖它，先移入 .refs/ 保留；后台的 Rebaser 定期调用 collect()，把依赖它的快照重建
+为完整快照，之后再真正删除参考快照。
+"""
+import os
+import pathlib
+import struct
+import tempfile
+import time
+from typing import List, Tuple
+
+from quicksave.utils import delta, fileio
+from quicksave.utils.compress import (REFS_DIRNAME, compress_dir, decompress_file,
+                                      read_snapshot_header)
+from quicksave.utils.config import get_section
+from quicksave.utils.logger import log
+from . import QS_DIR
+
+REFS_DIR = QS_DIR / REFS_DIRNAME
+
+
+def _header(path: pathlib.Path) -> dict | None:
+    try:
+        return read_snapshot_header(path)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def _newest_first(paths) -> List[Tuple[float, pathlib.Path]]:
+    found = []
+    for path in paths:
+        try:
+            found.append((path.stat().st_mtime, path))
+        except OSError:
+            continue
+    return sorted(found, reverse=True)
+
+
+def pick_reference(app: str | None, label: str | None) -> pathlib.Path | None:
+    """为新快照选择参考快照：同一应用最近的完整 v2 快照；未开启或不适用时返回 None"""
+    cfg = get_section("delta", delta.DEFAULTS)
+    if not cfg["enabled"] or not app or label not in cfg["labels"]:
+        return None
+    if not delta.available():
+        log.debug("未找到 zstd 命令行工具，不做差分快照")
+        return None
+    cutoff = time.time() - cfg["max_ref_age"]
+    for mtime, path in _newest_first(QS_DIR.glob("*.qsnap")):
+        if mtime < cutoff:
+            break
+        header = _header(path)
+        if header and header.get("app") == app and "id" in header and "ref" not in header:
+            return path
+    return None
+
+
+def dependents(name: str, ref_id: str) -> List[pathlib.Path]:
+    """以 name / ref_id 为参考的快照"""
+    out = []
+    for path in QS_DIR.glob("*.qsnap"):
+        ref = (_header(path) or {}).get("ref")
+        if ref and ref["name"] == name and ref["id"] == ref_id:
+            out.append(path)
+    return out
+
+
+def remove_snapshot(path: pathlib.Path, name: str | None = None) -> None:
+    """
+    删除快照。仍被差分快照引用时改为移入 .refs/，由 collect() 在依赖重建后删除。
+    name 为快照在依赖中记录的文件名，默认为 path.name。
+    快照正在恢复时抛出 fileio.SnapshotBusy。
+    """
+    name = name or path.name
+    header = _header(path)
+    with fileio.lease(path, exclusive=True, wait=False):
+        if header and "id" in header and dependents(name, header["id"]):
+            REFS_DIR.mkdir(exist_ok=True)
+            os.replace(path, REFS_DIR / name)
+            log.info("快照 %s 仍被差分快照引用，暂存到 %s", name, REFS_DIR)
+        else:
+            path.unlink()
+
+
+def rebase(path: pathlib.Path) -> None:
+    """把差分快照重建为完整快照：原子替换，保留修改时间"""
+    header = _header(path)
+    if not header or "ref" not in header:
+        return
+    st = path.stat()
+    tmp_out = path.with_name(f".{path.name}.rebase")
+    with tempfile.TemporaryDirectory(prefix="qs_rebase_") as tmp:
+        decompress_file(path, pathlib.Path(tmp))
+        compress_dir(pathlib.Path(tmp), tmp_out, app=header.get("app"), samples=False,
+                     tier=header.get("tier", "hot"))
+    os.utime(tmp_out, ns=(st.st_atime_ns, st.st_mtime_ns))
+    try:
+        with fileio.lease(path, exclusive=True, wait=False):
+            os.replace(tmp_out, path)
+    except OSError:
+        tmp_out.unlink(missing_ok=True)
+        raise
+    log.info("快照 %s 已重建为完整快照（原参考 %s）", path.name, header["ref"]["name"])
+
+
+def collect() -> int:
+    """重建依赖 .refs/ 中参考快照的快照，删除不再被引用的参考快照；返回重建的数量"""
+    if not REFS_DIR.exists():
+        return 0
+    rebased = 0
+    for ref in sorted(REFS_DIR.glob("*.qsnap")):
+        header = _header(ref)
+        waiting = dependents(ref.name, header["id"]) if header and "id" in header else []
+        for path in waiting:
+            try:
+                rebase(path)
+                rebased += 1
+            except Exception as e:
+                log.error("重建快照失败 %s: %s", path.name, e)
+        if header is None or not dependents(ref.name, header.get("id")):
+            ref.unlink(missing_ok=True)
+            log.info("参考快照 %s 已无依赖，删除", ref.name)
+    return rebased
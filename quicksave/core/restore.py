@@ -1,3 +1,4 @@
+import logging
 import os
 import pathlib
 import shutil
@@ -5,14 +6,19 @@ import signal
 import subprocess
 import tempfile
 import sys
+from time import perf_counter
 from typing import List
 
-from quicksave.utils.logger import log
+from quicksave.utils import fileio, governor, metrics, profiler
+from quicksave.utils.logger import LOG_DIR, log, log_context, Sampled
+from quicksave.utils.profiler import profiled
 from quicksave.utils.timer import timed
 from quicksave.utils.compress import decompress_file
 from ._criu import build as criu_cmd
+from .cache import RestoreCache, get_cache
+from . import outcomes
 
-__all__ = ["restore", "verify_only"]
+__all__ = ["restore", "restore_headless", "verify_only"]
 
 _PIDFILE = "restored.pid"
 
@@ -20,16 +26,17 @@ _PIDFILE = "restored.pid"
 def _fix_permissions(directory: pathlib.Path):
     """修复目录中所有文件的权限"""
     try:
-        log.info("开始修复文件权限...")
+        warn = Sampled(logging.WARNING)
+        n_dirs = n_files = 0
         for root, dirs, files in os.walk(directory):
             # 修复目录权限
             for d in dirs:
                 path = pathlib.Path(root) / d
                 try:
                     os.chmod(path, 0o755)  # drwxr-xr-x
-                    log.debug("修复目录权限: %s", path)
+                    n_dirs += 1
                 except Exception as e:
-                    log.warning("修复目录权限失败 %s: %s", path, e)
+                    warn("修复目录权限失败 %s: %s", path, e)
             
             # 修复文件权限
             for f in files:
@@ -40,23 +47,71 @@ def _fix_permissions(directory: pathlib.Path):
                         os.chmod(path, 0o755)  # -rwxr-xr-x
                     else:
                         os.chmod(path, 0o644)  # -rw-r--r--
-                    log.debug("修复文件权限: %s", path)
+                    n_files += 1
                 except Exception as e:
-                    log.warning("修复文件权限失败 %s: %s", path, e)
-        log.info("文件权限修复完成")
+                    warn("修复文件权限失败 %s: %s", path, e)
+        if warn.count:
+            log.warning("文件权限修复失败%s", warn.summary())
+        log.info("文件权限修复完成: %d 个目录, %d 个文件", n_dirs, n_files)
     except Exception as e:
         log.error("修复文件权限时发生错误: %s", e)
 
 
-def _exec(cmd: List[str]) -> bool:
-    """运行 cmd；Ctrl-C 时杀掉整个进程组并返回 False。"""
+def _count_extracted(op: str, qsnap: pathlib.Path, workdir: pathlib.Path) -> None:
+    """记录解压阶段读入的快照字节数与展开后的镜像字节数"""
+    metrics.BYTES_IN.inc(qsnap.stat().st_size, op=op)
+    metrics.BYTES_OUT.inc(metrics.dir_size(workdir), op=op)
+
+
+def _make_workdir(prefix: str, cache: RestoreCache | None) -> pathlib.Path:
+    """启用恢复缓存时把工作目录建在缓存所在的文件系统上，便于硬链接"""
+    if cache is not None:
+        return cache.workdir(prefix)
+    return pathlib.Path(tempfile.mkdtemp(prefix=prefix))
+
+
+def _extract(op: str, qsnap: pathlib.Path, workdir: pathlib.Path,
+             cache: RestoreCache | None, private: bool = False) -> None:
+    """
+    把快照镜像放入 workdir：缓存命中时跳过解压，未命中则解压并写入缓存。
+    期间持有快照的共享租约，快照不会被删除或替换。
+    镜像权限在解压后、写入缓存前修复；命中时与缓存共享 inode，不再修改。
+    private 为 True 时 workdir 与缓存之间复制而不是硬链接，调用者可以修改其中文件的权限。
+    """
+    with fileio.lease(qsnap):
+        if cache is not None and cache.checkout(qsnap, workdir, link=not private):
+            return
+        decompress_file(qsnap, workdir)
+        _fix_permissions(workdir)
+        _count_extracted(op, qsnap, workdir)
+        if cache is not None:
+            try:
+                cache.store(qsnap, workdir, link=not private)
+            except OSError as e:
+                log.warning("写入恢复缓存失败: %s", e)
+
+
+def _exec(cmd: List[str], governed: bool = False) -> bool:
+    """
+    运行 cmd；Ctrl-C 时杀掉整个进程组并返回 False。
+    governed 为 True 时放入资源调控（见 governor），用于验证这类后台恢复。
+    """
+    preexec = os.setsid             # 让其成为新进程组组长
+    if governed:
+        cmd, limit = governor.wrap(cmd)
+        preexec = governor.chain(os.setsid, limit)
     log.debug("执行命令: %s", " ".join(cmd))
+    with profiler.child(os.path.basename(cmd[0])):
+        return _communicate(cmd, preexec)
+
+
+def _communicate(cmd: List[str], preexec) -> bool:
     proc = subprocess.Popen(
         cmd,
         stdin=subprocess.DEVNULL,
         stderr=subprocess.PIPE,     # 捕获错误输出
         stdout=subprocess.PIPE,     # 捕获标准输出
-        preexec_fn=os.setsid        # 让其成为新进程组组长
+        preexec_fn=preexec
     )
     try:
         stdout, stderr = proc.communicate()
@@ -81,7 +136,6 @@ def _do_restore(workdir: pathlib.Path) -> bool:
     在终端中执行 CRIU 恢复命令。
     """
     try:
-        _fix_permissions(workdir)
         criu_args = criu_cmd(
             "restore", "-D", str(workdir),
             "--shell-job", "--ext-unix-sk"
@@ -130,33 +184,83 @@ read
         return False
 
 
+_UNSHARE_PID = ["unshare", "--pid", "--fork", "--mount-proc"]
+
+
+def _criu_restore_detached(workdir: pathlib.Path, pidfile: pathlib.Path,
+                           with_pty: bool = False,
+                           prefix: List[str] | None = None,
+                           governed: bool = False) -> int | None:
+    """
+    以 -d 方式直接运行 CRIU restore，CRIU 返回即代表恢复完成。
+    成功时返回 pidfile 中记录的进程 PID，失败返回 None。
+    with_pty 为 True 时通过 script 提供伪终端（仅用于马上会被杀掉的验证进程）。
+    prefix 会加在整条命令之前（例如 unshare 进入新的 PID 命名空间）。
+    governed 为 True 时受资源调控，只用于验证，正式恢复不受限制。
+    """
+    base = criu_cmd(
+        "restore", "-D", str(workdir),
+        "--shell-job", "--ext-unix-sk", "-d",
+        "--pidfile", str(pidfile), "-o", "restore.log"
+    )
+    cmd = (["script", "-q", "-c", " ".join(base), "/dev/null"]
+           if with_pty and os.geteuid() == 0 else base)
+    if prefix:
+        cmd = [*prefix, *cmd]
+    if not _exec(cmd, governed=governed):
+        return None
+    try:
+        return int(pidfile.read_text().strip())
+    except (OSError, ValueError) as e:
+        log.error("读取 pidfile 失败 %s: %s", pidfile, e)
+        return None
+
+
+def _do_restore_headless(workdir: pathlib.Path) -> int | None:
+    """
+    不启动终端，直接运行 CRIU 恢复。
+    返回恢复出的进程 PID；CRIU 返回即代表恢复真正结束，可用于计时。
+    """
+    t0 = perf_counter()
+    pid = _criu_restore_detached(workdir, workdir / _PIDFILE)
+    if pid is None:
+        log.error("无终端恢复失败，耗时 %.3f s", perf_counter() - t0)
+    else:
+        log.info("无终端恢复完成: pid=%d，耗时 %.3f s", pid, perf_counter() - t0)
+    return pid
+
+
+def _has_display() -> bool:
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+@profiled("verify")
 @timed
-def verify_only(qsnap: pathlib.Path) -> bool:
+def verify_only(qsnap: pathlib.Path, isolate: bool = False) -> bool:
     """
     验证快照完整性。
     后台恢复→读取 pidfile→立刻 kill；快速验证镜像完整性。
+    isolate 为 True 时在独立的 PID 命名空间中恢复（需要 root），
+    命名空间的 init 退出时恢复出的进程随之结束，不会与宿主上的 PID 冲突。
     """
-    tmp = pathlib.Path(tempfile.mkdtemp(prefix="qs_ver_"))
+    cache = get_cache()
+    tmp = _make_workdir("qs_ver_", cache)
     pidfile = tmp / _PIDFILE
+    t0 = perf_counter()
+    ok = False
     try:
         log.info("开始验证快照: %s", qsnap)
-        decompress_file(qsnap, tmp)
-        
-        # 修复文件权限
-        _fix_permissions(tmp)
-        
-        base = criu_cmd(
-            "restore", "-D", str(tmp),
-            "--shell-job", "--ext-unix-sk", "-d",
-            "--pidfile", str(pidfile)
-        )
-        cmd = (["script", "-q", "-c", " ".join(base), "/dev/null"]
-               if os.geteuid() == 0 else base)
+        with log_context(snapshot=qsnap.name, phase="extract"):
+            _extract("verify", qsnap, tmp, cache)
 
-        ok = _exec(cmd)
+        with log_context(snapshot=qsnap.name, phase="criu-verify"):
+            pid = _criu_restore_detached(tmp, pidfile, with_pty=True,
+                                         prefix=_UNSHARE_PID if isolate else None,
+                                         governed=True)
+        ok = pid is not None
 
-        if ok and pidfile.exists():
-            pid = int(pidfile.read_text().strip())
+        # pidfile 中是命名空间内的 PID，隔离模式下不能在宿主上 kill
+        if ok and not isolate:
             try:
                 os.kill(pid, signal.SIGTERM)
             except ProcessLookupError:
@@ -166,60 +270,75 @@ def verify_only(qsnap: pathlib.Path) -> bool:
         return ok
     except Exception as e:
         log.error("验证快照失败: %s", str(e))
+        ok = False
         return False
     finally:
+        outcomes.record("verify", ok, snapshot=qsnap.name, error=tmp / "restore.log")
         shutil.rmtree(tmp, ignore_errors=True)
+        metrics.record_op("verify", ok, perf_counter() - t0)
 
 
+@profiled("restore")
 @timed
-def restore(qsnap: pathlib.Path) -> bool:
+def restore(qsnap: pathlib.Path, headless: bool | None = None) -> bool:
     """
     恢复快照。
-    解压 .qsnap → restore；成功则删除 .bak，否则回滚。
+    解压 .qsnap → restore；快照本身保持不变，可以再次恢复。
+    headless 为 None 时，没有图形会话（DISPLAY/WAYLAND_DISPLAY）则自动走无终端路径。
     """
+    if headless is None:
+        headless = not _has_display()
+    with log_context(snapshot=qsnap.name):
+        return bool(_restore(qsnap, headless=headless))
+
+
+@profiled("restore")
+@timed
+def restore_headless(qsnap: pathlib.Path) -> int | None:
+    """
+    不依赖终端模拟器恢复快照，适用于服务器与自动化故障切换。
+    返回恢复出的进程 PID，失败返回 None；工作目录在返回前清理。
+    """
+    with log_context(snapshot=qsnap.name):
+        pid = _restore(qsnap, headless=True)
+    return pid if pid else None
+
+
+def _restore(qsnap: pathlib.Path, headless: bool) -> int | bool | None:
     if not qsnap.exists():
         log.error("快照文件不存在: %s", qsnap)
         raise FileNotFoundError(qsnap)
 
-    bak = qsnap.with_suffix(".bak")
-    # 先将 .qsnap 重命名为 .bak，避免后续找不到 .bak 文件
-    if not bak.exists():
-        qsnap.rename(bak)
-    else:
-        log.warning("备份文件已存在: %s，将覆盖原有备份。", bak)
-        bak.unlink()
-        qsnap.rename(bak)
-
-    tmp = pathlib.Path(tempfile.mkdtemp(prefix="qs_res_"))
+    cache = get_cache()
+    tmp = _make_workdir("qs_res_", cache)
+    t0 = perf_counter()
     ok = False
     try:
-        log.info("开始恢复快照: %s", bak)
-        decompress_file(bak, tmp)
+        log.info("开始恢复快照: %s", qsnap)
+        with log_context(phase="extract"):
+            _extract("restore", qsnap, tmp, cache)
         # 检查解压后的文件
-        log.info("检查解压后的文件...")
-        for root, dirs, files in os.walk(tmp):
-            for f in files:
-                path = pathlib.Path(root) / f
-                log.debug("文件: %s (大小: %d 字节)", path, path.stat().st_size)
-        # 在终端中执行恢复命令，只传 workdir
-        ok = _do_restore(tmp)
+        sizes = [(p.stat().st_size, p.name) for p in tmp.rglob("*") if p.is_file()]
+        log.info("解压得到 %d 个文件，共 %.1f MiB", len(sizes), sum(s for s, _ in sizes) / 2**20)
+        log.debug("最大的文件: %s", ", ".join(f"{n} ({s} 字节)" for s, n in sorted(sizes)[-5:]))
+        with log_context(phase="criu-restore"):
+            if headless:
+                ok = _do_restore_headless(tmp)
+            else:
+                # 在终端中执行恢复命令，只传 workdir
+                ok = _do_restore(tmp)
         if ok:
-            log.info("恢复成功，删除备份文件")
-            bak.unlink()
+            log.info("恢复成功")
         else:
-            log.warning("恢复失败，回滚到原始快照")
-            bak.rename(qsnap)
+            log.warning("恢复失败，快照保持不变")
         return ok
     except Exception as e:
         log.error("恢复快照时发生错误: %s", str(e))
-        if bak.exists():
-            log.info("回滚到原始快照")
-            bak.rename(qsnap)
         return False
     finally:
+        metrics.record_op("restore", bool(ok), perf_counter() - t0)
         # 保存日志文件
-        log_dir = pathlib.Path.home() / ".quicksave" / "logs"
-        log_dir.mkdir(parents=True, exist_ok=True)
+        log_dir = LOG_DIR
         try:
             if (tmp / "restore.log").exists():
                 shutil.copy2(tmp / "restore.log", log_dir / f"restore_{qsnap.stem}.log")
@@ -227,4 +346,7 @@ def restore(qsnap: pathlib.Path) -> bool:
                 shutil.copy2(tmp / "action.log", log_dir / f"action_{qsnap.stem}.log")
         except Exception as e:
             log.error("保存日志文件失败: %s", e)
-        # 不再在这里删除 tmp 目录，由新终端脚本负责
+        # 终端模式下 tmp 由新终端脚本负责删除；无终端模式 CRIU 已返回，可以直接清理
+        if headless:
+            outcomes.record("restore", bool(ok), snapshot=qsnap.name, error=tmp / "restore.log")
+            shutil.rmtree(tmp, ignore_errors=True)
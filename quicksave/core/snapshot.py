@@ -4,56 +4,181 @@ import pathlib
 import shutil
 import subprocess
 import tempfile
-from typing import List
+from time import perf_counter
+from typing import Callable, List
 
-from quicksave.utils.logger import log
+from quicksave.utils import metrics, zdict
+from quicksave.utils.logger import log, log_context
+from quicksave.utils.profiler import child as profile_child, profiled
 from quicksave.utils.timer import timed
 from quicksave.utils.compress import compress_dir
-from ._criu import build as criu_cmd
-from . import QS_DIR
+from ._criu import build as criu_cmd, dump_stats
+from .admission import admit
+from .freezer import CgroupFreezer, enabled as freezer_enabled
+from .refs import pick_reference
+from . import QS_DIR, outcomes
 
+# 快照发布后的回调（例如复制线程），签名为 hook(path)
+_publish_hooks: List[Callable[[pathlib.Path], None]] = []
 
+
+def add_publish_hook(hook: Callable[[pathlib.Path], None]) -> None:
+    """注册快照发布回调；回调应尽快返回，耗时工作请放到自己的线程中"""
+    if hook not in _publish_hooks:
+        _publish_hooks.append(hook)
+
+
+def _published(path: pathlib.Path) -> None:
+    for hook in list(_publish_hooks):
+        try:
+            hook(path)
+        except Exception as e:
+            log.error("快照发布回调失败: %s", e)
+
+
+@profiled("dump")
 @timed
-def dump(pids: List[int], label: str | None = None) -> pathlib.Path:
+def dump(pids: List[int], label: str | None = None,
+         priority: str = "interactive", freeze_cgroup: bool | None = None) -> pathlib.Path:
+    """
+    快照 pids[0] 所在的进程树。
+    先经过全机准入队列（见 admission），priority 为 interactive / scheduled / auto。
+    freeze_cgroup 为 True 时用 cgroup 冻结进程树，None 时按配置 freezer.enabled。
+    """
     if not pids:
         raise ValueError("pids list cannot be empty")
 
+    with admit(pids, priority):
+        return _dump(pids, label, freezer_enabled(freeze_cgroup))
+
+
+def _dump(pids: List[int], label: str | None, freeze_cgroup: bool) -> pathlib.Path:
+    out_file = snapshot_path(label)
+
+    tmp_dump = pathlib.Path(tempfile.mkdtemp(prefix="qs_dmp_"))
+    t0 = perf_counter()
+    ok = False
+    with log_context(snapshot=out_file.name):
+        try:
+            # 进程在 dump 后不再存在，先取应用标识用于选择 zstd 字典
+            app = zdict.app_key(pids[0])
+            ref = pick_reference(app, label)
+            prof = outcomes.profile(pids)
+            with log_context(phase="criu-dump"):
+                try:
+                    _criu_dump(str(pids[0]), tmp_dump, freeze_cgroup)
+                except subprocess.CalledProcessError as e:
+                    outcomes.record("dump", False, prof, error=e.stderr)
+                    raise
+
+            image_bytes = metrics.dir_size(tmp_dump)
+            with log_context(phase="compress"):
+                log.info("compress to %s%s", out_file, f" (delta against {ref.name})" if ref else "")
+                compress_dir(tmp_dump, out_file, app=app, ref=ref)
+            out_bytes = _record_sizes(image_bytes, out_file)
+            ok = True
+        finally:
+            shutil.rmtree(tmp_dump, ignore_errors=True)
+            metrics.record_op("dump", ok, perf_counter() - t0)
+        log.info("dump finished => %s (%.1f MiB)", out_file,
+                 out_bytes / 2**20)
+    outcomes.record("dump", True, prof, snapshot=out_file.name)
+    _published(out_file)
+    return out_file
+
+
+def snapshot_path(label: str | None = None) -> pathlib.Path:
+    """按 <label>_<时间戳>.qsnap 生成快照文件路径"""
     ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     prefix = f"{label}_" if label else ""
-    out_file = QS_DIR / f"{prefix}{ts}.qsnap"
+    return QS_DIR / f"{prefix}{ts}.qsnap"
 
-    tmp_dump = pathlib.Path(tempfile.mkdtemp(prefix="qs_dmp_"))
-    leader = str(pids[0])
-    root   = os.geteuid() == 0
-
-    # ---------- root 分支 ----------
-    if root:
-        log.info("pre-dump pid=%s -> %s", leader, tmp_dump)
-        subprocess.run(
-            criu_cmd("pre-dump", "-t", leader, "-D", tmp_dump,
-                     "--track-mem", "--shell-job"),
-            check=True, stdin=subprocess.DEVNULL,
-        )
-
-        log.info("final dump (root)…")
-        subprocess.run(
-            criu_cmd("dump", "-t", leader, "-D", tmp_dump,
-                     "--shell-job", "--tcp-established", "--ext-unix-sk"),
-            check=True, stdin=subprocess.DEVNULL,
-        )
-
-    # ---------- rootless 分支 ----------
-    else:
-        log.info("rootless dump pid=%s -> %s", leader, tmp_dump)
-        subprocess.run(
-            criu_cmd("dump", "-t", leader, "-D", tmp_dump,
-                     "--shell-job", "--ext-unix-sk"),
-            check=True, stdin=subprocess.DEVNULL,
-        )
-
-    log.info("compress to %s", out_file)
-    compress_dir(tmp_dump, out_file)
-    shutil.rmtree(tmp_dump, ignore_errors=True)
-    log.info("dump finished => %s (%.1f MiB)", out_file,
-             out_file.stat().st_size / 2**20)
-    return out_file
\ No newline at end of file
+
+def _record_sizes(image_bytes: int, out_file: pathlib.Path) -> int:
+    """记录镜像与快照大小指标，返回快照字节数"""
+    out_bytes = out_file.stat().st_size
+    metrics.BYTES_IN.inc(image_bytes, op="dump")
+    metrics.BYTES_OUT.inc(out_bytes, op="dump")
+    metrics.SNAPSHOT_BYTES.observe(out_bytes)
+    if out_bytes:
+        metrics.COMPRESSION_RATIO.observe(image_bytes / out_bytes)
+    return out_bytes
+
+
+def _criu_dump(leader: str, tmp_dump: pathlib.Path, freeze_cgroup: bool = False) -> None:
+    """
+    按当前权限执行 CRIU dump；最终 dump 的耗时即进程树被冻结的时间。
+    freeze_cgroup 为 True 时先用 cgroup 冻结整棵树（见 freezer），CRIU 只需 seize。
+    """
+    root = os.geteuid() == 0
+    fz = CgroupFreezer.prepare(int(leader)) if freeze_cgroup else None
+    extra = fz.criu_args() if fz is not None else []
+    freeze = None
+    ok = False
+    try:
+        # ---------- root 分支 ----------
+        if root:
+            log.info("pre-dump pid=%s -> %s", leader, tmp_dump)
+            with profile_child("criu pre-dump"):
+                _run_criu(criu_cmd("pre-dump", "-t", leader, "-D", tmp_dump,
+                                   "--track-mem", "--shell-job", *extra))
+            log.info("final dump (root)…")
+        else:
+            log.info("rootless dump pid=%s -> %s", leader, tmp_dump)
+
+        t0 = perf_counter()
+        if fz is not None:
+            freeze = _freeze(fz)
+        with profile_child("criu dump"):
+            if root:
+                _run_criu(criu_cmd("dump", "-t", leader, "-D", tmp_dump,
+                                   "--shell-job", "--tcp-established", "--ext-unix-sk", *extra))
+
+            # ---------- rootless 分支 ----------
+            else:
+                _run_criu(criu_cmd("dump", "-t", leader, "-D", tmp_dump,
+                                   "--shell-job", "--ext-unix-sk", *extra))
+        ok = True
+    finally:
+        if fz is not None:
+            fz.release(ok)
+    metrics.FREEZE_SECONDS.observe(perf_counter() - t0)
+    _record_phases(tmp_dump, "cgroup" if fz is not None else "ptrace", freeze)
+
+
+def _run_criu(cmd: List[str]) -> None:
+    """运行 CRIU；失败时抛出带 stderr 的 CalledProcessError（用于提取错误签名）"""
+    proc = subprocess.run(cmd, stdin=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    err = proc.stderr.decode("utf-8", errors="ignore").strip()
+    if proc.returncode != 0:
+        log.error("命令错误: %s", err)
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=err)
+    if err:
+        log.debug("criu: %s", err)
+
+
+def _freeze(fz: CgroupFreezer) -> float | None:
+    """冻结失败时仍把 cgroup 交给 CRIU，由它自行冻结（此时无法单独统计冻结耗时）"""
+    try:
+        return fz.freeze()
+    except OSError as e:
+        log.warning("cgroup 冻结失败，交由 CRIU 冻结: %s", e)
+        return None
+
+
+def _ms(seconds: float | None) -> str:
+    return "-" if seconds is None else f"{seconds * 1000:.1f} ms"
+
+
+def _record_phases(tmp_dump: pathlib.Path, strategy: str, freeze: float | None) -> None:
+    """
+    分别记录冻结与 seize 耗时。CRIU 的 freezing_time 覆盖停住并 seize 全部任务的过程；
+    cgroup 方式下进程树在 CRIU 启动前已冻结，它只剩 seize。
+    """
+    stats = dump_stats(tmp_dump)
+    phases = {"freeze": freeze, "seize": stats.get("freezing"), "frozen": stats.get("frozen")}
+    for phase, seconds in phases.items():
+        if seconds is not None:
+            metrics.DUMP_PHASE_SECONDS.observe(seconds, phase=phase, strategy=strategy)
+    log.info("冻结方式 %s：冻结 %s，seize %s，冻结总时长 %s", strategy,
+             _ms(freeze), _ms(phases["seize"]), _ms(phases["frozen"]))
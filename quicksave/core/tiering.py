@@ -0,0 +1,137 @@
+"""
+快照的冷热分层。
+
+dump 使用配置中的快速格式（热层，例如 lz4 或低级别 zstd），保证冻结后尽快落盘；
+超过 age 秒的快照几乎不会再被恢复，TierManager 在机器空闲时把它们用高压缩比的
+冷层格式重新压缩（进程内编解码与外部压缩器都受 governor 调控），原子替换原文件，
+并可移动到单独的冷层目录。头部的 tier 字段记录快照所在层级。
+
+仍被差分快照引用的快照暂不降级；差分快照降级时重建为完整快照。
+配置见 config.json 的 "tiering" 小节。
+"""
+import os
+import pathlib
+import struct
+import tempfile
+import time
+from typing import List
+
+from quicksave.utils import codecs, fileio
+from quicksave.utils.compress import compress_dir, decompress_file, read_snapshot_header
+from quicksave.utils.config import get_section
+from quicksave.utils.logger import log
+from . import QS_DIR
+from .admission import idle as admission_idle
+from .refs import dependents
+
+TIER_HOT = "hot"
+TIER_COLD = "cold"
+
+DEFAULTS = {
+    "enabled": False,
+    "age": 86400,              # 超过该秒数的快照降级到冷层
+    "codec": "zstd",
+    "level": 19,
+    "dir": "",                 # 冷层目录，为空时留在 QS_DIR
+    "interval": 600,           # 检查间隔（秒）
+    "max_load": 0.5,           # 每核 1 分钟平均负载高于该值时视为繁忙
+}
+
+
+def cold_dir(cfg: dict | None = None) -> pathlib.Path:
+    cfg = cfg or get_section("tiering", DEFAULTS)
+    return pathlib.Path(cfg["dir"]).expanduser() if cfg["dir"] else QS_DIR
+
+
+def snapshot_dirs() -> List[pathlib.Path]:
+    """存放快照的所有目录：QS_DIR 以及配置的冷层目录"""
+    dirs = [QS_DIR]
+    cold = cold_dir()
+    if cold != QS_DIR:
+        dirs.append(cold)
+    return dirs
+
+
+def tier_of(path: pathlib.Path) -> str:
+    try:
+        header = read_snapshot_header(path)
+    except (OSError, ValueError, struct.error):
+        return TIER_HOT
+    return (header or {}).get("tier", TIER_HOT)
+
+
+def system_idle(cfg: dict) -> bool:
+    """没有快照任务在运行或排队，且系统负载低于 max_load"""
+    if not admission_idle():
+        return False
+    try:
+        load = os.getloadavg()[0] / (os.cpu_count() or 1)
+    except OSError:
+        return True
+    return load <= float(cfg["max_load"])
+
+
+def candidates(cfg: dict) -> List[pathlib.Path]:
+    """需要降级的快照，最旧的在前"""
+    cutoff = time.time() - float(cfg["age"])
+    found = []
+    for directory in snapshot_dirs():
+        for path in directory.glob("*.qsnap"):
+            try:
+                mtime = path.stat().st_mtime
+            except OSError:
+                continue
+            if mtime < cutoff:
+                found.append((mtime, path))
+    out = []
+    for _mtime, path in sorted(found):
+        try:
+            header = read_snapshot_header(path)
+        except (OSError, ValueError, struct.error):
+            continue
+        if header is None or header.get("tier", TIER_HOT) == TIER_COLD:
+            continue                      # 旧格式无法记录层级，保持原样
+        if "id" in header and dependents(path.name, header["id"]):
+            continue
+        out.append(path)
+    return out
+
+
+def demote(path: pathlib.Path, cfg: dict) -> pathlib.Path:
+    """把快照重新压缩到冷层，返回新路径"""
+    codec = (cfg["codec"], int(cfg["level"]))
+    if codec[0] not in codecs.available():
+        raise codecs.CodecUnavailable(f"冷层压缩格式 {codec[0]} 不可用")
+    header = read_snapshot_header(path) or {}
+    st = path.stat()
+    target_dir = cold_dir(cfg)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    tmp_out = target_dir / f".{path.name}.tier"
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="qs_tier_") as tmp:
+        decompress_file(path, pathlib.Path(tmp))
+        # 沿用原 id：重新压缩期间以它为参考的差分快照在替换后仍然有效
+        compress_dir(pathlib.Path(tmp), tmp_out, app=header.get("app"), samples=False,
+                     codec=codec, tier=TIER_COLD, snapshot_id=header.get("id"))
+    target = target_dir / path.name
+    try:
+        # 重新压缩期间快照可能被删除、重建或被新的差分快照引用，此时放弃结果；
+        # 正在恢复时下次再降级
+        with fileio.lease(path, exclusive=True, wait=False):
+            if path.stat().st_ino != st.st_ino:
+                raise FileNotFoundError(path)
+            if "id" in header and dependents(path.name, header["id"]):
+                raise fileio.SnapshotBusy(f"{path.name} 已被差分快照引用")
+            os.utime(tmp_out, ns=(st.st_atime_ns, st.st_mtime_ns))
+            os.replace(tmp_out, target)
+            fileio.fsync_dir(target_dir)
+            # 在租约内删除原文件，避免崩溃后同一快照同时留在两层
+            if target != path:
+                path.unlink()
+                fileio.fsync_dir(path.parent)
+    except OSError:
+        tmp_out.unlink(missing_ok=True)
+        raise
+    log.info("快照 %s 已降级到冷层：%.1f → %.1f MiB，用时 %.1f s", path.name,
+             st.st_size / 2**20, target.stat().st_size / 2**20, time.perf_counter() - t0)
+    return target
@@ -0,0 +1,158 @@
+"""
+批量验证 QS_DIR 中的快照。
+
+每个快照在独立临时目录（root 时还有独立 PID 命名空间）中并发验证，
+并发度按 CPU 数与可用内存确定。通过验证的结论按 (路径, 大小, mtime, 内容哈希)
+记录在 verdicts.json 中，快照未变化时后续运行直接复用；失败可能由环境造成
+（CRIU 缺失、权限、PID 被占用等），不记录，下次重新验证。
+"""
+import fcntl
+import json
+import os
+import pathlib
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Iterable, List
+
+from quicksave.utils.digest import file_digest
+from quicksave.utils.logger import log
+from .restore import verify_only
+from .tiering import snapshot_dirs
+from . import QS_DIR
+
+__all__ = ["parse_since", "select_snapshots", "verify_many"]
+
+VERDICT_FILE = QS_DIR / "verdicts.json"
+# 验证时恢复出的进程约占用的内存 ≈ 快照大小 × 该系数
+_RAM_PER_SNAPSHOT_BYTE = 4
+
+
+def parse_since(text: str) -> datetime:
+    """解析 --since：支持 2h / 3d / 1w 这类相对时间或 ISO 日期时间"""
+    m = re.fullmatch(r"(\d+)\s*([smhdw])", text.strip())
+    if m:
+        unit = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}[m.group(2)]
+        return datetime.now() - timedelta(**{unit: int(m.group(1))})
+    return datetime.fromisoformat(text.strip())
+
+
+def select_snapshots(label: str | None = None,
+                     since: datetime | None = None) -> List[pathlib.Path]:
+    """按标签前缀与修改时间筛选 QS_DIR（及冷层目录）中的快照"""
+    result = []
+    for f in sorted(p for d in snapshot_dirs() for p in d.glob("*.qsnap")):
+        if label and not f.name.startswith(f"{label}_"):
+            continue
+        if since and datetime.fromtimestamp(f.stat().st_mtime) < since:
+            continue
+        result.append(f)
+    return result
+
+
+def _mem_available() -> int:
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def pool_size(paths: Iterable[pathlib.Path]) -> int:
+    """并发度：不超过 CPU 数，也不超过可用内存能容纳的验证进程数"""
+    sizes = [p.stat().st_size for p in paths]
+    jobs = os.cpu_count() or 1
+    avail = _mem_available()
+    if sizes and avail:
+        per_job = max(sizes) * _RAM_PER_SNAPSHOT_BYTE
+        jobs = min(jobs, avail // max(per_job, 1))
+    return max(1, min(jobs, len(sizes) or 1))
+
+
+def _can_isolate() -> bool:
+    return os.geteuid() == 0 and shutil.which("unshare") is not None
+
+
+def _load_verdicts() -> dict:
+    try:
+        with open(VERDICT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_verdicts(updates: dict, failed: Iterable[str] = ()) -> None:
+    """写入通过验证的结论，并删除本次验证失败的快照的旧结论"""
+    with open(VERDICT_FILE, "a+", encoding="utf-8") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        try:
+            table = json.loads(f.read() or "{}")
+        except ValueError:
+            table = {}
+        table.update(updates)
+        for key in failed:
+            table.pop(key, None)
+        # 清理已经不存在的快照
+        table = {k: v for k, v in table.items() if pathlib.Path(k).exists()}
+        f.seek(0)
+        f.truncate()
+        json.dump(table, f, indent=1, ensure_ascii=False)
+
+
+def _identity(path: pathlib.Path) -> dict:
+    st = path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "digest": file_digest(path)}
+
+
+def _verify_one(path: pathlib.Path, isolate: bool) -> dict:
+    t0 = time.perf_counter()
+    try:
+        ident = _identity(path)
+        ok = verify_only(path, isolate=isolate)
+    except Exception as e:
+        log.error("验证快照失败 %s: %s", path, e)
+        ident, ok = {}, False
+    return {**ident, "ok": ok, "seconds": round(time.perf_counter() - t0, 3),
+            "checked_at": time.time()}
+
+
+def verify_many(paths: List[pathlib.Path], jobs: int | None = None,
+                force: bool = False) -> List[dict]:
+    """
+    并发验证多个快照，返回每个快照的结论。
+    force 为 False 时，跳过自上次验证以来没有变化的快照。
+    """
+    paths = list(dict.fromkeys(pathlib.Path(p).resolve() for p in paths))
+    verdicts = _load_verdicts()
+    results: dict = {}
+    todo = []
+    for p in paths:
+        prev = verdicts.get(str(p))
+        if not force and prev and prev.get("ok"):
+            try:
+                if _identity(p) == {k: prev.get(k) for k in ("size", "mtime_ns", "digest")}:
+                    results[str(p)] = {**prev, "cached": True}
+                    continue
+            except OSError:
+                pass
+        todo.append(p)
+
+    if todo:
+        jobs = jobs or pool_size(todo)
+        isolate = _can_isolate()
+        log.info("并发验证 %d 个快照（并发度 %d，PID 命名空间隔离: %s）",
+                 len(todo), jobs, isolate)
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            fresh = dict(zip((str(p) for p in todo),
+                             pool.map(lambda p: _verify_one(p, isolate), todo)))
+        _save_verdicts({k: v for k, v in fresh.items() if v["ok"] and "digest" in v},
+                       [k for k, v in fresh.items() if not v["ok"]])
+        results.update({k: {**v, "cached": False} for k, v in fresh.items()})
+
+    return [{"path": str(p), **results[str(p)]} for p in paths]
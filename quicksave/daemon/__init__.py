@@ -6,5 +6,10 @@ quicksave.daemon
 
 from .monitor import ProcessMonitor
 from .scheduler import SnapshotScheduler
+from .exporter import MetricsExporter
+from .replicator import Replicator
+from .rebaser import Rebaser
+from .tiering import TierManager
 
-__all__ = ["ProcessMonitor", "SnapshotScheduler"] 
\ No newline at end of file
+__all__ = ["ProcessMonitor", "SnapshotScheduler", "MetricsExporter", "Replicator", "Rebaser",
+           "TierManager"] 
\ No newline at end of file
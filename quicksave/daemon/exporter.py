@@ -0,0 +1,90 @@
+"""
+指标导出器，以 Prometheus 文本格式导出 quicksave 的运行指标。
+"""
+import json
+import pathlib
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+from ..utils import metrics
+from ..utils.logger import log
+from ..core.tiering import snapshot_dirs
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        metrics.update_store_gauges(*snapshot_dirs())
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        log.debug("metrics http: " + fmt, *args)
+
+
+class MetricsExporter(Thread):
+    def __init__(self, config_path: pathlib.Path):
+        super().__init__(daemon=True)
+        self.config_path = config_path
+        self.running = True
+        self.config: dict | None = None
+        self.server = None
+
+    def load_config(self) -> dict:
+        """加载配置文件"""
+        defaults = {
+            "enabled": False,
+            "listen": "127.0.0.1",
+            "port": 9464,         # 为 0 时不启动 HTTP 端点
+            "textfile": "",       # node-exporter textfile 路径，为空时不写
+            "interval": 15,       # 写 textfile 的间隔（秒）
+        }
+        if self.config_path.exists():
+            try:
+                with open(self.config_path, "r", encoding="utf-8") as f:
+                    defaults.update(json.load(f).get("metrics", {}))
+            except Exception as e:
+                log.error("加载配置文件失败: %s", e)
+        return defaults
+
+    def start_http(self):
+        """在后台线程中启动 /metrics 端点"""
+        addr = (self.config["listen"], int(self.config["port"]))
+        self.server = ThreadingHTTPServer(addr, _MetricsHandler)
+        self.server.daemon_threads = True
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        log.info("指标端点已启动: http://%s:%d/metrics", *addr)
+
+    def run(self):
+        """周期性刷新存储指标并写出 textfile"""
+        self.config = self.load_config()
+        if not self.config["enabled"]:
+            return
+        try:
+            if int(self.config["port"]):
+                self.start_http()
+        except Exception as e:
+            log.error("启动指标端点失败: %s", e)
+
+        textfile = self.config["textfile"]
+        while self.running:
+            try:
+                metrics.update_store_gauges(*snapshot_dirs())
+                if textfile:
+                    metrics.write_textfile(pathlib.Path(textfile).expanduser())
+            except Exception as e:
+                log.error("导出指标失败: %s", e)
+            time.sleep(max(1, int(self.config["interval"])))
+
+    def stop(self):
+        """停止导出"""
+        self.running = False
+        if self.server is not None:
+            self.server.shutdown()
@@ -1,5 +1,5 @@
 """
-进程监控器，用于监控进程活跃度。
+进程监控器，用于监控进程活跃度；开启 hibernate 时还负责休眠空闲进程（见 core.hibernate）。
 """
 import json
 import pathlib
@@ -8,8 +8,10 @@ import time
 from threading import Thread
 from typing import List, Set
 
+from ..utils import metrics
 from ..utils.logger import log
-from ..core import dump
+from ..utils.profiler import profiled
+from ..core import dump, hibernate, outcomes
 
 class ProcessMonitor(Thread):
     def __init__(self, config_path: pathlib.Path):
@@ -17,7 +19,8 @@ class ProcessMonitor(Thread):
         self.config_path = config_path
         self.running = True
         self.last_snapshot = 0
-        self.config = self.load_config()
+        self.config: dict | None = None
+        self.hibernator: hibernate.Hibernator | None = None
     
     def load_config(self) -> dict:
         """加载配置文件"""
@@ -33,9 +36,11 @@ class ProcessMonitor(Thread):
             "min_interval": 3600,  # 最小快照间隔（秒）
         }
     
+    @profiled("monitor")
     def get_target_pids(self) -> List[int]:
         """获取需要监控的进程 PID 列表"""
         target_pids = set()
+        t0 = time.perf_counter()
         
         # 获取所有进程
         for proc in psutil.process_iter(['pid', 'name']):
@@ -51,6 +56,7 @@ class ProcessMonitor(Thread):
             except (psutil.NoSuchProcess, psutil.AccessDenied):
                 continue
         
+        metrics.MONITOR_SCAN_SECONDS.observe(time.perf_counter() - t0)
         return list(target_pids)
     
     def should_take_snapshot(self) -> bool:
@@ -67,19 +73,39 @@ class ProcessMonitor(Thread):
     
     def run(self):
         """监控进程并创建快照"""
+        self.config = self.load_config()
+        cfg = hibernate.settings()
+        if cfg["enabled"]:
+            self.hibernator = hibernate.Hibernator(cfg)
         while self.running:
+            if self.hibernator is not None:
+                try:
+                    self.hibernator.check()
+                except Exception as e:
+                    log.error("休眠空闲进程失败: %s", e)
             try:
                 if self.should_take_snapshot():
                     pids = self.get_target_pids()
-                    if pids:
+                    # 按过往结果预测必然失败时跳过，本周期不再尝试
+                    priority = outcomes.gate(pids, "auto") if pids else None
+                    if priority is not None:
                         log.info("创建自动快照: %s", pids)
-                        dump(pids, label="auto")
+                        dump(pids, label="auto", priority=priority)
+                    if pids:
                         self.last_snapshot = time.time()
             except Exception as e:
                 log.error("监控进程失败: %s", e)
             
             time.sleep(60)  # 每分钟检查一次
     
+    def hibernated(self) -> List[dict]:
+        """当前休眠的进程"""
+        return hibernate.hibernated()
+
+    def wake(self, snapshot: str) -> int | None:
+        """恢复休眠的快照，返回恢复出的 PID"""
+        return hibernate.wake(snapshot)
+
     def stop(self):
         """停止监控"""
         self.running = False 
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""
+差分快照重建器：参考快照被删除后，在后台把依赖它的差分快照重建为完整快照。
+同时回收没有快照依赖的旧版本 zstd 字典（见 core.dicts）。
+"""
+import json
+import pathlib
+import time
+from threading import Thread
+
+from ..core import dicts, refs
+from ..utils import delta
+from ..utils.logger import log
+
+
+class Rebaser(Thread):
+    def __init__(self, config_path: pathlib.Path):
+        super().__init__(daemon=True)
+        self.config_path = config_path
+        self.running = True
+        self.config: dict | None = None
+
+    def load_config(self) -> dict:
+        """加载配置文件"""
+        defaults = dict(delta.DEFAULTS)
+        if self.config_path.exists():
+            try:
+                with open(self.config_path, "r", encoding="utf-8") as f:
+                    defaults.update(json.load(f).get("delta", {}))
+            except Exception as e:
+                log.error("加载配置文件失败: %s", e)
+        return defaults
+
+    def run(self):
+        """定期检查 .refs/ 中的参考快照"""
+        self.config = self.load_config()
+        # 即使关闭了 delta，也要处理之前留下的差分快照
+        while self.running:
+            try:
+                n = refs.collect()
+                if n:
+                    log.info("重建了 %d 个差分快照", n)
+            except Exception as e:
+                log.error("重建差分快照失败: %s", e)
+            try:
+                dicts.prune()
+            except OSError as e:
+                log.error("回收 zstd 字典失败: %s", e)
+            deadline = time.monotonic() + self.config["rebase_interval"]
+            while self.running and time.monotonic() < deadline:
+                time.sleep(1)
+
+    def stop(self):
+        """停止重建器"""
+        self.running = False
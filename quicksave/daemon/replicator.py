@@ -0,0 +1,154 @@
+"""
+快照复制器，把新发布的快照异步复制到第二存储（NFS 目录或对象存储）。
+差分快照复制前先复制其参考快照（同名放在同一目录），使副本可以单独恢复。
+"""
+import json
+import os
+import pathlib
+import queue
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+
+from ..core.tiering import snapshot_dirs
+from ..core.snapshot import add_publish_hook
+from ..storage import get_backend
+from ..storage.base import chunk_digest
+from ..utils import metrics
+from ..utils.compress import REFS_DIRNAME, read_snapshot_header
+from ..utils.digest import file_digest
+from ..utils.logger import log
+
+_BYTES = metrics.counter("quicksave_replication_bytes_total",
+                         "Bytes uploaded to the secondary store")
+_RESULTS = metrics.counter("quicksave_replication_total",
+                           "Snapshot replications by outcome", ("outcome",))
+_PENDING = metrics.gauge("quicksave_replication_pending",
+                         "Snapshots waiting to be replicated")
+
+
+def _reference(path: pathlib.Path, ref: dict) -> pathlib.Path:
+    """差分快照 path 的参考快照：同目录或 .refs/ 中 id 匹配的那个"""
+    for candidate in (path.parent / ref["name"], path.parent / REFS_DIRNAME / ref["name"]):
+        try:
+            if (read_snapshot_header(candidate) or {}).get("id") == ref["id"]:
+                return candidate
+        except (OSError, ValueError, struct.error):
+            continue
+    raise FileNotFoundError(f"差分快照 {path.name} 的参考快照 {ref['name']} 不存在")
+
+
+class Replicator(Thread):
+    def __init__(self, config_path: pathlib.Path):
+        super().__init__(daemon=True)
+        self.config_path = config_path
+        self.running = True
+        self.config: dict | None = None
+        self.queue: "queue.Queue[pathlib.Path]" = queue.Queue()
+        self._queued = set()
+
+    def load_config(self) -> dict:
+        """加载配置文件"""
+        defaults = {
+            "enabled": False,
+            "backend": "local",        # local | object
+            "target": "",              # 目标目录（object 时为模拟对象存储的目录）
+            "chunk_size": 64 << 20,
+            "parallel": 4,
+            "rescan_interval": 600,    # 定期扫描 QS_DIR，补上 CLI 等其它进程产生的快照
+        }
+        if self.config_path.exists():
+            try:
+                with open(self.config_path, "r", encoding="utf-8") as f:
+                    defaults.update(json.load(f).get("replication", {}))
+            except Exception as e:
+                log.error("加载配置文件失败: %s", e)
+        return defaults
+
+    def enqueue(self, path: pathlib.Path):
+        """dump() 发布快照后调用，不阻塞调用者"""
+        if path not in self._queued:
+            self._queued.add(path)
+            self.queue.put(path)
+            _PENDING.set(len(self._queued))
+
+    def rescan(self):
+        for path in sorted(p for d in snapshot_dirs() for p in d.glob("*.qsnap")):
+            self.enqueue(path)
+
+    def replicate(self, backend, path: pathlib.Path):
+        """分块并发上传 path；已完成的分块与已存在的副本会被跳过"""
+        ref = (read_snapshot_header(path) or {}).get("ref")
+        if ref is not None:
+            self._upload(backend, _reference(path, ref))
+        self._upload(backend, path)
+
+    def _upload(self, backend, path: pathlib.Path):
+        st = path.stat()
+        chunk_size = int(self.config["chunk_size"])
+        manifest = {
+            "name": path.name,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "digest": file_digest(path),
+            "chunk_size": chunk_size,
+            "chunks": max(1, -(-st.st_size // chunk_size)),
+        }
+        remote = backend.stat(path.name)
+        if remote is not None and remote.get("digest") == manifest["digest"]:
+            return
+        done = backend.begin(path.name, manifest)
+        if done:
+            log.info("续传快照 %s：已完成 %d/%d 块", path.name, len(done), manifest["chunks"])
+
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            def upload(index: int):
+                offset = index * chunk_size
+                data = os.pread(fd, chunk_size, offset)
+                digest = chunk_digest(data)
+                if done.get(index) == digest:
+                    return
+                backend.put_chunk(path.name, index, offset, data, digest)
+                _BYTES.inc(len(data))
+
+            with ThreadPoolExecutor(max_workers=max(1, int(self.config["parallel"]))) as pool:
+                list(pool.map(upload, range(manifest["chunks"])))
+        finally:
+            os.close(fd)
+        backend.commit(path.name)
+
+    def run(self):
+        """从队列中取出快照并复制"""
+        self.config = self.load_config()
+        if not self.config["enabled"] or not self.config["target"]:
+            return
+        backend = get_backend(self.config)
+        add_publish_hook(self.enqueue)
+        self.rescan()
+        next_scan = time.monotonic() + self.config["rescan_interval"]
+        while self.running:
+            try:
+                path = self.queue.get(timeout=1)
+            except queue.Empty:
+                if time.monotonic() >= next_scan:
+                    self.rescan()
+                    next_scan = time.monotonic() + self.config["rescan_interval"]
+                continue
+            try:
+                if path.exists():
+                    t0 = time.perf_counter()
+                    self.replicate(backend, path)
+                    log.info("快照已复制: %s (%.1f s)", path.name, time.perf_counter() - t0)
+                    _RESULTS.inc(outcome="success")
+            except Exception as e:
+                log.error("复制快照失败 %s: %s", path, e)
+                _RESULTS.inc(outcome="failure")
+            finally:
+                self._queued.discard(path)
+                _PENDING.set(len(self._queued))
+
+    def stop(self):
+        """停止复制"""
+        self.running = False
@@ -8,14 +8,14 @@ from datetime import datetime, timedelta
 from threading import Thread
 
 from ..utils.logger import log
-from ..core import dump
+from ..core import dump, outcomes
 
 class SnapshotScheduler(Thread):
     def __init__(self, config_path: pathlib.Path):
         super().__init__(daemon=True)
         self.config_path = config_path
         self.running = True
-        self.config = self.load_config()
+        self.config: dict | None = None
     
     def load_config(self) -> dict:
         """加载配置文件"""
@@ -46,6 +46,7 @@ class SnapshotScheduler(Thread):
     
     def run(self):
         """调度快照任务"""
+        self.config = self.load_config()
         while self.running:
             try:
                 if self.config["auto_snapshot"]["enabled"]:
@@ -59,7 +60,9 @@ class SnapshotScheduler(Thread):
                         log.info("执行定时快照")
                         # TODO: 实现进程选择逻辑
                         pids = [1234]  # 示例 PID
-                        dump(pids, label="scheduled")
+                        priority = outcomes.gate(pids, "scheduled")
+                        if priority is not None:
+                            dump(pids, label="scheduled", priority=priority)
                 
                 # 等待下一个检查点
                 time.sleep(60)
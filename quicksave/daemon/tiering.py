@@ -0,0 +1,60 @@
+"""
+冷热分层管理器：在机器空闲时把较旧的快照重新压缩到冷层。
+"""
+import json
+import pathlib
+import time
+from threading import Thread
+
+from ..core import tiering
+from ..utils.logger import log
+
+
+class TierManager(Thread):
+    def __init__(self, config_path: pathlib.Path):
+        super().__init__(daemon=True)
+        self.config_path = config_path
+        self.running = True
+        self.config: dict | None = None
+
+    def load_config(self) -> dict:
+        """加载配置文件"""
+        defaults = dict(tiering.DEFAULTS)
+        if self.config_path.exists():
+            try:
+                with open(self.config_path, "r", encoding="utf-8") as f:
+                    defaults.update(json.load(f).get("tiering", {}))
+            except Exception as e:
+                log.error("加载配置文件失败: %s", e)
+        return defaults
+
+    def run_once(self) -> int:
+        """降级当前满足条件的快照，机器变忙时提前停止；返回降级的数量"""
+        done = 0
+        for path in tiering.candidates(self.config):
+            if not self.running or not tiering.system_idle(self.config):
+                break
+            try:
+                tiering.demote(path, self.config)
+                done += 1
+            except Exception as e:
+                log.error("快照降级失败 %s: %s", path.name, e)
+        return done
+
+    def run(self):
+        """定期检查需要降级的快照"""
+        self.config = self.load_config()
+        if not self.config["enabled"]:
+            return
+        while self.running:
+            try:
+                self.run_once()
+            except Exception as e:
+                log.error("冷热分层检查失败: %s", e)
+            deadline = time.monotonic() + self.config["interval"]
+            while self.running and time.monotonic() < deadline:
+                time.sleep(1)
+
+    def stop(self):
+        """停止分层管理器"""
+        self.running = False
@@ -3,38 +3,53 @@
 """
 import pathlib
 import sys
+import time
 from PyQt6.QtWidgets import QApplication
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 
 from .tray_icon import TrayIcon
-from ..daemon import ProcessMonitor, SnapshotScheduler
+from ..daemon import (ProcessMonitor, SnapshotScheduler, MetricsExporter, Replicator,
+                      Rebaser, TierManager)
+from ..core.recovery import clean_interrupted
 from ..utils.logger import log
 
 CONFIG_FILE = pathlib.Path.home() / ".quicksave" / "config.json"
 
 def main():
     """启动应用程序"""
+    t0 = time.perf_counter()
     app = QApplication(sys.argv)
     app.setQuitOnLastWindowClosed(False)
     
-    # 创建托盘图标
+    # 先显示托盘图标；主窗口在首次打开时才创建
     tray = TrayIcon()
     tray.show()
     
-    # 启动守护进程
-    monitor = ProcessMonitor(CONFIG_FILE)
-    scheduler = SnapshotScheduler(CONFIG_FILE)
-    
-    monitor.start()
-    scheduler.start()
+    # 守护进程在事件循环启动后再创建，各自在 run() 中读取配置
+    daemons = []
+
+    def start_daemons():
+        log.info("托盘图标已就绪，启动用时 %.0f ms", (time.perf_counter() - t0) * 1000)
+        try:
+            clean_interrupted()
+        except OSError as e:
+            log.error("清理中断的快照文件失败: %s", e)
+        for cls in (ProcessMonitor, SnapshotScheduler, MetricsExporter, Replicator,
+                    Rebaser, TierManager):
+            daemon = cls(CONFIG_FILE)
+            daemon.start()
+            daemons.append(daemon)
+
+    QTimer.singleShot(0, start_daemons)
     
     # 注册退出处理
     def cleanup():
         log.info("正在退出...")
-        monitor.stop()
-        scheduler.stop()
-        monitor.join()
-        scheduler.join()
+        for daemon in daemons:
+            daemon.stop()
+        for daemon in daemons:
+            if isinstance(daemon, (ProcessMonitor, SnapshotScheduler)):
+                daemon.join()
     
     app.aboutToQuit.connect(cleanup)
     
@@ -2,34 +2,25 @@
 主窗口实现，包含进程列表、快照列表和基本操作按钮。
 """
 from PyQt6.QtWidgets import (
-    QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QLineEdit, QMessageBox,
-    QTableWidget, QTableWidgetItem, QHeaderView,
-    QCheckBox, QTabWidget
+    QTableView, QHeaderView, QTabWidget, QAbstractItemView
 )
 from PyQt6.QtCore import Qt, QSize, QTimer
 from PyQt6.QtGui import QIcon
-import psutil
 import subprocess
 import os
 import sys
-import logging
-import pathlib
 
 from .snapshot_list import SnapshotListWidget
+from .process_model import (
+    ProcessTableModel, ProcessFilterProxy, ProcessScanner,
+    COL_CHECK, COL_PID, COL_NAME, COL_RSS, COL_CPU
+)
 from .settings import SettingsDialog
-from ..core import dump, restore
-from ..utils.logger import log
-
-# 配置日志
-LOG_DIR = pathlib.Path(__file__).parent.parent.parent / "logs"
-LOG_DIR.mkdir(parents=True, exist_ok=True)
-LOG_FILE = LOG_DIR / "quicksave.log"
-
-# 创建日志处理器
-file_handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
-file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-log.addHandler(file_handler)
+from ..core import dump, hibernate, restore
+from ..core.refs import remove_snapshot
+from ..utils.logger import log, LOG_FILE
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -60,14 +51,30 @@ class MainWindow(QMainWindow):
         search_layout.addWidget(self.process_search)
         process_layout.addLayout(search_layout)
         
-        # 进程表格
-        self.process_table = QTableWidget()
-        self.process_table.setColumnCount(4)
-        self.process_table.setHorizontalHeaderLabels(["选择", "PID", "进程名", "内存使用"])
-        self.process_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
-        self.process_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
-        self.process_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents)
+        # 进程表格（model/view，勾选状态保存在 model 中）
+        self.process_model = ProcessTableModel(self)
+        self.process_proxy = ProcessFilterProxy(self)
+        self.process_proxy.setSourceModel(self.process_model)
+        self.process_table = QTableView()
+        self.process_table.setModel(self.process_proxy)
+        self.process_table.setSortingEnabled(True)
+        self.process_table.sortByColumn(COL_PID, Qt.SortOrder.AscendingOrder)
+        self.process_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.process_table.verticalHeader().hide()
+        # 统一行高，避免视图为每一行计算尺寸
+        self.process_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        header = self.process_table.horizontalHeader()
+        header.setSectionResizeMode(COL_CHECK, QHeaderView.ResizeMode.Fixed)
+        header.setSectionResizeMode(COL_PID, QHeaderView.ResizeMode.Interactive)
+        header.setSectionResizeMode(COL_NAME, QHeaderView.ResizeMode.Stretch)
+        header.setSectionResizeMode(COL_RSS, QHeaderView.ResizeMode.Interactive)
+        header.setSectionResizeMode(COL_CPU, QHeaderView.ResizeMode.Interactive)
         process_layout.addWidget(self.process_table)
+
+        # 后台扫描线程，增量更新进程表
+        self.process_scanner = ProcessScanner(parent=self)
+        self.process_scanner.diff_ready.connect(self.on_process_diff)
+        QApplication.instance().aboutToQuit.connect(self.process_scanner.stop)
         
         # 进程操作按钮
         process_btn_layout = QHBoxLayout()
@@ -132,36 +139,29 @@ class MainWindow(QMainWindow):
         # 状态栏
         self.statusBar().showMessage("就绪")
         
-        # 加载进程列表
-        self.refresh_processes()
+        # 加载进程列表（后台扫描，结果增量填充）
+        self.process_scanner.start()
         # 加载快照列表
         self.refresh_snapshots()
     
     def refresh_processes(self):
         """刷新进程列表"""
-        self.process_table.setRowCount(0)
-        for proc in psutil.process_iter(['pid', 'name', 'memory_info']):
-            try:
-                row = self.process_table.rowCount()
-                self.process_table.insertRow(row)
-                
-                # 添加复选框
-                checkbox = QCheckBox()
-                checkbox_widget = QWidget()
-                checkbox_layout = QHBoxLayout(checkbox_widget)
-                checkbox_layout.addWidget(checkbox)
-                checkbox_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                checkbox_layout.setContentsMargins(0, 0, 0, 0)
-                self.process_table.setCellWidget(row, 0, checkbox_widget)
-                
-                # 添加进程信息
-                self.process_table.setItem(row, 1, QTableWidgetItem(str(proc.info['pid'])))
-                self.process_table.setItem(row, 2, QTableWidgetItem(proc.info['name']))
-                memory_mb = proc.info['memory_info'].rss / (1024 * 1024)
-                self.process_table.setItem(row, 3, QTableWidgetItem(f"{memory_mb:.1f} MB"))
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                continue
-        self.statusBar().showMessage("进程列表已刷新")
+        self.process_scanner.scan_now()
+    
+    def on_process_diff(self, added, updated, removed):
+        """应用后台扫描得到的进程增量"""
+        self.process_model.apply_diff(added, updated, removed)
+        self.statusBar().showMessage(f"进程列表已刷新（{self.process_model.rowCount()} 个进程）")
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.process_scanner.set_paused(False)
+        self.process_scanner.scan_now()
+    
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        # 窗口隐藏时不再周期扫描
+        self.process_scanner.set_paused(True)
     
     def refresh_snapshots(self):
         """刷新快照列表"""
@@ -170,37 +170,22 @@ class MainWindow(QMainWindow):
     
     def filter_processes(self, text):
         """根据搜索文本过滤进程列表"""
-        for row in range(self.process_table.rowCount()):
-            process_name = self.process_table.item(row, 2).text().lower()
-            pid = self.process_table.item(row, 1).text()
-            show = text.lower() in process_name or text in pid
-            self.process_table.setRowHidden(row, not show)
+        self.process_proxy.set_text(text)
     
     def select_all_processes(self):
-        """选择所有进程"""
-        for row in range(self.process_table.rowCount()):
-            if not self.process_table.isRowHidden(row):
-                checkbox_widget = self.process_table.cellWidget(row, 0)
-                checkbox = checkbox_widget.findChild(QCheckBox)
-                checkbox.setChecked(True)
+        """选择所有（当前可见的）进程"""
+        proxy = self.process_proxy
+        pids = [self.process_model.pid_at(proxy.mapToSource(proxy.index(row, 0)).row())
+                for row in range(proxy.rowCount())]
+        self.process_model.set_checked(pids, True)
     
     def deselect_all_processes(self):
         """取消选择所有进程"""
-        for row in range(self.process_table.rowCount()):
-            checkbox_widget = self.process_table.cellWidget(row, 0)
-            checkbox = checkbox_widget.findChild(QCheckBox)
-            checkbox.setChecked(False)
+        self.process_model.set_checked(list(self.process_model.checked), False)
     
     def get_selected_pids(self):
         """获取选中的进程PID列表"""
-        selected_pids = []
-        for row in range(self.process_table.rowCount()):
-            checkbox_widget = self.process_table.cellWidget(row, 0)
-            checkbox = checkbox_widget.findChild(QCheckBox)
-            if checkbox.isChecked():
-                pid = int(self.process_table.item(row, 1).text())
-                selected_pids.append(pid)
-        return selected_pids
+        return sorted(self.process_model.checked)
     
     def create_snapshot(self):
         """创建新快照"""
@@ -237,8 +222,12 @@ class MainWindow(QMainWindow):
             log.info("准备恢复快照: %s", snapshot_path)
             self.statusBar().showMessage("正在恢复快照...")
             
-            # 直接调用 restore 函数
-            if restore(snapshot_path):
+            # 休眠的进程通过 hibernate.wake 恢复，同时清除休眠记录
+            if hibernate.is_hibernated(snapshot_path):
+                ok = hibernate.wake(snapshot_path.name) is not None
+            else:
+                ok = restore(snapshot_path)
+            if ok:
                 self.statusBar().showMessage("快照恢复成功")
                 log.info("快照恢复成功")
                 QMessageBox.information(self, "成功", 
@@ -274,7 +263,7 @@ class MainWindow(QMainWindow):
             
         try:
             log.info("准备删除快照: %s", snapshot_path)
-            snapshot_path.unlink()
+            remove_snapshot(snapshot_path)
             self.refresh_snapshots()
             self.statusBar().showMessage("快照已删除")
             log.info("快照删除成功")
@@ -0,0 +1,234 @@
+"""
+进程列表的 model/view 实现：勾选状态保存在 model 中，搜索由代理模型完成，
+后台扫描线程只把新增 / 变化 / 消失的进程增量推送给 model。
+"""
+import time
+
+import psutil
+from PyQt6.QtCore import (
+    Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel,
+    QThread, pyqtSignal
+)
+
+from ..utils.logger import log
+from ..utils.profiler import profiled
+
+# 首次扫描时每读到这么多进程就推送一次，表格逐步填充
+FIRST_SCAN_BATCH = 200
+
+COLUMNS = ["选择", "PID", "进程名", "内存使用", "CPU"]
+COL_CHECK, COL_PID, COL_NAME, COL_RSS, COL_CPU = range(len(COLUMNS))
+
+# 排序使用的角色：数值列按原始数值而不是显示文本排序
+SortRole = Qt.ItemDataRole.UserRole
+
+
+class ProcessTableModel(QAbstractTableModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []          # [pid, name, rss, cpu]
+        self._index = {}         # pid -> 行号
+        self.checked = set()     # 勾选的 pid
+
+    # ---------- Qt 接口 ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.column() == COL_CHECK:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        pid, name, rss, cpu = self._rows[index.row()]
+        col = index.column()
+        if role == Qt.ItemDataRole.CheckStateRole and col == COL_CHECK:
+            return Qt.CheckState.Checked if pid in self.checked else Qt.CheckState.Unchecked
+        if role == Qt.ItemDataRole.DisplayRole:
+            if col == COL_PID:
+                return str(pid)
+            if col == COL_NAME:
+                return name
+            if col == COL_RSS:
+                return f"{rss / (1024 * 1024):.1f} MB"
+            if col == COL_CPU:
+                return f"{cpu:.1f} %"
+        if role == SortRole:
+            return (pid in self.checked, pid, name.lower(), rss, cpu)[col]
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.CheckStateRole or index.column() != COL_CHECK:
+            return False
+        pid = self._rows[index.row()][0]
+        if Qt.CheckState(value) == Qt.CheckState.Checked:
+            self.checked.add(pid)
+        else:
+            self.checked.discard(pid)
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    # ---------- 供窗口调用 ----------
+    def pid_at(self, row: int) -> int:
+        return self._rows[row][0]
+
+    def name_at(self, row: int) -> str:
+        return self._rows[row][1]
+
+    def set_checked(self, pids, checked: bool):
+        """批量修改勾选状态，只发一次 dataChanged"""
+        if checked:
+            self.checked.update(pids)
+        else:
+            self.checked.difference_update(pids)
+        if self._rows:
+            self.dataChanged.emit(self.index(0, COL_CHECK),
+                                  self.index(len(self._rows) - 1, COL_CHECK),
+                                  [Qt.ItemDataRole.CheckStateRole])
+
+    def apply_diff(self, added, updated, removed):
+        """应用扫描线程给出的增量；只有实际变化的行会通知视图"""
+        if removed:
+            rows = sorted((self._index[p] for p in removed if p in self._index), reverse=True)
+            # 合并相邻行，减少 beginRemoveRows 调用次数
+            while rows:
+                last = first = rows.pop(0)
+                while rows and rows[0] == first - 1:
+                    first = rows.pop(0)
+                self.beginRemoveRows(QModelIndex(), first, last)
+                del self._rows[first:last + 1]
+                self.endRemoveRows()
+            self.checked.difference_update(removed)
+            self._index = {r[0]: i for i, r in enumerate(self._rows)}
+
+        changed = []
+        for row in updated:
+            i = self._index.get(row[0])
+            if i is not None:
+                self._rows[i] = list(row)
+                changed.append(i)
+        if changed:
+            self.dataChanged.emit(self.index(min(changed), COL_NAME),
+                                  self.index(max(changed), COL_CPU))
+
+        if added:
+            start = len(self._rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(added) - 1)
+            for offset, row in enumerate(added):
+                self._rows.append(list(row))
+                self._index[row[0]] = start + offset
+            self.endInsertRows()
+
+
+class ProcessFilterProxy(QSortFilterProxyModel):
+    """按进程名（不区分大小写）或 PID 子串过滤"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._text = ""
+        self.setSortRole(SortRole)
+
+    def set_text(self, text: str):
+        self._text = text.lower()
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self._text:
+            return True
+        model = self.sourceModel()
+        return (self._text in model.name_at(source_row).lower()
+                or self._text in str(model.pid_at(source_row)))
+
+
+class ProcessScanner(QThread):
+    """后台扫描进程，与上一次结果比较后发出增量"""
+    diff_ready = pyqtSignal(list, list, list)   # added, updated, removed
+
+    def __init__(self, interval: float = 3.0, parent=None):
+        super().__init__(parent)
+        self.interval = interval
+        self.running = True
+        # 启动后先扫描一次填充表格，之后只在窗口可见时周期扫描
+        self._paused = True
+        self._wake = True
+        self._prev = {}
+        self._first = True
+
+    def scan_now(self):
+        """尽快执行下一次扫描"""
+        self._wake = True
+
+    def set_paused(self, paused: bool):
+        self._paused = paused
+
+    @staticmethod
+    def _row(info) -> tuple:
+        rss = info['memory_info'].rss if info['memory_info'] else 0
+        return (info['pid'], info['name'] or "", rss, info['cpu_percent'] or 0.0)
+
+    @profiled("gui-processes")
+    def scan_once(self):
+        if self._first:
+            self._first = False
+            self._scan_first()
+            return
+        current = {}
+        for proc in psutil.process_iter(['pid', 'name', 'memory_info', 'cpu_percent']):
+            try:
+                row = self._row(proc.info)
+                current[row[0]] = row
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+
+        added = [row for pid, row in current.items() if pid not in self._prev]
+        removed = [pid for pid in self._prev if pid not in current]
+        updated = [row for pid, row in current.items()
+                   if pid in self._prev and self._prev[pid] != row]
+        self._prev = current
+        if added or updated or removed:
+            self.diff_ready.emit(added, updated, removed)
+
+    def _scan_first(self):
+        """首次扫描：表格为空，边读边分批推送新增的行"""
+        t0 = time.perf_counter()
+        batch = []
+        for proc in psutil.process_iter(['pid', 'name', 'memory_info', 'cpu_percent']):
+            try:
+                row = self._row(proc.info)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+            self._prev[row[0]] = row
+            batch.append(row)
+            if len(batch) >= FIRST_SCAN_BATCH:
+                self.diff_ready.emit(batch, [], [])
+                batch = []
+        if batch:
+            self.diff_ready.emit(batch, [], [])
+        log.info("首次进程扫描完成：%d 个进程，用时 %.0f ms",
+                 len(self._prev), (time.perf_counter() - t0) * 1000)
+
+    def run(self):
+        while self.running:
+            if not self._paused or self._wake:
+                self._wake = False
+                self.scan_once()
+            deadline = time.monotonic() + self.interval
+            while self.running and not self._wake and time.monotonic() < deadline:
+                self.msleep(100)
+
+    def stop(self):
+        self.running = False
+        self.wait()
@@ -2,16 +2,22 @@
 快照列表组件，显示快照信息并提供过滤功能。
 """
 import pathlib
-from datetime import datetime
+from typing import List
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QTableWidget, QTableWidgetItem,
+    QWidget, QVBoxLayout, QTableView, QAbstractItemView,
     QHeaderView, QMenu, QMessageBox
 )
 from PyQt6.QtCore import Qt, QSize, pyqtSignal
 from PyQt6.QtGui import QIcon, QAction
 
-from ..core import QS_DIR
+from .snapshot_model import (
+    SnapshotTableModel, SnapshotFilterProxy, PathRole,
+    COL_NAME, COL_SIZE, COL_TIME, COL_STATE
+)
+from ..core.refs import remove_snapshot
+from ..core.tiering import snapshot_dirs
 from ..utils.logger import log
+from ..utils.profiler import profiled
 
 class SnapshotListWidget(QWidget):
     # 定义信号
@@ -26,95 +32,82 @@ class SnapshotListWidget(QWidget):
         """初始化用户界面"""
         layout = QVBoxLayout(self)
         
-        # 创建表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["名称", "大小", "时间", "状态"])
+        # 创建表格；行由 model 按目录变化增量维护
+        self.model = SnapshotTableModel(snapshot_dirs(), self)
+        self.proxy = SnapshotFilterProxy(self)
+        self.proxy.setSourceModel(self.model)
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(COL_TIME, Qt.SortOrder.DescendingOrder)
+        self.table.verticalHeader().hide()
         
         # 设置表格属性
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
         self.table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.table.customContextMenuRequested.connect(self.show_context_menu)
         
         # 设置列宽
         header = self.table.horizontalHeader()
-        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
-        header.setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(COL_NAME, QHeaderView.ResizeMode.Stretch)
+        header.setSectionResizeMode(COL_SIZE, QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(COL_TIME, QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(COL_STATE, QHeaderView.ResizeMode.ResizeToContents)
         
         layout.addWidget(self.table)
     
+    @profiled("gui-snapshots")
     def refresh(self):
-        """刷新快照列表"""
-        self.table.setRowCount(0)
-        if not QS_DIR.exists():
-            return
-        
-        for file in QS_DIR.glob("*.qsnap"):
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-            
-            # 文件名
-            name_item = QTableWidgetItem(file.name)
-            name_item.setData(Qt.ItemDataRole.UserRole, file)
-            self.table.setItem(row, 0, name_item)
-            
-            # 文件大小
-            size = file.stat().st_size
-            size_str = f"{size / 1024 / 1024:.1f} MB"
-            self.table.setItem(row, 1, QTableWidgetItem(size_str))
-            
-            # 修改时间
-            mtime = datetime.fromtimestamp(file.stat().st_mtime)
-            time_str = mtime.strftime("%Y-%m-%d %H:%M:%S")
-            self.table.setItem(row, 2, QTableWidgetItem(time_str))
-            
-            # 状态
-            self.table.setItem(row, 3, QTableWidgetItem("就绪"))
+        """刷新快照列表（与目录对比，只更新变化的行）"""
+        self.model.sync()
     
     def filter(self, text):
         """根据文本过滤快照列表"""
-        for row in range(self.table.rowCount()):
-            name_item = self.table.item(row, 0)
-            self.table.setRowHidden(row, text.lower() not in name_item.text().lower())
+        self.proxy.setFilterFixedString(text)
+    
+    def get_selected_all(self) -> List[pathlib.Path]:
+        """获取所有选中的快照文件路径"""
+        rows = self.table.selectionModel().selectedRows(COL_NAME)
+        return [index.data(PathRole) for index in rows]
     
     def get_selected(self) -> pathlib.Path | None:
-        """获取选中的快照文件路径"""
-        selected = self.table.selectedItems()
+        """获取选中的快照文件路径（多选时取第一个）"""
+        selected = self.get_selected_all()
         if not selected:
             return None
-        return selected[0].data(Qt.ItemDataRole.UserRole)
+        return selected[0]
     
     def show_context_menu(self, pos):
         """显示右键菜单"""
-        selected = self.get_selected()
+        selected = self.get_selected_all()
         if not selected:
             return
             
         menu = QMenu(self)
         
         restore_action = QAction("恢复", self)
-        restore_action.triggered.connect(lambda: self.restore_requested.emit(selected))
+        restore_action.triggered.connect(lambda: self.restore_requested.emit(selected[0]))
+        restore_action.setEnabled(len(selected) == 1)
         menu.addAction(restore_action)
         
         menu.addSeparator()
         
-        delete_action = QAction("删除", self)
-        delete_action.triggered.connect(lambda: self.delete_requested.emit(selected))
+        delete_action = QAction(f"删除 ({len(selected)})" if len(selected) > 1 else "删除", self)
+        delete_action.triggered.connect(lambda: [self.delete_requested.emit(p) for p in selected])
         menu.addAction(delete_action)
         
         menu.exec(self.table.mapToGlobal(pos))
     
     def delete_selected(self):
         """删除选中的快照"""
-        selected = self.get_selected()
+        selected = self.get_selected_all()
         if not selected:
             return
         
         try:
-            selected.unlink()
+            for path in selected:
+                remove_snapshot(path)
             self.refresh()
             self.parent().statusBar().showMessage("快照已删除")
         except Exception as e:
@@ -0,0 +1,222 @@
+"""
+快照列表的 model/view 实现。
+
+目录变化由 QFileSystemWatcher（Linux 下即 inotify）驱动，只增删对应的行；
+目录扫描与文件大小、时间等元数据都在线程池中后台读取，完成后再更新对应的行，
+窗口创建时不会阻塞在磁盘上。
+排序使用 model 中缓存的元数据，不会重新访问磁盘。
+"""
+import os
+import pathlib
+import time
+from datetime import datetime
+
+from PyQt6.QtCore import (
+    Qt, QAbstractTableModel, QModelIndex, QObject, QRunnable,
+    QSortFilterProxyModel, QThreadPool, QFileSystemWatcher, pyqtSignal
+)
+
+from ..core.hibernate import LABEL as HIBERNATE_LABEL
+from ..utils.logger import log
+
+COLUMNS = ["名称", "大小", "时间", "状态"]
+COL_NAME, COL_SIZE, COL_TIME, COL_STATE = range(len(COLUMNS))
+SortRole = Qt.ItemDataRole.UserRole + 1
+PathRole = Qt.ItemDataRole.UserRole
+
+# 列表中显示的文件及其状态
+_SUFFIX_STATE = {".qsnap": "就绪"}
+
+
+class _MetaSignals(QObject):
+    loaded = pyqtSignal(str, object, object)     # 文件名, 大小, mtime（不存在时为 None）
+    scanned = pyqtSignal(object)                 # 文件名 → 所在目录
+
+
+class _ScanJob(QRunnable):
+    """在线程池中列出各目录中的快照文件"""
+
+    def __init__(self, directories, signals: _MetaSignals):
+        super().__init__()
+        self.directories = list(directories)
+        self.signals = signals
+
+    def run(self):
+        found = {}
+        # 同名文件以排在前面的目录为准
+        for d in reversed(self.directories):
+            try:
+                found.update((e.name, d) for e in os.scandir(d)
+                             if pathlib.PurePath(e.name).suffix in _SUFFIX_STATE)
+            except OSError:
+                pass
+        self.signals.scanned.emit(found)
+
+
+class _MetaJob(QRunnable):
+    """在线程池中读取一批文件的元数据"""
+
+    def __init__(self, directory: pathlib.Path, names, signals: _MetaSignals):
+        super().__init__()
+        self.directory = directory
+        self.names = list(names)
+        self.signals = signals
+
+    def run(self):
+        for name in self.names:
+            try:
+                st = os.stat(self.directory / name)
+                self.signals.loaded.emit(name, st.st_size, st.st_mtime)
+            except OSError:
+                self.signals.loaded.emit(name, None, None)
+
+
+class SnapshotTableModel(QAbstractTableModel):
+    """directories 中第一个为热层目录，其余（冷层目录）中的快照状态显示为“冷层”"""
+
+    def __init__(self, directories, parent=None):
+        super().__init__(parent)
+        if isinstance(directories, (str, os.PathLike)):
+            directories = [directories]
+        self.directories = [pathlib.Path(d) for d in directories]
+        self.directory = self.directories[0]
+        self._rows = []          # [name, size, mtime]，size/mtime 为 None 表示尚未加载
+        self._index = {}         # name -> 行号
+        self._dir_of = {}        # name -> 所在目录
+        self._signals = _MetaSignals()
+        self._signals.loaded.connect(self._on_loaded)
+        self._signals.scanned.connect(self._apply)
+        self._pool = QThreadPool.globalInstance()
+        self._scanning = False
+        self._rescan = False
+        self._t0 = time.perf_counter()    # 为 None 表示首次扫描已完成
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(lambda _: self.sync())
+        self.watcher.fileChanged.connect(self._on_file_changed)
+        for d in self.directories:
+            if d.exists():
+                self.watcher.addPath(str(d))
+
+    # ---------- Qt 接口 ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        name, size, mtime = self._rows[index.row()]
+        col = index.column()
+        if role == PathRole:
+            return self._dir_of.get(name, self.directory) / name
+        if role == Qt.ItemDataRole.DisplayRole:
+            if col == COL_NAME:
+                return name
+            if col == COL_SIZE:
+                return "…" if size is None else f"{size / 1024 / 1024:.1f} MB"
+            if col == COL_TIME:
+                return "…" if mtime is None else \
+                    datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S")
+            if col == COL_STATE:
+                return self._state(name)
+        if role == SortRole:
+            return (name, size or 0, mtime or 0.0, self._state(name))[col]
+        return None
+
+    def _state(self, name: str) -> str:
+        state = _SUFFIX_STATE.get(pathlib.PurePath(name).suffix, "")
+        if state == "就绪" and name.startswith(f"{HIBERNATE_LABEL}-"):
+            return "休眠"
+        if state == "就绪" and self._dir_of.get(name, self.directory) != self.directory:
+            return "冷层"
+        return state
+
+    # ---------- 增量维护 ----------
+    def sync(self):
+        """在后台重新扫描目录；扫描进行中时，结束后再扫描一次"""
+        if self._scanning:
+            self._rescan = True
+            return
+        self._scanning = True
+        self._pool.start(_ScanJob(self.directories, self._signals))
+
+    def _apply(self, found):
+        """对比扫描到的文件名与现有行，只增删发生变化的行"""
+        self._scanning = False
+        if self._rescan:
+            self._rescan = False
+            self.sync()
+        names = set(found)
+        watched = set(self.watcher.directories())
+        unwatched = [str(d) for d in self.directories if str(d) not in watched and d.exists()]
+        if unwatched:
+            self.watcher.addPaths(unwatched)
+        moved = [n for n in names if n in self._dir_of and self._dir_of[n] != found[n]]
+
+        removed = [n for n in self._index if n not in names]
+        added = sorted(n for n in names if n not in self._index)
+        for name in removed:
+            row = self._index[name]
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._rows[row]
+            self.endRemoveRows()
+            self._index = {r[0]: i for i, r in enumerate(self._rows)}
+            self.watcher.removePath(str(self._dir_of.pop(name) / name))
+        if added:
+            start = len(self._rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(added) - 1)
+            for offset, name in enumerate(added):
+                self._rows.append([name, None, None])
+                self._index[name] = start + offset
+                self._dir_of[name] = found[name]
+            self.endInsertRows()
+            # 监视新文件，写入过程中大小变化时刷新该行
+            self.watcher.addPaths([str(found[n] / n) for n in added])
+            self._load(added)
+        # 快照被移到冷层目录：行不变，只更新所在目录与元数据
+        for name in moved:
+            self.watcher.removePath(str(self._dir_of[name] / name))
+            self._dir_of[name] = found[name]
+            self.watcher.addPath(str(found[name] / name))
+            row = self._index[name]
+            self.dataChanged.emit(self.index(row, COL_STATE), self.index(row, COL_STATE))
+        self._load(moved)
+        if self._t0 is not None:
+            log.info("首次快照扫描完成：%d 个快照，用时 %.0f ms",
+                     len(self._rows), (time.perf_counter() - self._t0) * 1000)
+            self._t0 = None
+
+    def _load(self, names):
+        by_dir = {}
+        for name in names:
+            by_dir.setdefault(self._dir_of[name], []).append(name)
+        for d, group in by_dir.items():
+            self._pool.start(_MetaJob(d, group, self._signals))
+
+    def _on_file_changed(self, path: str):
+        name = pathlib.Path(path).name
+        if name in self._index:
+            self._load([name])
+
+    def _on_loaded(self, name: str, size, mtime):
+        row = self._index.get(name)
+        if row is None or size is None:
+            return
+        self._rows[row][1:] = [size, mtime]
+        self.dataChanged.emit(self.index(row, COL_SIZE), self.index(row, COL_TIME))
+
+
+class SnapshotFilterProxy(QSortFilterProxyModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setSortRole(SortRole)
+        self.setFilterKeyColumn(COL_NAME)
+        self.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
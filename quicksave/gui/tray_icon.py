@@ -1,6 +1,8 @@
 """
 托盘图标组件，提供系统托盘功能和快速操作。
 """
+import time
+
 from PyQt6.QtWidgets import QSystemTrayIcon, QMenu
 from PyQt6.QtGui import QIcon, QAction
 from PyQt6.QtCore import Qt
@@ -12,7 +14,7 @@ from ..utils.logger import log
 class TrayIcon(QSystemTrayIcon):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.main_window = MainWindow()
+        self.main_window: MainWindow | None = None     # 首次打开时创建，见 window()
         self.init_ui()
     
     def init_ui(self):
@@ -53,10 +55,19 @@ class TrayIcon(QSystemTrayIcon):
         # 连接信号
         self.activated.connect(self.on_activated)
     
+    def window(self) -> MainWindow:
+        """返回主窗口，第一次调用时创建"""
+        if self.main_window is None:
+            t0 = time.perf_counter()
+            self.main_window = MainWindow()
+            log.info("主窗口已创建，用时 %.0f ms", (time.perf_counter() - t0) * 1000)
+        return self.main_window
+
     def show_main_window(self):
         """显示主窗口"""
-        self.main_window.show()
-        self.main_window.activateWindow()
+        window = self.window()
+        window.show()
+        window.activateWindow()
     
     def create_snapshot(self):
         """创建快照"""
@@ -82,12 +93,13 @@ class TrayIcon(QSystemTrayIcon):
     
     def show_settings(self):
         """显示设置对话框"""
-        dialog = SettingsDialog(self.main_window)
+        dialog = SettingsDialog(self.main_window)     # 主窗口尚未创建时无父窗口
         dialog.exec()
     
     def quit_app(self):
         """退出应用"""
-        self.main_window.close()
+        if self.main_window is not None:
+            self.main_window.close()
         self.hide()
     
     def on_activated(self, reason):
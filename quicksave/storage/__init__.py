@@ -0,0 +1,24 @@
+"""
+quicksave.storage
+~~~~~~~~~~~~~~
+快照副本的存储后端，供复制线程（daemon.replicator）使用。
+"""
+
+from .base import StorageBackend, ChunkMismatch
+from .local import LocalBackend
+from .objectstore import ObjectStoreBackend, LocalObjectClient
+
+
+def get_backend(config: dict) -> StorageBackend:
+    """按配置构造后端：backend 为 local（本地目录 / NFS）或 object（对象存储）"""
+    kind = config.get("backend", "local")
+    target = config["target"]
+    if kind == "local":
+        return LocalBackend(target)
+    if kind == "object":
+        return ObjectStoreBackend(LocalObjectClient(target), prefix=config.get("prefix", ""))
+    raise ValueError(f"unknown storage backend: {kind}")
+
+
+__all__ = ["StorageBackend", "ChunkMismatch", "LocalBackend",
+           "ObjectStoreBackend", "LocalObjectClient", "get_backend"]
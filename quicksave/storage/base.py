@@ -0,0 +1,51 @@
+"""
+存储后端接口。
+
+大文件按固定大小分块上传，每块附带 sha256，由后端校验后记录回执；
+中断后再次 begin() 会返回已完成的分块，从而只补传缺失的部分。
+"""
+import hashlib
+import pathlib
+from typing import Dict
+
+
+class ChunkMismatch(RuntimeError):
+    """后端收到的数据与声明的哈希不一致"""
+
+
+def chunk_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class StorageBackend:
+    """
+    manifest 描述一次上传的源文件：
+        {"name", "size", "mtime_ns", "digest", "chunk_size", "chunks"}
+    """
+
+    def stat(self, name: str) -> dict | None:
+        """返回已完成副本的 manifest；不存在时返回 None"""
+        raise NotImplementedError
+
+    def begin(self, name: str, manifest: dict) -> Dict[int, str]:
+        """
+        开始或续传一次上传，返回已完成分块 {序号: sha256}。
+        若进行中的上传对应的是另一个版本的源文件，则丢弃后重新开始。
+        """
+        raise NotImplementedError
+
+    def put_chunk(self, name: str, index: int, offset: int, data: bytes, digest: str) -> None:
+        """写入一个分块；哈希不符时抛出 ChunkMismatch。可被多个线程并发调用"""
+        raise NotImplementedError
+
+    def commit(self, name: str) -> None:
+        """所有分块到齐后发布副本"""
+        raise NotImplementedError
+
+    def abort(self, name: str) -> None:
+        """丢弃进行中的上传"""
+        raise NotImplementedError
+
+    def fetch(self, name: str, dst: pathlib.Path) -> None:
+        """把副本取回到本地文件 dst，按分块校验"""
+        raise NotImplementedError
@@ -0,0 +1,94 @@
+"""
+本地目录 / NFS 挂载点后端。
+
+上传中的数据写入 <root>/.partial/<name>.data（按偏移 pwrite，可多线程并发），
+每个分块落盘后写一个回执文件；commit 时逐块复核哈希，再 rename 到 <root>/<name>。
+"""
+import json
+import os
+import pathlib
+import shutil
+from typing import Dict
+
+from .base import StorageBackend, ChunkMismatch, chunk_digest
+
+
+def _write_atomic(path: pathlib.Path, text: str) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class LocalBackend(StorageBackend):
+    def __init__(self, root):
+        self.root = pathlib.Path(root).expanduser()
+        self.partial = self.root / ".partial"
+        self.partial.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, name: str):
+        return (self.partial / f"{name}.json",
+                self.partial / f"{name}.data",
+                self.partial / f"{name}.chunks")
+
+    def stat(self, name):
+        manifest = self.root / f"{name}.manifest.json"
+        if not (self.root / name).exists() or not manifest.exists():
+            return None
+        return json.loads(manifest.read_text(encoding="utf-8"))
+
+    def begin(self, name, manifest) -> Dict[int, str]:
+        meta, data, chunks = self._paths(name)
+        if meta.exists() and json.loads(meta.read_text(encoding="utf-8")) == manifest:
+            return {int(p.name): p.read_text().strip() for p in chunks.iterdir()
+                    if p.name.isdigit()}
+        self.abort(name)
+        chunks.mkdir()
+        with open(data, "wb") as f:
+            f.truncate(manifest["size"])
+        _write_atomic(meta, json.dumps(manifest))
+        return {}
+
+    def put_chunk(self, name, index, offset, data, digest):
+        if chunk_digest(data) != digest:
+            raise ChunkMismatch(f"{name}#{index}")
+        _meta, path, chunks = self._paths(name)
+        fd = os.open(path, os.O_WRONLY)
+        try:
+            os.pwrite(fd, data, offset)
+            os.fdatasync(fd)
+        finally:
+            os.close(fd)
+        # 数据落盘后再写回执，回执存在即代表该块完整
+        _write_atomic(chunks / str(index), digest)
+
+    def commit(self, name):
+        meta, data, chunks = self._paths(name)
+        manifest = json.loads(meta.read_text(encoding="utf-8"))
+        size = manifest["chunk_size"]
+        with open(data, "rb") as f:
+            for index in range(manifest["chunks"]):
+                receipt = chunks / str(index)
+                if not receipt.exists():
+                    raise ChunkMismatch(f"{name}#{index} missing")
+                f.seek(index * size)
+                if chunk_digest(f.read(size)) != receipt.read_text().strip():
+                    receipt.unlink()
+                    raise ChunkMismatch(f"{name}#{index}")
+        os.replace(data, self.root / name)
+        _write_atomic(self.root / f"{name}.manifest.json", json.dumps(manifest, indent=1))
+        self.abort(name)
+
+    def abort(self, name):
+        meta, data, chunks = self._paths(name)
+        meta.unlink(missing_ok=True)
+        data.unlink(missing_ok=True)
+        shutil.rmtree(chunks, ignore_errors=True)
+
+    def fetch(self, name, dst):
+        manifest = self.stat(name)
+        if manifest is None:
+            raise FileNotFoundError(name)
+        shutil.copyfile(self.root / name, dst)
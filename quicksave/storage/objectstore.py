@@ -0,0 +1,123 @@
+"""
+对象存储后端。
+
+对象存储不支持按偏移写入与重命名，因此每个分块是一个独立对象
+<prefix><name>/part-NNNNNN，上传会话记录在 <name>/upload.json，
+commit 时写入 <name>/manifest.json 作为发布标记；读取时按 manifest 依次拼接分块。
+
+后端只依赖一个极小的客户端接口（put / get / head / list / delete），
+LocalObjectClient 用本地目录模拟对象存储，便于测试和离线部署。
+"""
+import json
+import os
+import pathlib
+from typing import Dict, List
+
+from .base import StorageBackend, ChunkMismatch, chunk_digest
+
+
+class LocalObjectClient:
+    """用本地目录模拟的对象存储客户端；put 返回服务端计算的 sha256 作为 etag"""
+
+    def __init__(self, root):
+        self.root = pathlib.Path(root).expanduser()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.root / key
+
+    def put(self, key: str, data: bytes, metadata: dict | None = None) -> str:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        etag = chunk_digest(data)
+        meta = dict(metadata or {}, etag=etag, size=len(data))
+        path.with_name(f"{path.name}.meta").write_text(json.dumps(meta))
+        os.replace(tmp, path)
+        return etag
+
+    def get(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+    def head(self, key: str) -> dict | None:
+        meta = self._path(key).with_name(f"{pathlib.PurePath(key).name}.meta")
+        if not self._path(key).exists() or not meta.exists():
+            return None
+        return json.loads(meta.read_text())
+
+    def list(self, prefix: str) -> List[str]:
+        base = self._path(prefix)
+        if not base.is_dir():
+            return []
+        return sorted(f"{prefix.rstrip('/')}/{p.name}" for p in base.iterdir()
+                      if not p.name.endswith((".meta", ".tmp")))
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        path.unlink(missing_ok=True)
+        path.with_name(f"{path.name}.meta").unlink(missing_ok=True)
+
+
+class ObjectStoreBackend(StorageBackend):
+    def __init__(self, client, prefix: str = ""):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, name: str, leaf: str) -> str:
+        return f"{self.prefix}{name}/{leaf}"
+
+    def stat(self, name):
+        if self.client.head(self._key(name, "manifest.json")) is None:
+            return None
+        return json.loads(self.client.get(self._key(name, "manifest.json")))
+
+    def begin(self, name, manifest) -> Dict[int, str]:
+        session = self._key(name, "upload.json")
+        if self.client.head(session) is not None and \
+                json.loads(self.client.get(session)) == manifest:
+            done = {}
+            for key in self.client.list(f"{self.prefix}{name}"):
+                leaf = key.rsplit("/", 1)[-1]
+                if leaf.startswith("part-"):
+                    head = self.client.head(key)
+                    if head and head.get("sha256") == head.get("etag"):
+                        done[int(leaf[5:])] = head["etag"]
+            return done
+        self.abort(name)
+        self.client.put(session, json.dumps(manifest).encode())
+        return {}
+
+    def put_chunk(self, name, index, offset, data, digest):
+        etag = self.client.put(self._key(name, f"part-{index:06d}"), data, {"sha256": digest})
+        if etag != digest:
+            self.client.delete(self._key(name, f"part-{index:06d}"))
+            raise ChunkMismatch(f"{name}#{index}")
+
+    def commit(self, name):
+        manifest = json.loads(self.client.get(self._key(name, "upload.json")))
+        for index in range(manifest["chunks"]):
+            head = self.client.head(self._key(name, f"part-{index:06d}"))
+            if head is None or head.get("etag") != head.get("sha256"):
+                raise ChunkMismatch(f"{name}#{index}")
+        self.client.put(self._key(name, "manifest.json"), json.dumps(manifest, indent=1).encode())
+        self.client.delete(self._key(name, "upload.json"))
+
+    def abort(self, name):
+        for key in self.client.list(f"{self.prefix}{name}"):
+            self.client.delete(key)
+
+    def fetch(self, name, dst):
+        manifest = self.stat(name)
+        if manifest is None:
+            raise FileNotFoundError(name)
+        with open(dst, "wb") as f:
+            for index in range(manifest["chunks"]):
+                key = self._key(name, f"part-{index:06d}")
+                data = self.client.get(key)
+                if chunk_digest(data) != self.client.head(key)["sha256"]:
+                    raise ChunkMismatch(f"{name}#{index}")
+                f.write(data)
@@ -0,0 +1,276 @@
+"""
+压缩编解码器注册表。
+
+每种格式（zstd / lz4 / none）可以注册多个实现：进程内实现（Python 绑定
+zstandard、lz4，不需要 fork/exec）优先，命令行实现（zstd、lz4 命令，经 governor
+调控）作为回退。governor 配置了进程内无法遵守的 cgroup 限额时命令行实现优先。
+格式由数据开头的魔数识别，而不是文件后缀。
+
+缺少所有实现时不会在导入时报错，只有真正用到该格式时才抛出 CodecUnavailable。
+"""
+import contextlib
+import os
+import shutil
+import subprocess
+import threading
+from typing import BinaryIO, Callable, Dict, List
+
+from . import governor, profiler
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4frame
+except ImportError:
+    lz4frame = None
+
+CHUNK = 1 << 20
+
+ProgressFn = Callable[[int], None]
+
+# 各格式默认压缩级别（与原先命令行参数一致）
+DEFAULT_LEVELS = {"zstd": 19, "lz4": 9, "none": 0}
+
+MAGIC = {
+    "zstd": b"\x28\xb5\x2f\xfd",
+    "lz4": b"\x04\x22\x4d\x18",
+}
+
+
+class CodecUnavailable(RuntimeError):
+    """所需格式没有可用的实现"""
+
+
+def _pump(fin: BinaryIO, write: Callable[[bytes], object], progress: ProgressFn | None) -> None:
+    while True:
+        buf = fin.read(CHUNK)
+        if not buf:
+            break
+        write(buf)
+        if progress is not None:
+            progress(len(buf))
+
+
+def pipe(cmd: List[str], fin: BinaryIO, fout: BinaryIO,
+         progress: ProgressFn | None = None) -> None:
+    """
+    让 fin 的内容流经受 governor 调控的过滤进程 cmd，输出写入 fout。
+    输出为普通文件时直接交给子进程，否则（如 sparse.ExtentWriter、BytesIO）由线程转写。
+    """
+    with profiler.child(os.path.basename(cmd[0])):
+        _pipe(cmd, fin, fout, progress)
+
+
+def _pipe(cmd: List[str], fin: BinaryIO, fout: BinaryIO, progress: ProgressFn | None) -> None:
+    try:
+        fout.fileno()
+        direct = True
+    except (AttributeError, OSError):
+        direct = False
+    if direct:
+        fout.flush()
+    tool = cmd[0]
+    cmd, preexec = governor.wrap(cmd)
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                            stdout=fout if direct else subprocess.PIPE,
+                            stderr=subprocess.PIPE, preexec_fn=preexec)
+    copier_error = []
+    copier = None
+    if not direct:
+        def copy():
+            try:
+                _pump(proc.stdout, fout.write, None)
+            except BaseException as e:
+                copier_error.append(e)
+                proc.kill()
+        copier = threading.Thread(target=copy, daemon=True)
+        copier.start()
+    try:
+        _pump(fin, proc.stdin.write, progress)
+        proc.stdin.close()
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        if copier is not None:
+            copier.join()
+        if copier_error:
+            raise copier_error[0]
+        raise
+    if copier is not None:
+        copier.join()
+    if copier_error:
+        raise copier_error[0]
+    err = proc.stderr.read()
+    if proc.wait() != 0:
+        raise RuntimeError(f"{tool} 失败: {err.decode('utf-8', errors='ignore').strip()}")
+
+
+class Codec:
+    """编解码器实现的基类；name 为写入快照头的格式名"""
+    name = ""
+    in_process = True
+
+    def available(self) -> bool:
+        return True
+
+    def compress(self, fin: BinaryIO, fout: BinaryIO, level: int,
+                 progress: ProgressFn | None = None) -> None:
+        """把 fin 的内容压缩写入 fout；progress 按读入的原始字节数回调"""
+        raise NotImplementedError
+
+    def decompress(self, fin: BinaryIO, fout: BinaryIO,
+                   progress: ProgressFn | None = None) -> None:
+        """把 fin 的内容解压写入 fout；progress 按读入的压缩字节数回调"""
+        raise NotImplementedError
+
+    def open_reader(self, fin: BinaryIO) -> contextlib.AbstractContextManager:
+        """返回可读取解压后数据的流（用于旧格式整包 tar 的流式解包）"""
+        raise NotImplementedError
+
+
+class NoneCodec(Codec):
+    name = "none"
+
+    def compress(self, fin, fout, level, progress=None):
+        _pump(fin, fout.write, progress)
+
+    def decompress(self, fin, fout, progress=None):
+        _pump(fin, fout.write, progress)
+
+    def open_reader(self, fin):
+        return contextlib.nullcontext(fin)
+
+
+class ZstdModule(Codec):
+    name = "zstd"
+
+    def available(self):
+        return zstandard is not None
+
+    def compress(self, fin, fout, level, progress=None):
+        # 压缩线程数不超过 governor 允许使用的 CPU 数
+        cctx = zstandard.ZstdCompressor(level=level, threads=governor.cpu_budget())
+        with cctx.stream_writer(fout, closefd=False) as w:
+            _pump(fin, w.write, progress)
+
+    def decompress(self, fin, fout, progress=None):
+        with zstandard.ZstdDecompressor().stream_writer(fout, closefd=False) as w:
+            _pump(fin, w.write, progress)
+
+    def open_reader(self, fin):
+        return zstandard.ZstdDecompressor().stream_reader(fin, read_across_frames=True)
+
+
+class Lz4Module(Codec):
+    name = "lz4"
+
+    def available(self):
+        return lz4frame is not None
+
+    def compress(self, fin, fout, level, progress=None):
+        comp = lz4frame.LZ4FrameCompressor(compression_level=level)
+        fout.write(comp.begin())
+        _pump(fin, lambda buf: fout.write(comp.compress(buf)), progress)
+        fout.write(comp.flush())
+
+    def decompress(self, fin, fout, progress=None):
+        state = {"d": lz4frame.LZ4FrameDecompressor()}
+
+        def feed(buf: bytes):
+            # 兼容多个 frame 首尾相接的文件
+            while buf:
+                d = state["d"]
+                fout.write(d.decompress(buf))
+                if not d.eof:
+                    break
+                buf = d.unused_data
+                state["d"] = lz4frame.LZ4FrameDecompressor()
+        _pump(fin, feed, progress)
+
+    def open_reader(self, fin):
+        return lz4frame.LZ4FrameFile(fin, mode="rb")
+
+
+class CliCodec(Codec):
+    """通过命令行工具实现；辅助进程受 governor 调控"""
+    in_process = False
+
+    def __init__(self, name: str, tool: str, compress_args: Callable[[int], List[str]],
+                 decompress_args: List[str]):
+        self.name = name
+        self.tool = tool
+        self.compress_args = compress_args
+        self.decompress_args = decompress_args
+
+    def available(self):
+        return shutil.which(self.tool) is not None
+
+    def compress(self, fin, fout, level, progress=None):
+        pipe([self.tool, *self.compress_args(level)], fin, fout, progress)
+
+    def decompress(self, fin, fout, progress=None):
+        pipe([self.tool, *self.decompress_args], fin, fout, progress)
+
+    @contextlib.contextmanager
+    def open_reader(self, fin):
+        # 缓冲区内的 seek 不会移动底层文件偏移，子进程从 fd 读取前先对齐
+        os.lseek(fin.fileno(), fin.tell(), os.SEEK_SET)
+        cmd, preexec = governor.wrap([self.tool, *self.decompress_args])
+        proc = subprocess.Popen(cmd, stdin=fin, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, preexec_fn=preexec)
+        try:
+            yield proc.stdout
+            # 读取方可能在 tar 结束块处停下，把剩余输出读完再检查返回码
+            while proc.stdout.read(CHUNK):
+                pass
+        except BaseException:
+            proc.kill()
+            raise
+        finally:
+            proc.stdout.close()
+            code = proc.wait()
+        if code != 0:
+            raise RuntimeError(f"{self.tool} 解压失败，返回码 {code}")
+
+
+_REGISTRY: Dict[str, List[Codec]] = {}
+
+
+def register(codec: Codec) -> None:
+    """注册一个实现；同一格式下先注册的优先"""
+    _REGISTRY.setdefault(codec.name, []).append(codec)
+
+
+def get(name: str) -> Codec:
+    """返回该格式第一个可用的实现；进程内实现无法受调控时优先命令行实现"""
+    impls = [c for c in _REGISTRY.get(name, []) if c.available()]
+    if not governor.in_process_allowed():
+        impls.sort(key=lambda c: c.in_process and c.name != "none")
+    if impls:
+        return impls[0]
+    raise CodecUnavailable(f"没有可用的 {name} 编解码器，请安装 Python 包或命令行工具")
+
+
+def available() -> List[str]:
+    """列出当前有可用实现的格式"""
+    return [name for name, impls in _REGISTRY.items() if any(c.available() for c in impls)]
+
+
+def detect(head: bytes) -> str | None:
+    """根据数据开头的魔数识别压缩格式；未压缩的 tar 识别为 none"""
+    for name, magic in MAGIC.items():
+        if head.startswith(magic):
+            return name
+    if head[257:262] == b"ustar":
+        return "none"
+    return None
+
+
+register(NoneCodec())
+register(ZstdModule())
+register(Lz4Module())
+register(CliCodec("zstd", "zstd", lambda level: ["-q", f"-{level}", "-c"], ["-q", "-d", "-c"]))
+register(CliCodec("lz4", "lz4", lambda level: ["-q", "-z", f"-{level}", "-c"], ["-q", "-d", "-c"]))
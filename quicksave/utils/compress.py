@@ -1,68 +1,413 @@
 """
-提供 compress_dir / decompress_file，两种算法可选：
-- 默认 `zstd`（需系统命令 `zstd`）
-- 备选 `lz4`  （若 zstd 不存在自动降级）
+提供 compress_dir / decompress_file。
+
+快照文件（v2）格式：
+    QSNAP_MAGIC | 4 字节大端头部长度 | JSON 头部 | 未压缩的 tar
+tar 中的成员各自压缩：
+- pages-*.img   每个单独压缩，使用 codecs.pages 指定的格式；成段的零页不进入压缩流，
+                头部以 extents 记录数据区间，解包时还原为稀疏文件（见 sparse）
+- meta.tar      其余小镜像打成一个内层 tar 后整体压缩，使用 codecs.meta 指定的格式
+- *.zst、quicksave.json、quicksave.zdict   已经压缩过或需直接读取，原样存放
+头部记录每个成员使用的格式与原始大小，以及快照所在的存储层级 tier（见 core.tiering）。
+编解码器见 codecs 模块，优先使用进程内实现。
+
+指定参考快照时（见 core.refs），pages 与 meta.tar 成员改为相对参考快照同名成员的
+zstd 差分（delta: true），头部的 ref 记录参考快照的文件名与 id；解包时在同目录或
+其 .refs/ 子目录中查找参考快照。
+
+旧格式（整个 tar 用 zstd / lz4 压缩）按魔数识别，仍可解压。
 """
+import json
 import os
 import pathlib
+import struct
 import shutil
-import subprocess
+import tarfile
 import tempfile
-from typing import Literal
+import uuid
+from typing import BinaryIO, Callable, Dict, Tuple
+from . import codecs, delta, fileio, governor, metrics, sparse, zdict
+from .config import get_section, load_config
 from .logger import log
 
-ALG_ZSTD = shutil.which("zstd") is not None
-ALG_LZ4  = shutil.which("lz4")  is not None
+QSNAP_MAGIC = b"\x89QSNAP2\n"
+FORMAT_VERSION = 2
+BUNDLE_NAME = "meta.tar"
+REFS_DIRNAME = ".refs"        # 已删除但仍被差分快照引用的参考快照
+
+CODEC_DEFAULTS = {
+    "pages": "",      # 为空时使用顶层 "compression"
+    "meta": "",
+    "levels": {},     # 例如 {"zstd": 19, "lz4": 9}
+    "sparse": True,   # 省略页镜像中的零页
+}
+
+# 兼容设置对话框：列出可选的压缩算法
+ALG_ZSTD = "zstd" in codecs.available()
+ALG_LZ4 = "lz4" in codecs.available()
+
+ProgressFn = Callable[[int], None]
+
+_ZERO_BYTES = metrics.counter("quicksave_zero_page_bytes_total",
+                              "Zero-page bytes elided from page images", ("op",))
+
+_TAR_FILTER = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+
+
+def codec_choice() -> Dict[str, Tuple[str, int]]:
+    """按配置返回 pages / meta 两类成员使用的 (格式, 级别)"""
+    cfg = get_section("codecs", CODEC_DEFAULTS)
+    fallback = load_config().get("compression") or "zstd"
+    avail = codecs.available()
+    choice = {}
+    for kind in ("pages", "meta"):
+        name = cfg[kind] or fallback
+        if name not in avail:
+            alt = next(n for n in ("zstd", "lz4", "none") if n in avail)
+            log.warning("压缩格式 %s 不可用，%s 成员改用 %s", name, kind, alt)
+            name = alt
+        choice[kind] = (name, int(cfg["levels"].get(name, codecs.DEFAULT_LEVELS[name])))
+    return choice
+
+
+def _member_kind(rel: str) -> str:
+    name = os.path.basename(rel)
+    if name in (zdict.META_NAME, zdict.EMBED_NAME) or name.endswith(".zst"):
+        return "stored"
+    if name.startswith("pages-") and name.endswith(".img"):
+        return "pages"
+    return "meta"
+
+
+def read_header(f: BinaryIO) -> dict | None:
+    """读取 v2 头部并把 f 定位到 tar 起点；旧格式返回 None 并回到文件开头"""
+    magic = f.read(len(QSNAP_MAGIC))
+    if magic != QSNAP_MAGIC:
+        f.seek(0)
+        return None
+    (length,) = struct.unpack(">I", f.read(4))
+    return json.loads(f.read(length).decode("utf-8"))
 
-if not (ALG_ZSTD or ALG_LZ4):
-    raise RuntimeError("Please install either `zstd` or `lz4` in PATH")
 
+def read_snapshot_header(qsnap: pathlib.Path) -> dict | None:
+    """读取快照文件的 v2 头部；旧格式返回 None"""
+    with open(qsnap, "rb") as f:
+        return read_header(f)
 
-def _compress_cmd(out_path: pathlib.Path, level: int = 19) -> list[str]:
-    if ALG_ZSTD:
-        return ["zstd", f"-{level}", "--quiet", "-o", str(out_path)]
+
+class RefSource:
+    """参考快照：按需把其中的成员解压为原始内容（临时文件），供差分编码 / 解码使用"""
+
+    def __init__(self, path: pathlib.Path, scratch: pathlib.Path):
+        self.path = path
+        self.scratch = scratch
+        self.header = read_snapshot_header(path)
+        if self.header is None or "id" not in self.header or "ref" in self.header:
+            raise ValueError(f"不能作为差分参考: {path.name}")
+        self._members: Dict[str, pathlib.Path] = {}
+
+    @classmethod
+    def locate(cls, qsnap: pathlib.Path, ref: dict, scratch: pathlib.Path) -> "RefSource":
+        """在 qsnap 所在目录及其 .refs/ 中查找 id 匹配的参考快照"""
+        for path in (qsnap.parent / ref["name"], qsnap.parent / REFS_DIRNAME / ref["name"]):
+            if path.exists():
+                source = cls(path, scratch)
+                if source.header["id"] == ref["id"]:
+                    return source
+        raise FileNotFoundError(f"差分快照 {qsnap.name} 的参考快照 {ref['name']} 不存在")
+
+    def has(self, name: str) -> bool:
+        return name in self.header.get("members", {})
+
+    def member(self, name: str) -> pathlib.Path:
+        if name not in self._members:
+            entry = self.header["members"][name]
+            out = self.scratch / f"ref-{len(self._members)}"
+            with open(self.path, "rb") as f:
+                read_header(f)
+                with tarfile.open(fileobj=f, mode="r:") as tar, open(out, "wb") as fo:
+                    codecs.get(entry["codec"]).decompress(tar.extractfile(tar.getmember(name)), fo)
+            self._members[name] = out
+        return self._members[name]
+
+
+def decode_member(src: BinaryIO, entry: dict, fout: BinaryIO, name: str,
+                  refs: RefSource | None, progress: ProgressFn | None = None) -> None:
+    """按头部记录解码一个成员（普通压缩或相对参考快照的差分）"""
+    if entry.get("delta"):
+        if refs is None:
+            raise ValueError(f"成员 {name} 是差分编码，但快照没有记录参考快照")
+        delta.decode(src, fout, refs.member(name), progress)
     else:
-        return ["lz4", "-z", "-q", "-9", "-o", str(out_path)]
+        codecs.get(entry["codec"]).decompress(src, fout, progress)
+
+
+def prepare_members(src_dir: pathlib.Path, app: str | None, samples: bool = True) -> None:
+    """
+    打包前处理：收集字典训练样本，并用应用字典就地压缩小镜像，
+    所用字典写入 src_dir/quicksave.json，字典副本写入 src_dir/quicksave.zdict。
+    """
+    if not app:
+        return
+    if samples:
+        try:
+            zdict.collect_samples(app, src_dir)
+        except OSError as e:
+            log.warning("收集字典样本失败: %s", e)
+    meta = zdict.compress_members(src_dir, app)
+    if meta:
+        zdict.write_meta(src_dir, {**zdict.read_meta(src_dir), **meta})
+
+
+def finish_members(dst_dir: pathlib.Path) -> None:
+    """解包后处理：还原用字典压缩的小镜像"""
+    zdict.decompress_members(dst_dir, zdict.read_meta(dst_dir))
 
 
-def _decompress_cmd(qsnap: pathlib.Path, out_path: pathlib.Path) -> list[str]:
-    # 支持 .qsnap、.bak、.qsnap.bak
-    fname = str(qsnap)
-    if (fname.endswith(".qsnap") or fname.endswith(".qsnap.bak") or fname.endswith(".bak")) and ALG_ZSTD:
-        return ["zstd", "-d", "--quiet", "-o", str(out_path), str(qsnap)]
-    if (fname.endswith(".qsnap") or fname.endswith(".qsnap.bak") or fname.endswith(".bak")) and ALG_LZ4:
-        return ["lz4", "-d", "-q", "-o", str(out_path), str(qsnap)]
-    raise ValueError("Unsupported compression format")
+def _add_compressed(tar: tarfile.TarFile, out: fileio.SnapshotWriter, info: tarfile.TarInfo,
+                    src: BinaryIO, encode: Callable[[BinaryIO, BinaryIO], None],
+                    scratch: pathlib.Path) -> None:
+    """编码 src 后作为 info 加入 tar（tar 头需要事先知道大小，先写入临时文件）"""
+    with open(scratch, "w+b") as tmp:
+        encode(src, tmp)
+        info.size = tmp.tell()
+        tmp.seek(0)
+        out.reserve(info.size + 2 * tarfile.BLOCKSIZE)
+        tar.addfile(info, tmp)
 
 
-def compress_dir(src_dir: pathlib.Path, dst_file: pathlib.Path) -> None:
+def _data_size(entry: dict) -> int:
+    """成员进入编码器的字节数（省略零页后）"""
+    if "extents" in entry:
+        return sum(length for _off, length in entry["extents"])
+    return entry["size"]
+
+
+def _write_snapshot(src_dir: pathlib.Path, dst_file: pathlib.Path,
+                    progress: ProgressFn | None, scratch_dir: pathlib.Path, *,
+                    app: str | None, ref: pathlib.Path | None,
+                    codec: Tuple[str, int] | None, tier: str,
+                    snapshot_id: str | None) -> None:
+    choice = codec_choice() if codec is None else {"pages": codec, "meta": codec}
+    dcfg = get_section("delta", delta.DEFAULTS)
+    refs = RefSource(ref, scratch_dir) if ref is not None else None
+    files = sorted(p for p in src_dir.rglob("*") if p.is_file())
+    groups = {"pages": [], "meta": [], "stored": []}
+    for p in files:
+        groups[_member_kind(str(p.relative_to(src_dir)))].append(p)
+
+    elide = get_section("codecs", CODEC_DEFAULTS)["sparse"]
+    members = {}
+    for p in groups["pages"]:
+        entry = {"codec": choice["pages"][0], "size": p.stat().st_size}
+        if elide:
+            with open(p, "rb") as f:
+                extents = sparse.data_extents(f)
+            if sparse.saved_bytes(extents, entry["size"]) >= sparse.MIN_HOLE:
+                entry["extents"] = extents
+        members[str(p.relative_to(src_dir))] = entry
+    if groups["meta"]:
+        members[BUNDLE_NAME] = {"codec": choice["meta"][0], "bundle": True,
+                                "size": sum(p.stat().st_size for p in groups["meta"])}
+    for p in groups["stored"]:
+        members[str(p.relative_to(src_dir))] = {"codec": "none", "size": p.stat().st_size}
+
+    bundle = scratch_dir / BUNDLE_NAME
+    if groups["meta"]:
+        with tarfile.open(bundle, "w") as inner:
+            for p in groups["meta"]:
+                inner.add(p, arcname=str(p.relative_to(src_dir)))
+    if refs is not None:
+        # 没有数据的成员（空镜像、全零页镜像）无需差分；zstd 也不接受 --stream-size=0
+        for name, entry in members.items():
+            if _member_kind(name) != "stored" and refs.has(name) \
+                    and 0 < _data_size(entry) <= dcfg["max_member_bytes"] \
+                    and _data_size(refs.header["members"][name]) <= dcfg["max_member_bytes"]:
+                entry["codec"], entry["delta"] = "zstd", True
+
+    header = {
+        "version": FORMAT_VERSION,
+        "id": snapshot_id or uuid.uuid4().hex,
+        "codecs": {kind: name for kind, (name, _level) in choice.items()},
+        "tier": tier,
+        "members": members,
+    }
+    if app:
+        header["app"] = app
+    if refs is not None:
+        header["ref"] = {"name": ref.name, "id": refs.header["id"]}
+    blob = json.dumps(header).encode("utf-8")
+
+    def encoder(name: str, kind: str, size: int):
+        if members[name].get("delta"):
+            return lambda fin, fout: delta.encode(fin, fout, refs.member(name), size,
+                                                  int(dcfg["level"]), progress)
+        codec, level = choice[kind]
+        return lambda fin, fout: codecs.get(codec).compress(fin, fout, level, progress)
+
+    scratch = scratch_dir / "member"
+    with fileio.SnapshotWriter(dst_file) as out:
+        out.write(QSNAP_MAGIC + struct.pack(">I", len(blob)) + blob)
+        with tarfile.open(fileobj=out, mode="w|") as tar:
+            for p in groups["pages"]:
+                rel = str(p.relative_to(src_dir))
+                info = tar.gettarinfo(p, arcname=rel)
+                extents = members[rel].get("extents")
+                with open(p, "rb") as f:
+                    src = sparse.ExtentReader(f, extents) if extents is not None else f
+                    _add_compressed(tar, out, info, src,
+                                    encoder(rel, "pages", _data_size(members[rel])), scratch)
+                    # 镜像只读这一次，不让它占着页缓存
+                    fileio.drop_cache(f)
+                if extents is not None:
+                    zero = sparse.saved_bytes(extents, members[rel]["size"])
+                    _ZERO_BYTES.inc(zero, op="dump")
+                    if progress is not None:
+                        progress(zero)
+
+            if groups["meta"]:
+                info = tar.gettarinfo(bundle, arcname=BUNDLE_NAME)
+                with open(bundle, "rb") as src:
+                    _add_compressed(tar, out, info, src,
+                                    encoder(BUNDLE_NAME, "meta", bundle.stat().st_size), scratch)
+                bundle.unlink()
+
+            for p in groups["stored"]:
+                with open(p, "rb") as src:
+                    info = tar.gettarinfo(p, arcname=str(p.relative_to(src_dir)))
+                    out.reserve(info.size + 2 * tarfile.BLOCKSIZE)
+                    tar.addfile(info, src)
+                if progress is not None:
+                    progress(p.stat().st_size)
+        out.close()
+
+
+def _pack(src_dir: pathlib.Path, dst_file: pathlib.Path, progress: ProgressFn | None,
+          **opts) -> None:
+    with tempfile.TemporaryDirectory(prefix="qs_pack_") as scratch_dir:
+        _write_snapshot(src_dir, dst_file, progress, pathlib.Path(scratch_dir), **opts)
+
+
+def compress_dir(src_dir: pathlib.Path, dst_file: pathlib.Path,
+                 app: str | None = None, progress: ProgressFn | None = None,
+                 ref: pathlib.Path | None = None, samples: bool = True,
+                 codec: Tuple[str, int] | None = None, tier: str = "hot",
+                 snapshot_id: str | None = None) -> None:
     """
-    把 src_dir 打包成 tar 并压缩为 dst_file (.qsnap)。
+    把 src_dir 打包压缩为 dst_file (.qsnap)。
+    app 为应用标识（见 zdict.app_key），有训练好的字典时小镜像先用字典压缩；
+    samples 为 False 时不把本次镜像留作字典训练样本（例如重建已有快照）。
+    ref 为参考快照时按差分编码，差分失败则退回完整快照。
+    codec 为 (格式, 级别) 时所有成员都用它压缩，否则按配置；tier 记录在头部（见 tiering）。
+    snapshot_id 为重新压缩已有快照时沿用的原 id，使引用它的差分快照仍然有效。
+    progress(n) 在每处理 n 个原始字节后回调；回调抛出的异常会中止压缩。
     """
-    dst_tmp = dst_file.with_suffix(".tar")
-    log.debug("tar -> %s", dst_tmp)
-    subprocess.run(
-        ["tar", "-C", src_dir, "-cf", str(dst_tmp), "."],
-        check=True,
-        stdin=subprocess.DEVNULL,
-    )
-    cmd = _compress_cmd(dst_file)
-    log.debug("compress → %s", " ".join(cmd))
-    with open(dst_tmp, "rb") as fin:
-        subprocess.run(cmd, check=True, stdin=fin)
-    os.remove(dst_tmp)
-
-
-def decompress_file(qsnap: pathlib.Path, dst_dir: pathlib.Path) -> None:
+    prepare_members(src_dir, app, samples)
+    log.debug("pack %s -> %s (ref %s)", src_dir, dst_file, ref)
+    opts = {"app": app, "ref": ref, "codec": codec, "tier": tier, "snapshot_id": snapshot_id}
+    try:
+        try:
+            governor.run_niced(_pack, src_dir, dst_file, progress, **opts)
+        except (OSError, RuntimeError, ValueError, tarfile.TarError) as e:
+            if ref is None:
+                raise
+            log.warning("相对 %s 的差分编码失败，改为完整快照: %s", ref.name, e)
+            governor.run_niced(_pack, src_dir, dst_file, progress, **dict(opts, ref=None))
+    except BaseException:
+        dst_file.unlink(missing_ok=True)
+        raise
+
+
+def _target(dst_dir: pathlib.Path, name: str) -> pathlib.Path:
+    target = (dst_dir / name).resolve()
+    if not target.is_relative_to(dst_dir.resolve()):
+        raise ValueError(f"快照成员路径非法: {name}")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    return target
+
+
+def _extract_members(qsnap: pathlib.Path, f: BinaryIO, header: dict, dst_dir: pathlib.Path,
+                     progress: ProgressFn | None) -> None:
+    members = header.get("members", {})
+    scratch = pathlib.Path(tempfile.mkdtemp(prefix=".qs_ref_", dir=dst_dir))
+    try:
+        refs = RefSource.locate(qsnap, header["ref"], scratch) if header.get("ref") else None
+        _extract_stream(f, members, refs, dst_dir, progress)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def _extract_stream(f: BinaryIO, members: dict, refs: RefSource | None,
+                    dst_dir: pathlib.Path, progress: ProgressFn | None) -> None:
+    prealloc = fileio.settings()["preallocate"]
+    with tarfile.open(fileobj=f, mode="r|") as tar:
+        for m in tar:
+            if not m.isfile():
+                tar.extract(m, dst_dir, **_TAR_FILTER)
+                continue
+            entry = members.get(m.name, {"codec": "none"})
+            src = tar.extractfile(m)
+            if entry.get("bundle"):
+                with tempfile.SpooledTemporaryFile(max_size=64 << 20, dir=dst_dir) as buf:
+                    decode_member(src, entry, buf, m.name, refs, progress)
+                    buf.seek(0)
+                    with tarfile.open(fileobj=buf, mode="r|") as inner:
+                        inner.extractall(dst_dir, **_TAR_FILTER)
+                continue
+            target = _target(dst_dir, m.name)
+            with open(target, "wb") as out:
+                if "extents" in entry:
+                    writer = sparse.ExtentWriter(out, entry["extents"], entry["size"])
+                    decode_member(src, entry, writer, m.name, refs, progress)
+                    writer.close()
+                    _ZERO_BYTES.inc(sparse.saved_bytes(entry["extents"], entry["size"]), op="restore")
+                else:
+                    if prealloc and entry.get("size"):
+                        fileio.preallocate(out.fileno(), 0, entry["size"])
+                    decode_member(src, entry, out, m.name, refs, progress)
+            os.chmod(target, m.mode & 0o777)
+
+
+def _extract_legacy(f: BinaryIO, dst_dir: pathlib.Path, progress: ProgressFn | None) -> None:
+    """旧格式：整个 tar 用同一种算法压缩，按魔数选择解压器"""
+    head = f.read(512)
+    f.seek(0)
+    name = codecs.detect(head)
+    if name is None:
+        raise ValueError("无法识别的快照格式")
+    with codecs.get(name).open_reader(f) as stream:
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            tar.extractall(dst_dir, **_TAR_FILTER)
+    if progress is not None:
+        progress(os.fstat(f.fileno()).st_size)
+
+
+def _read_snapshot(qsnap: pathlib.Path, dst_dir: pathlib.Path,
+                   progress: ProgressFn | None) -> None:
+    with open(qsnap, "rb") as f:
+        header = read_header(f)
+        if header is None:
+            _extract_legacy(f, dst_dir, progress)
+            fileio.drop_cache(f)
+            return
+        start = f.tell()
+    with fileio.SnapshotReader(qsnap, start) as src:
+        _extract_members(qsnap, src, header, dst_dir, progress)
+
+
+def decompress_file(qsnap: pathlib.Path, dst_dir: pathlib.Path,
+                    progress: ProgressFn | None = None) -> None:
     """
-    解压 qsnap 到 dst_dir（产生 tar，再展开）。
+    解压 qsnap 到 dst_dir。progress(n) 按读入的压缩字节数回调。
     """
-    tmp_tar = pathlib.Path(tempfile.mktemp(dir=dst_dir, suffix=".tar"))
-    cmd = _decompress_cmd(qsnap, tmp_tar)
-    subprocess.run(cmd, check=True, stdin=subprocess.DEVNULL)
-    subprocess.run(
-        ["tar", "-C", dst_dir, "-xf", str(tmp_tar)],
-        check=True,
-        stdin=subprocess.DEVNULL,
-    )
-    os.remove(tmp_tar)
\ No newline at end of file
+    governor.run_niced(_read_snapshot, qsnap, dst_dir, progress)
+    finish_members(dst_dir)
+
+
+def snapshot_codecs(qsnap: pathlib.Path) -> dict:
+    """返回快照使用的压缩格式，例如 {"pages": "zstd", "meta": "zstd"}"""
+    with open(qsnap, "rb") as f:
+        header = read_header(f)
+        if header is None:
+            return {"all": codecs.detect(f.read(512)) or "unknown"}
+    return header.get("codecs", {})
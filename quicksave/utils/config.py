@@ -0,0 +1,30 @@
+"""
+读取 ~/.quicksave/config.json，供 core 中不依赖 GUI / 守护线程的模块共享。
+"""
+import copy
+import json
+import pathlib
+
+from .logger import log
+
+CONFIG_FILE = pathlib.Path.home() / ".quicksave" / "config.json"
+
+
+def load_config(path: pathlib.Path = CONFIG_FILE) -> dict:
+    """加载配置文件；不存在或损坏时返回空字典"""
+    if path.exists():
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            log.error("加载配置文件失败: %s", e)
+    return {}
+
+
+def get_section(name: str, defaults: dict, path: pathlib.Path = CONFIG_FILE) -> dict:
+    """返回配置中的某个小节，缺失的键以 defaults 补齐"""
+    section = copy.deepcopy(defaults)
+    value = load_config(path).get(name)
+    if isinstance(value, dict):
+        section.update(value)
+    return section
@@ -0,0 +1,39 @@
+"""
+基于 `zstd --patch-from` 的二进制差分：以参考快照中同名成员的原始内容为参照，
+只编码两者之间的差异（长距离匹配，适合连续快照中大量未变化的页）。
+
+差分需要 zstd 命令行工具；参照内容在编码和解码时都要整个放进内存，
+因此超过 max_member_bytes 的成员不做差分（zstd 的窗口上限为 2 GiB）。
+
+配置见 config.json 的 "delta" 小节。
+"""
+import pathlib
+import shutil
+from typing import BinaryIO
+
+from .codecs import ProgressFn, pipe
+
+DEFAULTS = {
+    "enabled": False,
+    "labels": ["auto", "scheduled"],   # 只对这些来源的快照做差分
+    "level": 3,                        # --patch-from 配合高压缩级别非常慢
+    "max_member_bytes": 1 << 30,
+    "max_ref_age": 7 * 86400,          # 超过该时间的快照不再作为新的参考
+    "rebase_interval": 600,            # 后台检查被删除参考快照的间隔（秒）
+}
+
+
+def available() -> bool:
+    return shutil.which("zstd") is not None
+
+
+def encode(fin: BinaryIO, fout: BinaryIO, ref: pathlib.Path, size: int, level: int,
+           progress: ProgressFn | None = None) -> None:
+    """把 fin（共 size 字节）编码为相对 ref 的差分写入 fout"""
+    pipe(["zstd", "-q", f"-{level}", f"--patch-from={ref}", f"--stream-size={size}", "-c"],
+         fin, fout, progress)
+
+
+def decode(fin: BinaryIO, fout: BinaryIO, ref: pathlib.Path,
+           progress: ProgressFn | None = None) -> None:
+    pipe(["zstd", "-q", "-d", "--long=31", f"--patch-from={ref}", "-c"], fin, fout, progress)
@@ -0,0 +1,74 @@
+"""
+快照文件内容哈希。
+
+对大文件做一次完整哈希代价不低，因此按 (dev, ino, size, mtime_ns) 记忆结果：
+文件内容一旦改变，mtime / size 随之改变，旧记录自然失效。
+"""
+import fcntl
+import hashlib
+import json
+import os
+import pathlib
+import threading
+
+from .fileio import SnapshotReader
+from .logger import log
+
+DIGEST_FILE = pathlib.Path.home() / ".quicksave" / "digests.json"
+_CHUNK = 4 << 20
+_MAX_ENTRIES = 4096
+_lock = threading.Lock()
+
+
+def _stat_key(st: os.stat_result) -> str:
+    return f"{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def _hash(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with SnapshotReader(path) as f:
+        while True:
+            buf = f.read(_CHUNK)
+            if not buf:
+                break
+            h.update(buf)
+    return h.hexdigest()
+
+
+def _load() -> dict:
+    try:
+        with open(DIGEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def file_digest(path: pathlib.Path) -> str:
+    """返回文件内容的 sha256；命中记忆时不读取文件内容"""
+    path = pathlib.Path(path)
+    key = _stat_key(path.stat())
+    with _lock:
+        cached = _load().get(key)
+    if cached:
+        return cached
+
+    digest = _hash(path)
+    with _lock:
+        try:
+            DIGEST_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(DIGEST_FILE, "a+", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.seek(0)
+                try:
+                    table = json.loads(f.read() or "{}")
+                except ValueError:
+                    table = {}
+                table[key] = digest
+                if len(table) > _MAX_ENTRIES:
+                    table = dict(list(table.items())[-_MAX_ENTRIES:])
+                f.seek(0)
+                f.truncate()
+                json.dump(table, f)
+        except OSError as e:
+            log.warning("保存文件哈希失败: %s", e)
+    return digest
@@ -0,0 +1,293 @@
+"""
+快照文件的顺序读写，尽量不挤占页缓存。
+
+刚恢复运行的业务进程与同机服务依赖页缓存，而一次快照要写读数十 GiB：
+- 写：写入前用 fallocate 预分配（减少碎片）；每写满一个窗口，对本窗口发起回写、
+  丢弃上一个窗口（POSIX_FADV_DONTNEED 对脏页只会触发回写，因此滞后一个窗口）
+- 读：声明顺序读，读过的范围随即丢弃
+- direct 为 true 时 .qsnap 改用 O_DIRECT 与页对齐的缓冲区，完全绕过页缓存；
+  文件系统不支持（如 tmpfs）时自动退回普通读写
+
+快照先写到同目录下的 .<名称>.part（写入期间持有其文件锁），fsync 后原子改名为
+最终文件名并 fsync 目录，崩溃只会留下可识别的 .part 文件（见 remove_partials）。
+恢复等读取操作对快照持有共享租约（lease），删除、降级、重建需要独占租约。
+
+配置见 config.json 的 "io" 小节。
+"""
+import contextlib
+import fcntl
+import mmap
+import os
+import pathlib
+from typing import BinaryIO
+
+from .config import get_section
+from .logger import log
+
+ALIGN = 4096
+PART_SUFFIX = ".part"
+
+DEFAULTS = {
+    "drop_cache": True,
+    "preallocate": True,
+    "direct": False,
+    "window": 32 << 20,        # 丢弃缓存 / O_DIRECT 缓冲区的粒度，需为 ALIGN 的倍数
+}
+
+_O_DIRECT = getattr(os, "O_DIRECT", 0)
+
+
+def settings() -> dict:
+    cfg = get_section("io", DEFAULTS)
+    cfg["window"] = max(ALIGN, int(cfg["window"]) // ALIGN * ALIGN)
+    return cfg
+
+
+def fadvise(fd: int, offset: int, length: int, advice: int) -> None:
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except (OSError, AttributeError):
+        pass
+
+
+def drop_cache(f: BinaryIO | int, offset: int = 0, length: int = 0) -> None:
+    """丢弃文件（默认整个文件）在页缓存中的干净页"""
+    fd = f if isinstance(f, int) else f.fileno()
+    fadvise(fd, offset, length, getattr(os, "POSIX_FADV_DONTNEED", 4))
+
+
+def preallocate(fd: int, offset: int, length: int) -> None:
+    try:
+        os.posix_fallocate(fd, offset, length)
+    except (OSError, AttributeError):
+        pass                                   # 文件系统不支持时照常写入
+
+
+class SnapshotBusy(OSError):
+    """快照正被其它操作（例如恢复）使用"""
+
+
+def partial_path(path: pathlib.Path) -> pathlib.Path:
+    """写入 path 期间使用的临时文件名"""
+    return path.with_name(f".{path.name}{PART_SUFFIX}")
+
+
+def fsync_dir(directory: pathlib.Path) -> None:
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def lease(path: pathlib.Path, exclusive: bool = False, wait: bool = True):
+    """
+    在 path 上持有 flock 租约；exclusive 为 False 时为共享租约。
+    wait 为 False 且租约被占用时抛出 SnapshotBusy。
+    """
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        try:
+            fcntl.flock(fd, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                        | (0 if wait else fcntl.LOCK_NB))
+        except BlockingIOError:
+            raise SnapshotBusy(f"快照正在使用中: {path.name}") from None
+        yield
+    finally:
+        os.close(fd)
+
+
+def remove_partials(directory: pathlib.Path) -> int:
+    """删除 directory 中写入被中断的 .part 文件（仍在写入的持有文件锁，不受影响）"""
+    removed = 0
+    for part in directory.glob(f".*{PART_SUFFIX}"):
+        try:
+            with lease(part, exclusive=True, wait=False):
+                part.unlink()
+        except OSError:
+            continue
+        log.info("删除写入中断的快照 %s", part.name)
+        removed += 1
+    return removed
+
+
+def _open(path: pathlib.Path, flags: int, direct: bool) -> tuple[int, bool]:
+    if direct and _O_DIRECT:
+        try:
+            return os.open(path, flags | _O_DIRECT, 0o644), True
+        except OSError as e:
+            log.debug("%s 不支持 O_DIRECT，使用普通读写: %s", path, e)
+    return os.open(path, flags, 0o644), False
+
+
+class SnapshotWriter:
+    """
+    顺序写入快照文件，接口为 write / reserve / close：
+        with SnapshotWriter(path) as out:
+            out.reserve(n); out.write(data)
+            out.close()          # 截断预分配的余量、fsync、改名为 path 并丢弃缓存
+    数据先写入 partial_path(path)；未调用 close 就退出 with 块（出错）时删除该文件。
+    """
+
+    def __init__(self, path: pathlib.Path, cfg: dict | None = None):
+        cfg = cfg or settings()
+        self.path = path
+        self.part = partial_path(path)
+        self.window = cfg["window"]
+        self.drop = bool(cfg["drop_cache"])
+        self.prealloc = bool(cfg["preallocate"])
+        self.fd, self.direct = _open(self.part,
+                                     os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC,
+                                     bool(cfg["direct"]))
+        fcntl.flock(self.fd, fcntl.LOCK_EX)       # 供 remove_partials 判断是否仍在写入
+        self.pos = 0              # 已写入的逻辑字节数
+        self.allocated = 0
+        self._dropped = 0         # 此前的范围已丢弃
+        self._written_back = 0    # 此前的范围已发起回写
+        self._buf = mmap.mmap(-1, self.window) if self.direct else None
+        self._fill = 0
+        self._disk = 0            # O_DIRECT 时已写到磁盘的字节数（对齐）
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            self.part.unlink(missing_ok=True)
+            self._release()
+
+    def _release(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if self._buf is not None:
+            self._buf.close()
+            self._buf = None
+
+    def tell(self) -> int:
+        return self.pos
+
+    def reserve(self, n: int) -> None:
+        """预告接下来要写 n 字节，按需预分配"""
+        end = self.pos + n
+        if self.prealloc and end > self.allocated:
+            preallocate(self.fd, self.allocated, end - self.allocated)
+            self.allocated = end
+
+    def write(self, data) -> int:
+        view = memoryview(data).cast("B")
+        n = len(view)
+        if self.direct:
+            while view:
+                k = min(len(view), self.window - self._fill)
+                self._buf[self._fill:self._fill + k] = view[:k]
+                self._fill += k
+                view = view[k:]
+                if self._fill == self.window:
+                    self._write_direct(self.window)
+            self.pos += n
+        else:
+            while view:
+                view = view[os.write(self.fd, view):]
+            self.pos += n
+            self._advance()
+        return n
+
+    def flush(self) -> None:
+        pass
+
+    def _write_direct(self, length: int) -> None:
+        done = 0
+        with memoryview(self._buf) as mv:
+            while done < length:
+                done += os.pwrite(self.fd, mv[done:length], self._disk + done)
+        self._disk += length
+        self._fill = 0
+
+    def _advance(self) -> None:
+        end = self.pos
+        if self.drop and end - self._written_back >= self.window:
+            drop_cache(self.fd, self._dropped, end - self._dropped)
+            self._dropped, self._written_back = self._written_back, end
+
+    def close(self) -> None:
+        if self.direct and self._fill:
+            # 最后不足一块的部分补齐到对齐长度写入，再截断到实际长度
+            padded = -(-self._fill // ALIGN) * ALIGN
+            self._buf[self._fill:padded] = bytes(padded - self._fill)
+            self._write_direct(padded)
+        if self.direct or self.allocated > self.pos:
+            os.ftruncate(self.fd, self.pos)
+        os.fsync(self.fd)
+        os.rename(self.part, self.path)
+        fsync_dir(self.path.parent)
+        if self.drop:
+            drop_cache(self.fd)
+        self._release()
+
+
+class SnapshotReader:
+    """从 offset 开始顺序读取快照文件，只提供 read；读过的范围丢弃缓存"""
+
+    def __init__(self, path: pathlib.Path, offset: int = 0, cfg: dict | None = None):
+        cfg = cfg or settings()
+        self.window = cfg["window"]
+        self.drop = bool(cfg["drop_cache"])
+        self.fd, self.direct = _open(path, os.O_RDONLY | os.O_CLOEXEC, bool(cfg["direct"]))
+        self.size = os.fstat(self.fd).st_size
+        self.pos = offset
+        self._dropped = offset
+        self._buf = mmap.mmap(-1, self.window) if self.direct else None
+        self._start = self._end = 0          # O_DIRECT 缓冲区对应的文件范围
+        if not self.direct:
+            fadvise(self.fd, offset, 0, getattr(os, "POSIX_FADV_SEQUENTIAL", 2))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        if self.fd is not None:
+            if self.drop and not self.direct:
+                drop_cache(self.fd, self._dropped, 0)
+            os.close(self.fd)
+            self.fd = None
+        if self._buf is not None:
+            self._buf.close()
+            self._buf = None
+
+    def tell(self) -> int:
+        return self.pos
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            n = self.size - self.pos
+        n = max(0, min(n, self.size - self.pos))
+        if n == 0:
+            return b""
+        if self.direct:
+            out = bytearray()
+            while len(out) < n:
+                if not self._start <= self.pos < self._end:
+                    self._fill_direct()
+                    if self._end <= self.pos:
+                        break
+                k = min(n - len(out), self._end - self.pos)
+                off = self.pos - self._start
+                out += self._buf[off:off + k]
+                self.pos += k
+            return bytes(out)
+        data = os.pread(self.fd, n, self.pos)
+        self.pos += len(data)
+        if self.drop and self.pos - self._dropped >= self.window:
+            drop_cache(self.fd, self._dropped, self.pos - self._dropped)
+            self._dropped = self.pos
+        return data
+
+    def _fill_direct(self) -> None:
+        start = self.pos // ALIGN * ALIGN
+        got = os.preadv(self.fd, [self._buf], start)
+        self._start, self._end = start, start + got
@@ -0,0 +1,238 @@
+"""
+资源调控：把 tar / 压缩器 / 解压器 / 验证用的恢复进程放进专用 cgroup，
+限制其 CPU、IO 与可用 CPU 核，避免与刚恢复运行的业务进程争抢资源。
+
+cgroup v2 未委派（无法把进程迁入）时退化为 nice + ionice；个别进程迁入失败时退回 nice。
+进程内的编解码（run_niced）在单独线程中运行，线程及其派生的压缩线程受 nice、
+CPU 亲和性与 IO 优先级约束；cgroup 的 cpu_max / io_max 限额无法作用于单个线程，
+设置了这两项时编解码改用受调控的命令行工具（见 in_process_allowed）。
+冻结窗口内的 criu dump 不经过这里，保证以最快速度完成。
+"""
+import contextvars
+import ctypes
+import functools
+import os
+import pathlib
+import shutil
+import subprocess
+import threading
+from typing import Callable, List, Tuple
+
+from . import profiler
+from .config import get_section
+from .logger import log
+
+CGROUP_ROOT = pathlib.Path("/sys/fs/cgroup")
+
+DEFAULTS = {
+    "enabled": True,
+    "cgroup": "",             # 为空时在当前 cgroup 旁创建 quicksave-helpers
+    "cpu_max": "",            # 例如 "50000 100000" 表示最多半个 CPU
+    "io_weight": 50,          # 1-10000，0 表示不设置
+    "io_max": [],             # 例如 ["8:0 rbps=104857600 wbps=104857600"]
+    "cpus": [],               # 允许使用的 CPU 编号，空表示不限制
+    "nice": 10,               # 回退方案
+    "ionice_class": 3,        # 回退方案：3 = idle
+}
+
+
+def _own_cgroup() -> pathlib.Path | None:
+    try:
+        with open("/proc/self/cgroup", "r") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    return CGROUP_ROOT / line.strip()[3:].lstrip("/")
+    except OSError:
+        pass
+    return None
+
+
+def _write(path: pathlib.Path, value: str) -> None:
+    with open(path, "w") as f:
+        f.write(value)
+
+
+def _enable_controllers(parent: pathlib.Path) -> None:
+    available = (parent / "cgroup.controllers").read_text().split()
+    wanted = [c for c in ("cpu", "io", "cpuset") if c in available]
+    if wanted:
+        try:
+            _write(parent / "cgroup.subtree_control", " ".join(f"+{c}" for c in wanted))
+        except OSError as e:
+            log.debug("启用 cgroup 控制器失败 %s: %s", parent, e)
+
+
+@functools.lru_cache(maxsize=None)
+def _setup() -> Tuple[pathlib.Path | None, dict]:
+    """创建并配置 helper cgroup；返回 (cgroup 路径或 None, 配置)"""
+    cfg = get_section("governor", DEFAULTS)
+    if not cfg["enabled"]:
+        return None, cfg
+    if cfg["cgroup"]:
+        cg = CGROUP_ROOT / cfg["cgroup"].lstrip("/")
+    else:
+        own = _own_cgroup()
+        if own is None:
+            return None, cfg
+        # cgroup v2 的非叶子节点不能有进程，因此放在当前 cgroup 的旁边（根 cgroup 除外）
+        cg = (own if own == CGROUP_ROOT else own.parent) / "quicksave-helpers"
+    try:
+        _enable_controllers(cg.parent)
+        cg.mkdir(exist_ok=True)
+        if cfg["cpu_max"] and (cg / "cpu.max").exists():
+            _write(cg / "cpu.max", cfg["cpu_max"])
+        if cfg["io_weight"] and (cg / "io.weight").exists():
+            _write(cg / "io.weight", f"default {int(cfg['io_weight'])}")
+        for rule in cfg["io_max"]:
+            if (cg / "io.max").exists():
+                _write(cg / "io.max", rule)
+        # 确认确实能把进程迁入：有写权限时迁移仍可能因委派边界等原因失败
+        _probe_migration(cg)
+    except OSError as e:
+        log.info("cgroup 未委派，使用 nice/ionice 调控后台进程: %s", e)
+        return None, cfg
+    log.info("后台进程将运行在 cgroup %s", cg)
+    return cg, cfg
+
+
+def _probe_migration(cg: pathlib.Path) -> None:
+    """把一个临时进程迁入 cg 并读回确认；失败时抛出 OSError"""
+    probe = subprocess.Popen(["sleep", "60"], stdin=subprocess.DEVNULL,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _write(cg / "cgroup.procs", str(probe.pid))
+        if str(probe.pid) not in (cg / "cgroup.procs").read_text().split():
+            raise PermissionError(f"进程未能迁入 {cg}")
+    finally:
+        probe.kill()
+        probe.wait()
+
+
+# ioprio_set 系统调用号与 IOPRIO_WHO_PROCESS（对线程 ID 只作用于该线程）
+_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}.get(os.uname().machine)
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+
+
+def _set_ioprio(tid: int, klass: int) -> None:
+    """设置线程的 IO 调度类（3 = idle，2 = best-effort 最低级）；不支持时静默忽略"""
+    if _IOPRIO_SET is None or klass not in (2, 3):
+        return
+    value = (klass << _IOPRIO_CLASS_SHIFT) | (7 if klass == 2 else 0)
+    try:
+        ctypes.CDLL(None, use_errno=True).syscall(_IOPRIO_SET, _IOPRIO_WHO_PROCESS, tid, value)
+    except (OSError, AttributeError):
+        pass
+
+
+def cpu_budget() -> int:
+    """后台工作可用的 CPU 数：配置的 cpus，否则为当前进程可用的 CPU 数"""
+    _cg, cfg = _setup()
+    if cfg["enabled"] and cfg["cpus"]:
+        return len(set(cfg["cpus"]))
+    try:
+        return len(os.sched_getaffinity(0))
+    except (OSError, AttributeError):
+        return os.cpu_count() or 1
+
+
+def in_process_allowed() -> bool:
+    """
+    进程内编解码能否满足调控配置：helper cgroup 生效且设置了 cpu_max 或 io_max 时
+    不能（线程无法单独放入该 cgroup），应使用受调控的命令行实现。
+    """
+    cg, cfg = _setup()
+    return cg is None or not (cfg["cpu_max"] or cfg["io_max"])
+
+
+def wrap(cmd: List[str]) -> Tuple[List[str], Callable[[], None] | None]:
+    """
+    为后台辅助进程返回 (命令行, preexec_fn)。
+    用法：cmd, preexec = governor.wrap(cmd); subprocess.run(cmd, preexec_fn=preexec)
+    """
+    cmd = [str(c) for c in cmd]
+    cg, cfg = _setup()
+    if not cfg["enabled"]:
+        return cmd, None
+    cpus = set(cfg["cpus"])
+
+    if cg is None and cfg["ionice_class"] and shutil.which("ionice"):
+        cmd = ["ionice", "-c", str(cfg["ionice_class"]), *cmd]
+
+    procs = str(cg / "cgroup.procs") if cg is not None else None
+
+    def preexec():
+        # 在子进程 exec 之前执行；不能记录日志，迁入 cgroup 失败时退回 nice
+        niceness = int(cfg["nice"])
+        if procs is not None:
+            try:
+                with open(procs, "w") as f:
+                    f.write("0")
+                niceness = 0
+            except OSError:
+                pass
+        if niceness:
+            try:
+                os.nice(niceness)
+            except OSError:
+                pass
+        if cpus:
+            try:
+                os.sched_setaffinity(0, cpus)
+            except OSError:
+                pass
+
+    return cmd, preexec
+
+
+def chain(*funcs: Callable[[], None] | None) -> Callable[[], None] | None:
+    """把多个 preexec_fn 合成一个（例如 os.setsid + 调控）"""
+    funcs = [f for f in funcs if f is not None]
+    if not funcs:
+        return None
+
+    def run():
+        for f in funcs:
+            f()
+    return run
+
+
+def run_niced(func: Callable, *args, **kwargs):
+    """
+    在临时线程中运行进程内的后台工作（例如进程内编解码），返回其结果。
+    Linux 上 nice 值、CPU 亲和性与 IO 优先级都按线程生效，只约束该线程及其派生的
+    线程（例如 zstd 的压缩线程），不影响调用者。
+    """
+    _cg, cfg = _setup()
+    if not cfg["enabled"] or not (cfg["nice"] or cfg["cpus"] or cfg["ionice_class"]):
+        return func(*args, **kwargs)
+    box = {}
+    work = profiler.in_thread(func)
+
+    def target():
+        tid = threading.get_native_id()
+        if cfg["nice"]:
+            try:
+                os.setpriority(os.PRIO_PROCESS, tid, int(cfg["nice"]))
+            except (OSError, AttributeError):
+                pass
+        if cfg["cpus"]:
+            try:
+                os.sched_setaffinity(tid, set(cfg["cpus"]))
+            except OSError:
+                pass
+        if cfg["ionice_class"]:
+            _set_ioprio(tid, int(cfg["ionice_class"]))
+        try:
+            box["result"] = work(*args, **kwargs)
+        except BaseException as e:
+            box["error"] = e
+
+    # 复制上下文，使工作线程中的日志仍带有快照 / 阶段信息
+    ctx = contextvars.copy_context()
+    t = threading.Thread(target=ctx.run, args=(target,), name="quicksave-niced", daemon=True)
+    t.start()
+    t.join()
+    if "error" in box:
+        raise box["error"]
+    return box.get("result")
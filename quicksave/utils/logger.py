@@ -1,25 +1,195 @@
+"""
+日志：调用方只把记录放进队列（QueueHandler），格式化与写文件/控制台
+由后台 QueueListener 线程完成，不阻塞快照、恢复等热路径。
+
+- 日志文件 ~/.quicksave/logs/quicksave.log，按时间（默认每天）和大小轮转
+- logging.json 为 true 时文件中每行一条 JSON 记录
+- log_context(snapshot=..., phase=...) 为其中产生的记录附加快照与阶段
+- Sampled 用于逐项日志（逐文件等）：只输出前几条，其余计数后汇总
+
+配置见 config.json 的 "logging" 小节。
+"""
+import atexit
+import contextlib
+import contextvars
+import copy
+import json
 import logging
 import logging.handlers
 import pathlib
+import queue
 import sys
-from datetime import datetime
+import time
 
 LOG_DIR = pathlib.Path.home() / ".quicksave" / "logs"
 LOG_DIR.mkdir(parents=True, exist_ok=True)
+LOG_FILE = LOG_DIR / "quicksave.log"
+
+DEFAULTS = {
+    "level": "INFO",
+    "json": False,
+    "max_bytes": 10 << 20,
+    "when": "midnight",
+    "backup_count": 14,
+}
+
+_snapshot = contextvars.ContextVar("quicksave_snapshot", default=None)
+_phase = contextvars.ContextVar("quicksave_phase", default=None)
+
+
+def _settings() -> dict:
+    # 不能使用 utils.config（它依赖本模块），这里直接读取配置文件
+    cfg = dict(DEFAULTS)
+    try:
+        with open(LOG_DIR.parent / "config.json", "r", encoding="utf-8") as f:
+            section = json.load(f).get("logging")
+        if isinstance(section, dict):
+            cfg.update(section)
+    except (OSError, ValueError):
+        pass
+    return cfg
+
+
+@contextlib.contextmanager
+def log_context(snapshot: str | None = None, phase: str | None = None):
+    """在 with 块内产生的日志记录附带 snapshot / phase 字段"""
+    tokens = []
+    if snapshot is not None:
+        tokens.append((_snapshot, _snapshot.set(snapshot)))
+    if phase is not None:
+        tokens.append((_phase, _phase.set(phase)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class _ContextFilter(logging.Filter):
+    """在产生日志的线程中读取上下文（QueueHandler 之后就换线程了）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.snapshot = _snapshot.get()
+        record.phase = _phase.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+                  + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "module": record.module,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for key in ("snapshot", "phase"):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        ctx = [v for v in (getattr(record, "snapshot", None), getattr(record, "phase", None)) if v]
+        record.ctx = f"[{'/'.join(ctx)}] " if ctx else ""
+        return super().format(record)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    默认的 prepare() 在调用线程中把整条记录（含回溯）格式化进 msg 并清掉异常信息，
+    JSON 日志因此没有 exc 字段。这里保留 msg 与 args，只把异常预先渲染为 exc_text，
+    格式化仍由监听线程完成；回溯对象本身不入队，避免其中的栈帧被长期引用。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_exc_formatter = logging.Formatter()
+
+
+class RotatingHandler(logging.handlers.TimedRotatingFileHandler):
+    """按时间轮转，单个文件超过 max_bytes 时也提前轮转"""
+
+    def __init__(self, filename, max_bytes: int, **kwargs):
+        super().__init__(filename, encoding="utf-8", **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record: logging.LogRecord) -> int:
+        if super().shouldRollover(record):
+            return 1
+        if self.max_bytes > 0 and self.stream is not None and self.stream.tell() >= self.max_bytes:
+            return 1
+        return 0
+
+    def rotation_filename(self, default_name: str) -> str:
+        # 同一时间段内按大小多次轮转时避免覆盖
+        name, n = default_name, 1
+        while pathlib.Path(name).exists():
+            name = f"{default_name}.{n}"
+            n += 1
+        return name
+
+
+class Sampled:
+    """
+    逐项日志的采样：只输出前 limit 条，其余仅计数。
+        warn = Sampled(logging.WARNING)
+        for ...: warn("处理失败 %s", path)
+        log.info("完成，%s", warn.summary())
+    """
+
+    def __init__(self, level: int = logging.DEBUG, limit: int = 5):
+        self.level = level
+        self.limit = limit
+        self.count = 0
+
+    def __call__(self, msg: str, *args) -> None:
+        self.count += 1
+        if self.count <= self.limit:
+            log.log(self.level, msg, *args, stacklevel=2)
+
+    def summary(self) -> str:
+        hidden = self.count - self.limit
+        return f"共 {self.count} 条" + (f"（{hidden} 条未逐条记录）" if hidden > 0 else "")
+
+
+_cfg = _settings()
 
 log = logging.getLogger("quicksave")
-log.setLevel(logging.INFO)
+log.setLevel(getattr(logging, str(_cfg["level"]).upper(), logging.INFO))
+log.propagate = False
 
 # 控制台输出（仅 INFO+）
 _stream = logging.StreamHandler(sys.stdout)
-_stream.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
-log.addHandler(_stream)
-
-# 滚动文件：按日期新建
-_today = datetime.now().strftime("%Y-%m-%d")
-_file = LOG_DIR / f"{_today}.log"
-_fh = logging.FileHandler(_file, encoding="utf-8")
-_fh.setFormatter(logging.Formatter(
-    "%(asctime)s | %(levelname)s | %(module)s:%(lineno)d | %(message)s"
+_stream.setLevel(logging.INFO)
+_stream.setFormatter(_TextFormatter("[%(levelname)s] %(ctx)s%(message)s"))
+
+_fh = RotatingHandler(LOG_FILE, int(_cfg["max_bytes"]), when=_cfg["when"],
+                      backupCount=int(_cfg["backup_count"]))
+_fh.setFormatter(JsonFormatter() if _cfg["json"] else _TextFormatter(
+    "%(asctime)s | %(levelname)s | %(module)s:%(lineno)d | %(ctx)s%(message)s"
 ))
-log.addHandler(_fh)
\ No newline at end of file
+
+_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_qh = _QueueHandler(_queue)
+_qh.addFilter(_ContextFilter())
+log.addHandler(_qh)
+
+_listener = logging.handlers.QueueListener(_queue, _stream, _fh, respect_handler_level=True)
+_listener.start()
+atexit.register(_listener.stop)
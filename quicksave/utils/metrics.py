@@ -0,0 +1,244 @@
+"""
+进程内指标（计数器 / 仪表 / 直方图），输出 Prometheus 文本格式。
+
+core 中的 dump / restore / verify_only 与 daemon 线程直接更新这里的指标，
+daemon.exporter.MetricsExporter 负责以 HTTP 或 node-exporter textfile 的形式导出。
+"""
+import bisect
+import os
+import pathlib
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+_LabelKey = Tuple[str, ...]
+
+# 时长类直方图默认桶（秒）
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# 字节类直方图默认桶
+BYTES_BUCKETS = tuple(2 ** n for n in range(20, 38, 2))      # 1 MiB … 64 GiB
+RATIO_BUCKETS = (1, 1.5, 2, 3, 4, 6, 8, 12, 16, 32)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _fmt_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> _LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: 标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        lines += self._samples()
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, doc, labelnames=()):
+        super().__init__(name, doc, labelnames)
+        self._values: Dict[_LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount < 0:
+            raise ValueError("计数器只能递增")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, doc, labelnames=()):
+        super().__init__(name, doc, labelnames)
+        self._values: Dict[_LabelKey, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # key -> [每个桶的计数..., sum]
+        self._values: Dict[_LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            slot = self._values.setdefault(key, [0] * len(self.buckets) + [0.0])
+            slot[idx] += 1
+            slot[-1] += value
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, slot in items:
+            acc = 0
+            for bound, n in zip(self.buckets, slot):
+                acc += n
+                le = 'le="%s"' % _fmt_value(bound if bound == float("inf") else float(bound))
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {acc}")
+            labels = _fmt_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_fmt_value(float(slot[-1]))}")
+            lines.append(f"{self.name}_count{labels} {acc}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, doc, labelnames=()) -> Counter:
+    return REGISTRY.register(Counter(name, doc, labelnames))
+
+
+def gauge(name, doc, labelnames=()) -> Gauge:
+    return REGISTRY.register(Gauge(name, doc, labelnames))
+
+
+def histogram(name, doc, labelnames=(), buckets=DURATION_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, doc, labelnames, buckets))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def write_textfile(path: pathlib.Path) -> None:
+    """
+    写入 node-exporter textfile collector 目录。
+    先写临时文件再 rename，避免 collector 读到半个文件。
+    """
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+# ---------- quicksave 使用的指标 ----------
+OPS = counter("quicksave_operations_total",
+              "Snapshot operations by kind and outcome", ("op", "outcome"))
+OP_SECONDS = histogram("quicksave_operation_duration_seconds",
+                       "End-to-end duration of dump/restore/verify", ("op",))
+FREEZE_SECONDS = histogram("quicksave_freeze_duration_seconds",
+                           "Time the target tree spends frozen inside criu dump")
+DUMP_PHASE_SECONDS = histogram("quicksave_dump_phase_duration_seconds",
+                               "criu dump phases: freeze (cgroup), seize, frozen",
+                               ("phase", "strategy"))
+BYTES_IN = counter("quicksave_bytes_in_total",
+                   "Bytes read per operation (images for dump, .qsnap for restore/verify)", ("op",))
+BYTES_OUT = counter("quicksave_bytes_out_total",
+                    "Bytes written per operation (.qsnap for dump, images for restore/verify)", ("op",))
+SNAPSHOT_BYTES = histogram("quicksave_snapshot_size_bytes",
+                           "Size of published .qsnap files", buckets=BYTES_BUCKETS)
+COMPRESSION_RATIO = histogram("quicksave_compression_ratio",
+                              "Uncompressed/compressed size per snapshot", buckets=RATIO_BUCKETS)
+STORE_BYTES = gauge("quicksave_store_bytes", "Total size of .qsnap files in QS_DIR")
+STORE_COUNT = gauge("quicksave_store_snapshots", "Number of .qsnap files in QS_DIR")
+MONITOR_SCAN_SECONDS = histogram("quicksave_monitor_scan_duration_seconds",
+                                 "Time spent by ProcessMonitor scanning processes")
+
+
+def record_op(op: str, ok: bool, seconds: float) -> None:
+    """记录一次 dump / restore / verify 的结果与端到端耗时"""
+    OPS.inc(op=op, outcome="success" if ok else "failure")
+    OP_SECONDS.observe(seconds, op=op)
+
+
+def dir_size(path: pathlib.Path) -> int:
+    """统计目录下所有普通文件的大小"""
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.lstat(os.path.join(root, f)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def update_store_gauges(*dirs: pathlib.Path) -> None:
+    """刷新快照目录（QS_DIR 及冷层目录）中的快照数量与总字节数"""
+    count = size = 0
+    for f in (f for d in dirs for f in pathlib.Path(d).glob("*.qsnap")):
+        try:
+            size += f.stat().st_size
+            count += 1
+        except OSError:
+            continue
+    STORE_BYTES.set(size)
+    STORE_COUNT.set(count)
@@ -0,0 +1,284 @@
+"""
+可选的性能剖析：用 cProfile、tracemalloc 记录一次操作（dump / restore / 验证 /
+监控扫描 / GUI 刷新）中 quicksave 自身的开销，并用 RUSAGE_CHILDREN 的差值统计
+criu、zstd 等子进程消耗的 CPU 与内存。
+
+每次操作在 ~/.quicksave/profiles/ 下写出 <时间>-<操作>.pstats 与同名 .txt 摘要，
+只保留最近 keep 次。开启方式：
+- 环境变量 QUICKSAVE_PROFILE=1（全部操作）或逗号分隔的操作名，例如 dump,restore
+- 或 config.json 的 "profiling" 小节
+
+嵌套的操作并入外层会话。governor.run_niced 中的工作线程也记录到同一会话。
+不同线程中的会话可以同时进行（例如 GUI 刷新与后台扫描），tracemalloc 在第一个
+会话开始时启动、最后一个会话结束时停止；并发会话的分配峰值相互包含。
+"""
+import contextlib
+import contextvars
+import cProfile
+import functools
+import io
+import os
+import pathlib
+import pstats
+import resource
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from .config import get_section
+from .logger import log
+
+PROFILE_DIR = pathlib.Path.home() / ".quicksave" / "profiles"
+ENV_VAR = "QUICKSAVE_PROFILE"
+
+DEFAULTS = {
+    "enabled": False,
+    "ops": [],                 # 为空表示全部操作
+    "keep": 20,
+    "top": 30,                 # 摘要中列出的函数 / 分配位置数
+    "tracemalloc_frames": 1,
+}
+
+_active: contextvars.ContextVar["_Session | None"] = \
+    contextvars.ContextVar("quicksave_profile", default=None)
+
+# tracemalloc 是进程级的：按会话计数，由最后一个结束的会话停止
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_external = False        # 剖析开始前已由别处启动，不归我们停止
+
+
+def _trace_acquire(frames: int) -> None:
+    global _tracing_users, _tracing_external
+    with _tracing_lock:
+        if _tracing_users == 0:
+            _tracing_external = tracemalloc.is_tracing()
+            if not _tracing_external:
+                tracemalloc.start(frames)
+            tracemalloc.reset_peak()
+        _tracing_users += 1
+
+
+def _trace_release() -> tuple:
+    """返回 (快照, 峰值)，并在没有其它会话时停止 tracemalloc。
+    tracemalloc 已被别处停止时返回 (None, 0)"""
+    global _tracing_users
+    with _tracing_lock:
+        try:
+            return tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1]
+        except RuntimeError:
+            return None, 0
+        finally:
+            _tracing_users -= 1
+            if _tracing_users == 0 and not _tracing_external:
+                tracemalloc.stop()
+
+
+def settings(op: str) -> dict | None:
+    """op 需要剖析时返回配置，否则返回 None"""
+    cfg = get_section("profiling", DEFAULTS)
+    env = os.environ.get(ENV_VAR, "").strip()
+    if env and env.lower() not in ("0", "false", "no"):
+        cfg["enabled"] = True
+        if env.lower() not in ("1", "true", "yes", "all"):
+            cfg["ops"] = [s.strip() for s in env.split(",") if s.strip()]
+    if not cfg["enabled"] or (cfg["ops"] and op not in cfg["ops"]):
+        return None
+    return cfg
+
+
+def _mib(n: float) -> str:
+    return f"{n / 2**20:.1f} MiB"
+
+
+class _Session:
+    def __init__(self, op: str, cfg: dict):
+        self.op = op
+        self.cfg = cfg
+        self.profiles: List[cProfile.Profile] = []
+        self.children: Dict[str, List[float]] = {}     # 标签 → [次数, user, sys, maxrss]
+        self._lock = threading.Lock()
+        self.snapshot: tracemalloc.Snapshot | None = None
+        self.peak = 0
+
+    # ---------- cProfile ----------
+    def _profile(self) -> cProfile.Profile | None:
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # Python 3.12 起 cProfile 基于 sys.monitoring，全局只能有一个，且已覆盖所有线程
+            return None
+        with self._lock:
+            self.profiles.append(prof)
+        return prof
+
+    def run_thread(self, func: Callable, *args, **kwargs):
+        prof = self._profile()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if prof is not None:
+                prof.disable()
+
+    # ---------- 会话 ----------
+    def start(self) -> None:
+        _trace_acquire(int(self.cfg["tracemalloc_frames"]))
+        self.t0 = time.perf_counter()
+        self.started = time.time()
+        self.self0 = resource.getrusage(resource.RUSAGE_SELF)
+        self.children0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.main = self._profile()
+
+    def stop(self) -> None:
+        try:
+            if self.main is not None:
+                self.main.disable()
+            self.elapsed = time.perf_counter() - self.t0
+            self.self1 = resource.getrusage(resource.RUSAGE_SELF)
+            self.children1 = resource.getrusage(resource.RUSAGE_CHILDREN)
+        finally:
+            self.snapshot, self.peak = _trace_release()
+
+    def add_child(self, label: str, before, after) -> None:
+        with self._lock:
+            entry = self.children.setdefault(label, [0, 0.0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += after.ru_utime - before.ru_utime
+            entry[2] += after.ru_stime - before.ru_stime
+            entry[3] = max(entry[3], after.ru_maxrss)
+
+    # ---------- 输出 ----------
+    def _stats(self) -> pstats.Stats | None:
+        stats = None
+        for prof in self.profiles:
+            if stats is None:
+                stats = pstats.Stats(prof, stream=io.StringIO())
+            else:
+                stats.add(prof)
+        return stats
+
+    def summary(self, stats: pstats.Stats | None) -> str:
+        top = int(self.cfg["top"])
+        cpu_user = self.self1.ru_utime - self.self0.ru_utime
+        cpu_sys = self.self1.ru_stime - self.self0.ru_stime
+        lines = [
+            f"操作: {self.op}",
+            f"开始: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started))}",
+            f"耗时: {self.elapsed:.3f} s",
+            f"quicksave 进程 CPU: user {cpu_user:.3f} s, sys {cpu_sys:.3f} s",
+            f"Python 分配峰值: {_mib(self.peak)}",
+            "",
+            "子进程（RUSAGE_CHILDREN 差值；并发的子进程按结束时间归属，"
+            "MAXRSS 为此前所有子进程中的最大值）:",
+            f"  {'命令':<24} {'次数':>4} {'USER':>10} {'SYS':>10} {'MAXRSS':>12}",
+        ]
+        for label, (count, user, sys_, maxrss) in sorted(self.children.items(),
+                                                         key=lambda kv: -(kv[1][1] + kv[1][2])):
+            lines.append(f"  {label:<24} {count:>4} {user:>9.3f}s {sys_:>9.3f}s"
+                         f" {_mib(maxrss * 1024):>12}")
+        user = self.children1.ru_utime - self.children0.ru_utime
+        sys_ = self.children1.ru_stime - self.children0.ru_stime
+        lines.append(f"  {'合计':<24} {'':>4} {user:>9.3f}s {sys_:>9.3f}s")
+
+        lines += ["", f"内存分配最多的位置（前 {top}）:"]
+        for stat in self.snapshot.statistics("lineno")[:top] if self.snapshot else []:
+            lines.append(f"  {stat.size / 1024:>10.1f} KiB {stat.count:>8}  {stat.traceback}")
+
+        if stats is not None:
+            out = io.StringIO()
+            stats.stream = out
+            stats.sort_stats("cumulative").print_stats(top)
+            lines += ["", "函数耗时（按累计时间）:", out.getvalue()]
+        return "\n".join(lines)
+
+    def write(self) -> pathlib.Path:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        ts = time.strftime("%Y%m%d_%H%M%S", time.localtime(self.started))
+        stem = f"{ts}{int(self.started * 1000) % 1000:03d}-{self.op}-{os.getpid()}"
+        stats = self._stats()
+        if stats is not None:
+            stats.dump_stats(PROFILE_DIR / f"{stem}.pstats")
+        path = PROFILE_DIR / f"{stem}.txt"
+        path.write_text(self.summary(stats), encoding="utf-8")
+        _prune(int(self.cfg["keep"]))
+        return path
+
+
+def _prune(keep: int) -> None:
+    summaries = sorted(PROFILE_DIR.glob("*.txt"))
+    for old in summaries[:max(0, len(summaries) - keep)]:
+        old.unlink(missing_ok=True)
+        old.with_suffix(".pstats").unlink(missing_ok=True)
+
+
+@contextlib.contextmanager
+def profile_op(op: str):
+    """按配置剖析 with 块；已在剖析中时并入外层会话"""
+    cfg = settings(op) if _active.get() is None else None
+    if cfg is None:
+        yield
+        return
+    session = _Session(op, cfg)
+    token = _active.set(session)
+    try:
+        session.start()
+        started = True
+    except Exception as e:
+        log.warning("启动性能剖析失败 (%s): %s", op, e)
+        started = False
+    try:
+        yield
+    finally:
+        # 剖析本身出错不影响被剖析的操作
+        ok = started
+        try:
+            if started:
+                session.stop()
+        except Exception as e:
+            log.warning("结束性能剖析失败 (%s): %s", op, e)
+            ok = False
+        finally:
+            _active.reset(token)
+        if ok:
+            try:
+                log.info("性能剖析已写入 %s", session.write())
+            except OSError as e:
+                log.warning("写入性能剖析失败: %s", e)
+
+
+def profiled(op: str):
+    """装饰器版本的 profile_op"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_op(op):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def child(label: str):
+    """把 with 块中结束的子进程的资源消耗记到当前会话的 label 名下"""
+    session = _active.get()
+    if session is None:
+        yield
+        return
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    try:
+        yield
+    finally:
+        session.add_child(label, before, resource.getrusage(resource.RUSAGE_CHILDREN))
+
+
+def in_thread(func: Callable) -> Callable:
+    """
+    供工作线程使用（需在复制的上下文中调用）：有活动的会话时，
+    返回在该线程中同样开启 cProfile 的包装函数，否则原样返回。
+    """
+    session = _active.get()
+    if session is None:
+        return func
+    return functools.partial(session.run_thread, func)
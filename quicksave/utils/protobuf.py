@@ -0,0 +1,98 @@
+"""
+最小化的 protobuf 解码器，只用于读取 CRIU 镜像，不依赖 crit / protobuf 包。
+
+CRIU 镜像格式：开头为魔数（新格式为 通用魔数 + 镜像魔数 两个 u32），
+之后是若干条 “u32 小端长度 + protobuf 消息”。pages-*.img 是原始页数据，不走这里。
+"""
+import struct
+from typing import Dict, Iterator, List
+
+# CRIU 新格式镜像开头的通用魔数（常规镜像 / 服务镜像）
+_IMG_COMMON_MAGIC = 0x54564319
+_IMG_SERVICE_MAGIC = 0x55105940
+
+Fields = Dict[int, List[object]]
+
+
+def _varint(buf, pos: int):
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def decode(buf) -> Fields:
+    """
+    解码一条消息为 {字段号: [值, …]}。
+    varint / fixed 字段为 int，长度前缀字段为 memoryview（子消息、字符串或 packed 数组）。
+    """
+    buf = memoryview(buf)
+    out: Fields = {}
+    pos, end = 0, len(buf)
+    while pos < end:
+        key, pos = _varint(buf, pos)
+        num, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _varint(buf, pos)
+        elif wire == 1:
+            (value,) = struct.unpack_from("<Q", buf, pos)
+            pos += 8
+        elif wire == 2:
+            length, pos = _varint(buf, pos)
+            value = buf[pos:pos + length]
+            pos += length
+        elif wire == 5:
+            (value,) = struct.unpack_from("<I", buf, pos)
+            pos += 4
+        else:
+            raise ValueError(f"不支持的 protobuf wire type {wire}")
+        out.setdefault(num, []).append(value)
+    return out
+
+
+def first(fields: Fields, num: int, default=None):
+    values = fields.get(num)
+    return values[0] if values else default
+
+
+def string(fields: Fields, num: int, default: str = "") -> str:
+    value = first(fields, num)
+    return bytes(value).decode("utf-8", errors="replace") if value is not None else default
+
+
+def ints(fields: Fields, num: int) -> List[int]:
+    """repeated 整数字段，兼容 packed 与非 packed 两种编码"""
+    out = []
+    for value in fields.get(num, []):
+        if isinstance(value, memoryview):
+            pos = 0
+            while pos < len(value):
+                v, pos = _varint(value, pos)
+                out.append(v)
+        else:
+            out.append(value)
+    return out
+
+
+def zigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def entries(buf) -> Iterator[memoryview]:
+    """遍历 CRIU 镜像中的消息"""
+    buf = memoryview(buf)
+    if len(buf) < 4:
+        return
+    (magic,) = struct.unpack_from("<I", buf, 0)
+    pos = 8 if magic in (_IMG_COMMON_MAGIC, _IMG_SERVICE_MAGIC) else 4
+    while pos + 4 <= len(buf):
+        (size,) = struct.unpack_from("<I", buf, pos)
+        pos += 4
+        if pos + size > len(buf):
+            raise ValueError("CRIU 镜像被截断")
+        yield buf[pos:pos + size]
+        pos += size
@@ -0,0 +1,159 @@
+"""
+页镜像的零页省略。
+
+CRIU 的 pages-*.img 中常有大段全零页（新分配的堆、JVM 预留区等）。打包时找出
+非零的数据区间，只把这些区间交给压缩器；解包时按区间写回并把文件截断到原长，
+零页成为文件空洞，既省掉压缩/解压零页的 CPU，也不占用磁盘。
+
+有 NumPy 时在 mmap 上按页向量化判断并找出零页段，否则按块比较字节。
+"""
+import mmap
+import os
+from typing import BinaryIO, List, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+PAGE = 4096
+MIN_HOLE = 64 << 10            # 短于该长度的零页段不单独省略，避免区间过碎
+_WINDOW = 64 << 20             # 每次判断的窗口大小，限制临时内存
+_ZERO_BLOCK = bytes(MIN_HOLE)
+_ZERO_PAGE = bytes(PAGE)
+
+Extent = Tuple[int, int]       # (偏移, 长度)
+
+
+def _zero_pages_numpy(buf, start: int, length: int):
+    arr = numpy.frombuffer(buf, dtype=numpy.uint64, count=length // 8, offset=start)
+    return ~arr.reshape(-1, PAGE // 8).any(axis=1)
+
+
+def _zero_pages_bytes(buf, start: int, length: int) -> List[bool]:
+    flags = []
+    for off in range(start, start + length, MIN_HOLE):
+        n = min(MIN_HOLE, start + length - off)
+        if buf[off:off + n] == _ZERO_BLOCK[:n]:
+            flags.extend([True] * (n // PAGE))
+        else:
+            flags.extend(buf[p:p + PAGE] == _ZERO_PAGE for p in range(off, off + n, PAGE))
+    return flags
+
+
+def _zero_runs_numpy(zero) -> List[Tuple[int, int]]:
+    """全零页段 [(起始页, 结束页)]：在零页标记的差分中找上升沿与下降沿"""
+    edges = numpy.diff(numpy.concatenate(([0], zero.view(numpy.int8), [0])))
+    starts = numpy.flatnonzero(edges == 1)
+    ends = numpy.flatnonzero(edges == -1)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _zero_runs_bytes(zero: List[bool]) -> List[Tuple[int, int]]:
+    runs = []
+    i, n = 0, len(zero)
+    while i < n:
+        if not zero[i]:
+            i += 1
+            continue
+        j = i
+        while j < n and zero[j]:
+            j += 1
+        runs.append((i, j))
+        i = j
+    return runs
+
+
+def data_extents(f: BinaryIO) -> List[Extent]:
+    """返回文件中需要保存的数据区间；全是数据时为 [(0, size)]，全是零页时为 []"""
+    size = os.fstat(f.fileno()).st_size
+    if size < MIN_HOLE:
+        return [(0, size)] if size else []
+    whole = size - size % PAGE
+    with mmap.mmap(f.fileno(), whole, access=mmap.ACCESS_READ) as mm:
+        if numpy is not None:
+            zero = numpy.concatenate([_zero_pages_numpy(mm, start, min(_WINDOW, whole - start))
+                                      for start in range(0, whole, _WINDOW)])
+            runs = _zero_runs_numpy(zero)
+        else:
+            zero: List[bool] = []
+            for start in range(0, whole, _WINDOW):
+                zero.extend(_zero_pages_bytes(mm, start, min(_WINDOW, whole - start)))
+            runs = _zero_runs_bytes(zero)
+
+    extents: List[Extent] = []
+    min_pages = MIN_HOLE // PAGE
+    data_start = 0
+    for i, j in runs:
+        if j - i < min_pages:
+            continue
+        if i * PAGE > data_start:
+            extents.append((data_start, i * PAGE - data_start))
+        data_start = j * PAGE
+    if size > data_start:
+        extents.append((data_start, size - data_start))
+    return extents
+
+
+class ExtentReader:
+    """按区间顺序读取文件，得到的流只包含数据部分"""
+
+    def __init__(self, f: BinaryIO, extents: List[Extent]):
+        self.fd = f.fileno()
+        self.extents = list(extents)
+        self.index = 0
+        self.pos = 0
+
+    def read(self, n: int = -1) -> bytes:
+        while self.index < len(self.extents):
+            off, length = self.extents[self.index]
+            if self.pos < length:
+                want = length - self.pos if n < 0 else min(n, length - self.pos)
+                buf = os.pread(self.fd, want, off + self.pos)
+                if not buf:
+                    raise EOFError("页镜像在打包过程中被截断")
+                self.pos += len(buf)
+                return buf
+            self.index += 1
+            self.pos = 0
+        return b""
+
+
+class ExtentWriter:
+    """把只含数据部分的流按区间写回文件，close 时截断到原长，零页成为空洞"""
+
+    def __init__(self, f: BinaryIO, extents: List[Extent], size: int):
+        self.f = f
+        self.fd = f.fileno()
+        self.extents = list(extents)
+        self.size = size
+        self.index = 0
+        self.pos = 0
+
+    def write(self, buf) -> int:
+        view = memoryview(buf)
+        total = len(view)
+        while view:
+            if self.index >= len(self.extents):
+                raise ValueError("解压出的数据多于区间表记录的长度")
+            off, length = self.extents[self.index]
+            n = min(len(view), length - self.pos)
+            os.pwrite(self.fd, view[:n], off + self.pos)
+            self.pos += n
+            view = view[n:]
+            if self.pos == length:
+                self.index += 1
+                self.pos = 0
+        return total
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if self.index < len(self.extents):
+            raise ValueError("解压出的数据少于区间表记录的长度")
+        os.ftruncate(self.fd, self.size)
+
+
+def saved_bytes(extents: List[Extent], size: int) -> int:
+    return size - sum(length for _off, length in extents)
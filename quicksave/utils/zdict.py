@@ -0,0 +1,220 @@
+"""
+按应用训练的 zstd 字典，用于压缩 CRIU 镜像中大量的小 protobuf 文件
+（core-*.img、mm-*.img、fdinfo-*.img、files.img …）。
+
+字典按应用（可执行文件 + 第一个参数）分别保存在 ~/.quicksave/dicts/<app>/ 下，
+每次快照把小文件留作样本，样本积累到一定数量后用 `zstd --train` 训练新版本；
+快照中用到的字典记录在 quicksave.json 中，并把字典本身作为 quicksave.zdict 存入
+快照，复制到其它机器或本机字典丢失后仍可解压。更早的快照没有内嵌字典，仍需本机
+保存的版本；没有快照需要的旧版本由 prune() 删除。
+"""
+import hashlib
+import json
+import os
+import pathlib
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+from typing import Dict, List, Set
+
+from . import governor, profiler
+from .logger import log
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DICT_DIR = pathlib.Path.home() / ".quicksave" / "dicts"
+META_NAME = "quicksave.json"
+EMBED_NAME = "quicksave.zdict"   # 快照内嵌的字典副本
+
+SMALL_MEMBER = 64 << 10          # 不超过该大小的镜像文件使用字典压缩
+SAMPLE_SETS_KEEP = 32            # 每个应用最多保留的样本快照数
+TRAIN_EVERY = 8                  # 每积累多少份新样本重新训练
+MAX_DICT_SIZE = 112640
+_DICT_MAGIC = 0xEC30A437
+
+
+def app_key(pid: int) -> str | None:
+    """根据进程的可执行文件与第一个参数生成应用标识"""
+    try:
+        exe = os.readlink(f"/proc/{pid}/exe")
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            argv = f.read().split(b"\0")
+    except OSError:
+        return None
+    arg1 = argv[1].decode(errors="ignore") if len(argv) > 1 else ""
+    digest = hashlib.sha1(f"{exe}\0{arg1}".encode()).hexdigest()[:10]
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", os.path.basename(exe)) or "app"
+    return f"{name}-{digest}"
+
+
+def _small_members(src_dir: pathlib.Path) -> List[pathlib.Path]:
+    return sorted(p for p in src_dir.iterdir()
+                  if p.is_file() and p.suffix == ".img"
+                  and not p.name.startswith("pages-")
+                  and 0 < p.stat().st_size <= SMALL_MEMBER)
+
+
+def _versions(app: str) -> List[int]:
+    base = DICT_DIR / app
+    if not base.is_dir():
+        return []
+    return sorted(int(m.group(1)) for p in base.glob("v*.zdict")
+                  if (m := re.fullmatch(r"v(\d+)\.zdict", p.name)))
+
+
+def dict_path(app: str, version: int) -> pathlib.Path:
+    return DICT_DIR / app / f"v{version}.zdict"
+
+
+def _dictionary(info: dict, embedded: pathlib.Path | None = None) -> pathlib.Path:
+    """快照所用的字典：优先用快照内嵌的副本，其次是本机保存的同一版本"""
+    local = dict_path(info["app"], info["version"])
+    for path in (embedded, local):
+        if path is None or not path.exists():
+            continue
+        if info.get("id") and dict_id(path) != info["id"]:
+            log.warning("zstd 字典 ID 不匹配: %s", path)
+            continue
+        return path
+    raise FileNotFoundError(f"快照所需的 zstd 字典不存在: {local}")
+
+
+def dict_id(path: pathlib.Path) -> int:
+    """读取 zstd 字典头中的 dictID"""
+    with open(path, "rb") as f:
+        magic, did = struct.unpack("<II", f.read(8))
+    return did if magic == _DICT_MAGIC else 0
+
+
+def _zstd(*args: str) -> None:
+    cmd, preexec = governor.wrap(["zstd", "-q", *args])
+    with profiler.child("zstd"):
+        subprocess.run(cmd, check=True, stdin=subprocess.DEVNULL, preexec_fn=preexec)
+
+
+def collect_samples(app: str, src_dir: pathlib.Path) -> None:
+    """把本次快照的小文件留作训练样本，必要时训练新版本字典"""
+    members = _small_members(src_dir)
+    if not members:
+        return
+    samples = DICT_DIR / app / "samples"
+    dest = samples / f"{time.time_ns()}"
+    dest.mkdir(parents=True)
+    for p in members:
+        shutil.copy2(p, dest / p.name)
+
+    sets = sorted(samples.iterdir())
+    for old in sets[:-SAMPLE_SETS_KEEP]:
+        shutil.rmtree(old, ignore_errors=True)
+
+    state_file = DICT_DIR / app / "state.json"
+    try:
+        state = json.loads(state_file.read_text())
+    except (OSError, ValueError):
+        state = {"since_train": 0}
+    state["since_train"] += 1
+    if state["since_train"] >= TRAIN_EVERY:
+        version = (_versions(app) or [0])[-1] + 1
+        try:
+            _zstd("--train", "-r", str(samples), f"--maxdict={MAX_DICT_SIZE}",
+                  "-o", str(dict_path(app, version)))
+            log.info("已为 %s 训练 zstd 字典 v%d", app, version)
+            state["since_train"] = 0
+        except (subprocess.CalledProcessError, OSError) as e:
+            log.warning("训练 zstd 字典失败 (%s): %s", app, e)
+    state_file.write_text(json.dumps(state))
+
+
+def compress_members(src_dir: pathlib.Path, app: str | None) -> dict:
+    """
+    用应用的最新字典就地压缩 src_dir 中的小镜像（x.img → x.img.zst），
+    返回写入 quicksave.json 的元数据；没有可用字典时返回空字典。
+    """
+    if not app or shutil.which("zstd") is None:
+        return {}
+    versions = _versions(app)
+    members = _small_members(src_dir)
+    if not versions or not members:
+        return {}
+    path = dict_path(app, versions[-1])
+    _zstd("--rm", "-f", "-D", str(path), *map(str, members))
+    shutil.copyfile(path, src_dir / EMBED_NAME)
+    return {
+        "dictionary": {"app": app, "version": versions[-1], "id": dict_id(path)},
+        "dict_members": [p.name for p in members],
+    }
+
+
+def decompress_members(dst_dir: pathlib.Path, meta: dict) -> None:
+    """
+    按 quicksave.json 把字典压缩的小镜像还原，之后删除内嵌的字典并从 quicksave.json
+    中去掉字典信息（目录重新打包时按当时的字典重新压缩）
+    """
+    info = meta.get("dictionary")
+    if not info:
+        return
+    embedded = dst_dir / EMBED_NAME
+    path = _dictionary(info, embedded)
+    files = [str(dst_dir / f"{name}.zst") for name in meta["dict_members"]]
+    _zstd("-d", "--rm", "-f", "-D", str(path), *files)
+    embedded.unlink(missing_ok=True)
+    write_meta(dst_dir, {k: v for k, v in meta.items()
+                         if k not in ("dictionary", "dict_members")})
+
+
+def decompress_blobs(blobs: Dict[str, bytes], meta: dict,
+                     embedded: bytes | None = None) -> Dict[str, bytes]:
+    """
+    在内存中还原用字典压缩的成员（供 inspect 使用），embedded 为快照内嵌的字典。
+    有 zstandard 绑定时字典只加载一次并在进程内解压，否则用一次 zstd 调用解压全部成员。
+    """
+    with tempfile.TemporaryDirectory(prefix="qs_zdict_") as tmp:
+        tmp = pathlib.Path(tmp)
+        copy = None
+        if embedded is not None:
+            copy = tmp / EMBED_NAME
+            copy.write_bytes(embedded)
+        path = _dictionary(meta["dictionary"], copy)
+        if zstandard is not None:
+            dctx = zstandard.ZstdDecompressor(
+                dict_data=zstandard.ZstdCompressionDict(path.read_bytes()))
+            return {name: dctx.decompressobj().decompress(data) for name, data in blobs.items()}
+        files = {name: tmp / f"{i}.zst" for i, name in enumerate(blobs)}
+        for name, f in files.items():
+            f.write_bytes(blobs[name])
+        _zstd("-d", "--rm", "-f", "-D", str(path), *map(str, files.values()))
+        return {name: f.with_suffix("").read_bytes() for name, f in files.items()}
+
+
+def prune(in_use: Dict[str, Set[int]]) -> int:
+    """
+    删除没有快照需要的旧版本字典，in_use 为 应用 → 仍需本机字典的版本；
+    每个应用的最新版本用于压缩新快照，始终保留。返回删除的数量。
+    """
+    if not DICT_DIR.is_dir():
+        return 0
+    removed = 0
+    for base in DICT_DIR.iterdir():
+        for version in _versions(base.name)[:-1]:
+            if version not in in_use.get(base.name, ()):
+                dict_path(base.name, version).unlink(missing_ok=True)
+                log.info("删除不再使用的 zstd 字典 %s v%d", base.name, version)
+                removed += 1
+    return removed
+
+
+def read_meta(image_dir: pathlib.Path) -> dict:
+    try:
+        return json.loads((image_dir / META_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def write_meta(image_dir: pathlib.Path, meta: dict) -> None:
+    (image_dir / META_NAME).write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
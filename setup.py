@@ -9,6 +9,9 @@ setup(
         "psutil>=5.9.0",
         "PyQt6>=6.4.0",
     ],
+    extras_require={
+        "codecs": ["zstandard>=0.16", "lz4>=3.1", "numpy>=1.20"],
+    },
     entry_points={
         "console_scripts": [
             "quicksave=quicksave.core.cli:main",
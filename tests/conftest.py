@@ -0,0 +1,8 @@
+"""
+测试在临时 HOME 中运行：quicksave.core 导入时即创建 ~/.quicksave，
+配置、快照与各类记录都落在这里，不影响真实环境。
+"""
+import os
+import tempfile
+
+os.environ["HOME"] = tempfile.mkdtemp(prefix="qs_test_home_")
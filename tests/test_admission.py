@@ -0,0 +1,81 @@
+import pytest
+
+pytest.importorskip("psutil")
+
+from quicksave.core import admission
+
+# 不存在的 PID：进程树标识退化为 PID 本身
+PIDS = iter(range(4_000_000, 4_100_000))
+
+
+@pytest.fixture
+def tickets():
+    made = []
+
+    def make(priority, pid=None):
+        ticket = admission._Ticket([pid or next(PIDS)], priority)
+        made.append(ticket)
+        return ticket
+
+    yield make
+    for ticket in made:
+        ticket.release()
+
+
+def test_priority_order(tickets):
+    auto = tickets("auto")
+    scheduled = tickets("scheduled")
+    interactive = tickets("interactive")
+    assert not auto.try_admit()
+    assert not scheduled.try_admit()
+    assert interactive.try_admit()
+    assert not auto.try_admit()
+
+    interactive.release()
+    assert not auto.try_admit()
+    assert scheduled.try_admit()
+    scheduled.release()
+    assert auto.try_admit()
+
+
+def test_fifo_within_priority(tickets):
+    first, second = tickets("auto"), tickets("auto")
+    assert not second.try_admit()
+    assert first.try_admit()
+
+
+def test_same_tree_rejected(tickets):
+    ticket = tickets("interactive")
+    with pytest.raises(admission.AdmissionError):
+        tickets("auto", pid=int(ticket.tree_path.stem.split("-")[1]))
+
+
+def test_tree_lock_removed_on_release(tickets):
+    ticket = tickets("interactive")
+    assert ticket.tree_path.exists()
+    ticket.release()
+    assert not ticket.tree_path.exists()
+
+
+def test_dead_ticket_is_skipped(tickets):
+    stale = admission.LOCK_DIR / "queue" / "0-00000000000000000000-1-0.ticket"
+    stale.touch()
+    ticket = tickets("auto")
+    assert ticket.try_admit()
+    assert not stale.exists()
+
+
+def test_lost_ticket_requeued(tickets):
+    ticket = tickets("auto")
+    ticket.ticket_path.unlink()
+    assert not ticket.try_admit()
+    assert ticket.ticket_path.exists()
+    assert ticket.try_admit()
+
+
+def test_idle(tickets):
+    assert admission.idle()
+    ticket = tickets("auto")
+    assert not admission.idle()
+    ticket.release()
+    assert admission.idle()
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("psutil")
+
+from quicksave.core import aio
+from quicksave.utils import fileio
+
+
+@pytest.fixture
+def held(tmp_path):
+    path = tmp_path / "a.qsnap"
+    path.write_bytes(b"")
+    lease = fileio.lease(path, exclusive=True)
+    lease.__enter__()
+    yield path, lease
+    lease.__exit__(None, None, None)
+
+
+def test_lease_waits_off_the_event_loop(held):
+    path, lease = held
+
+    async def main():
+        ticks = 0
+
+        async def take():
+            async with aio._lease(path):
+                return ticks
+
+        task = asyncio.ensure_future(take())
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not task.done()
+        lease.__exit__(None, None, None)
+        assert await asyncio.wait_for(task, 5) == 5
+
+    asyncio.run(main())
+
+
+def test_cancelled_lease_is_released(held):
+    path, lease = held
+
+    async def main():
+        async def take():
+            async with aio._lease(path):
+                pass
+
+        task = asyncio.ensure_future(take())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        lease.__exit__(None, None, None)
+        # 后台线程拿到租约后应立即释放
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            try:
+                with fileio.lease(path, exclusive=True, wait=False):
+                    return
+            except fileio.SnapshotBusy:
+                continue
+        pytest.fail("取消后租约没有释放")
+
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+import fcntl
+import os
+import stat
+
+import pytest
+
+pytest.importorskip("psutil")
+
+from quicksave.core import cache as cache_mod
+from quicksave.core.restore import _extract
+from quicksave.utils.compress import compress_dir
+
+
+def _mode(path):
+    return stat.S_IMODE(path.stat().st_mode)
+
+
+@pytest.fixture
+def qsnap(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "core-1.img").write_bytes(b"core" * 100)
+    (src / "core-1.img").chmod(0o600)
+    out = tmp_path / "a.qsnap"
+    compress_dir(src, out, samples=False)
+    return out
+
+
+def test_hit_does_not_touch_shared_inodes(tmp_path, qsnap):
+    cache = cache_mod.RestoreCache(tmp_path / "cache", 1 << 30)
+    miss = cache.workdir("t_")
+    _extract("restore", qsnap, miss, cache)
+    assert _mode(miss / "core-1.img") == 0o644
+    (entry,) = [p for p in cache.root.iterdir() if p.is_dir() and not p.name.startswith(".")]
+    assert _mode(entry / "core-1.img") == 0o644
+
+    # 命中后镜像与缓存共享 inode，不再修改其权限
+    (entry / "core-1.img").chmod(0o640)
+    hit = cache.workdir("t_")
+    _extract("restore", qsnap, hit, cache)
+    assert os.path.samefile(hit / "core-1.img", entry / "core-1.img")
+    assert _mode(entry / "core-1.img") == 0o640
+
+
+@pytest.mark.parametrize("link", [True, False])
+def test_checkout_links_under_index_lock(tmp_path, qsnap, monkeypatch, link):
+    cache = cache_mod.RestoreCache(tmp_path / "cache", 1 << 30)
+    _extract("restore", qsnap, cache.workdir("t_"), cache)
+    seen = []
+    real = cache_mod._link_tree
+
+    def link_tree(src, dst, link=True):
+        with open(cache.index_file) as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                seen.append(False)
+            except BlockingIOError:
+                seen.append(True)
+        real(src, dst, link)
+
+    monkeypatch.setattr(cache_mod, "_link_tree", link_tree)
+    dst = cache.workdir("t_")
+    assert cache.checkout(qsnap, dst, link=link)
+    assert (dst / "core-1.img").read_bytes() == b"core" * 100
+    # 从缓存条目链接出的第一份在锁内完成；复制模式随后在锁外从固定的副本复制
+    assert seen[0] is True
+    assert seen == ([True] if link else [True, False])
+    assert not list(cache.root.glob("*_pin_*"))
@@ -0,0 +1,28 @@
+import io
+
+import pytest
+
+from quicksave.utils import codecs, governor
+
+
+@pytest.mark.parametrize("allowed", [True, False])
+def test_get_respects_governor(monkeypatch, allowed):
+    impls = [c for c in codecs._REGISTRY["zstd"] if c.available()]
+    if len({c.in_process for c in impls}) < 2:
+        pytest.skip("需要同时有 zstandard 与 zstd 命令")
+    monkeypatch.setattr(governor, "in_process_allowed", lambda: allowed)
+    assert codecs.get("zstd").in_process is allowed
+    assert codecs.get("none").name == "none"
+
+
+@pytest.mark.parametrize("name", ["zstd", "lz4", "none"])
+def test_round_trip(name):
+    if name not in codecs.available():
+        pytest.skip(f"{name} 不可用")
+    data = b"quicksave" * 100_000
+    packed, out = io.BytesIO(), io.BytesIO()
+    codec = codecs.get(name)
+    codec.compress(io.BytesIO(data), packed, codecs.DEFAULT_LEVELS[name])
+    packed.seek(0)
+    codec.decompress(packed, out)
+    assert out.getvalue() == data
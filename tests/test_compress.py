@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from quicksave.utils import sparse
+from quicksave.utils.compress import (REFS_DIRNAME, compress_dir, decompress_file,
+                                      read_snapshot_header)
+
+PAGE = sparse.PAGE
+HOLE = sparse.MIN_HOLE
+
+
+def _images(root, seed=b""):
+    root.mkdir()
+    (root / "pages-1.img").write_bytes(os.urandom(PAGE) + bytes(HOLE) + os.urandom(PAGE) + seed)
+    (root / "pages-2.img").write_bytes(bytes(4 * HOLE))
+    (root / "core-1.img").write_bytes(b"core" * 100)
+    (root / "inventory.img").write_bytes(b"inventory")
+    return root
+
+
+def _same_tree(a, b):
+    names = sorted(p.relative_to(a) for p in a.rglob("*") if p.is_file())
+    assert names == sorted(p.relative_to(b) for p in b.rglob("*") if p.is_file())
+    for name in names:
+        assert (a / name).read_bytes() == (b / name).read_bytes(), name
+
+
+def test_round_trip_elides_zero_pages(tmp_path):
+    src = _images(tmp_path / "src")
+    qsnap = tmp_path / "a.qsnap"
+    compress_dir(src, qsnap, samples=False)
+
+    members = read_snapshot_header(qsnap)["members"]
+    assert members["pages-1.img"]["extents"] == [[0, PAGE], [PAGE + HOLE, PAGE]]
+    # 全零的页镜像记录为空区间表，而不是整段保存
+    assert members["pages-2.img"]["extents"] == []
+
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    decompress_file(qsnap, dst)
+    _same_tree(src, dst)
+    # 零页还原为空洞
+    assert os.stat(dst / "pages-2.img").st_blocks == 0
+
+
+def test_delta_round_trip(tmp_path):
+    src = _images(tmp_path / "base_src")
+    base = tmp_path / "app_1.qsnap"
+    compress_dir(src, base, samples=False)
+
+    # 第二次 dump：页镜像只有少量变化，另有一个新镜像
+    pages = bytearray((src / "pages-1.img").read_bytes())
+    pages[10:20] = b"x" * 10
+    (src / "pages-1.img").write_bytes(bytes(pages))
+    (src / "pages-3.img").write_bytes(os.urandom(PAGE))
+    delta = tmp_path / "app_2.qsnap"
+    compress_dir(src, delta, samples=False, ref=base)
+
+    header = read_snapshot_header(delta)
+    base_header = read_snapshot_header(base)
+    assert header["ref"] == {"name": base.name, "id": base_header["id"]}
+    assert header["id"] != base_header["id"]
+    assert header["members"]["pages-1.img"].get("delta")
+    assert not header["members"]["pages-3.img"].get("delta")   # 参考中没有的成员完整保存
+    assert "extents" in header["members"]["pages-2.img"]
+
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    decompress_file(delta, dst)
+    _same_tree(src, dst)
+
+
+def test_delta_needs_matching_reference(tmp_path):
+    src = _images(tmp_path / "src")
+    base = tmp_path / "app_1.qsnap"
+    compress_dir(src, base, samples=False)
+    delta = tmp_path / "app_2.qsnap"
+    compress_dir(src, delta, samples=False, ref=base)
+
+    # 删除时参考快照移入 .refs/，仍可找到
+    refs = tmp_path / REFS_DIRNAME
+    refs.mkdir()
+    base.rename(refs / base.name)
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    decompress_file(delta, dst)
+    _same_tree(src, dst)
+
+    # 同名但 id 不同的快照不能作为参考
+    compress_dir(src, base, samples=False)
+    (refs / base.name).unlink()
+    again = tmp_path / "again"
+    again.mkdir()
+    with pytest.raises(FileNotFoundError):
+        decompress_file(delta, again)
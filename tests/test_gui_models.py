@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+pytest.importorskip("psutil")
+QtCore = pytest.importorskip("PyQt6.QtCore")
+QtTest = pytest.importorskip("PyQt6.QtTest")
+
+from quicksave.gui.process_model import COL_CHECK, ProcessTableModel
+from quicksave.gui.snapshot_model import COL_STATE, SnapshotTableModel
+
+Qt = QtCore.Qt
+
+
+@pytest.fixture(scope="module", autouse=True)
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+@pytest.fixture
+def qt_warnings():
+    """收集 Qt 警告；QAbstractItemModelTester 以警告报告不一致"""
+    messages = []
+
+    def handler(mode, _context, message):
+        if mode != QtCore.QtMsgType.QtDebugMsg:
+            messages.append(message)
+    previous = QtCore.qInstallMessageHandler(handler)
+    yield messages
+    QtCore.qInstallMessageHandler(previous)
+    assert messages == []
+
+
+def _checked(model):
+    # 每次结构变化都由 QAbstractItemModelTester 校验行号与信号是否一致
+    return QtTest.QAbstractItemModelTester(
+        model, QtTest.QAbstractItemModelTester.FailureReportingMode.Warning)
+
+
+# ---------- 进程列表 ----------
+def _pids(model):
+    return [model.pid_at(r) for r in range(model.rowCount())]
+
+
+def test_process_diff_add_update_remove(qt_warnings):
+    model = ProcessTableModel()
+    tester = _checked(model)
+    model.apply_diff([(p, f"p{p}", p * 1024, 0.0) for p in range(1, 8)], [], [])
+    assert _pids(model) == [1, 2, 3, 4, 5, 6, 7]
+
+    model.set_checked([2, 3, 6], True)
+    # 不相邻的多段一起删除，其余行顺序不变
+    model.apply_diff([], [], [2, 3, 6, 42])
+    assert _pids(model) == [1, 4, 5, 7]
+    assert model.checked == set()
+    assert model._index == {1: 0, 4: 1, 5: 2, 7: 3}
+
+    model.apply_diff([(9, "p9", 0, 0.0)], [(5, "renamed", 1, 50.0), (100, "gone", 0, 0.0)], [])
+    assert _pids(model) == [1, 4, 5, 7, 9]
+    assert model.name_at(2) == "renamed"
+    assert model.data(model.index(2, COL_CHECK), Qt.ItemDataRole.CheckStateRole) \
+        == Qt.CheckState.Unchecked
+    del tester
+
+
+def test_process_updates_emit_only_changed_range():
+    model = ProcessTableModel()
+    model.apply_diff([(p, "x", 0, 0.0) for p in range(10)], [], [])
+    seen = []
+    model.dataChanged.connect(lambda tl, br, roles=None: seen.append((tl.row(), br.row())))
+    model.apply_diff([], [(3, "y", 0, 0.0), (5, "y", 0, 0.0)], [])
+    assert seen == [(3, 5)]
+
+
+# ---------- 快照列表 ----------
+def _names(model):
+    return [model.index(r, 0).data() for r in range(model.rowCount())]
+
+
+def test_snapshot_apply_diff(tmp_path, qt_warnings):
+    hot, cold = tmp_path / "hot", tmp_path / "cold"
+    hot.mkdir()
+    cold.mkdir()
+    model = SnapshotTableModel([hot, cold])
+    tester = _checked(model)
+
+    model._apply({"b.qsnap": hot, "a.qsnap": hot, "hibernate-7.qsnap": hot})
+    assert _names(model) == ["a.qsnap", "b.qsnap", "hibernate-7.qsnap"]
+    assert model.index(2, COL_STATE).data() == "休眠"
+
+    inserted = []
+    model.rowsInserted.connect(lambda _p, first, last: inserted.append((first, last)))
+    model._apply({"a.qsnap": hot, "c.qsnap": hot, "hibernate-7.qsnap": hot})
+    assert _names(model) == ["a.qsnap", "hibernate-7.qsnap", "c.qsnap"]
+    assert inserted == [(2, 2)]                  # 已有的行不重建
+
+    # 移到冷层：行保持不变，只更新状态
+    model._apply({"a.qsnap": cold, "c.qsnap": hot, "hibernate-7.qsnap": hot})
+    assert _names(model) == ["a.qsnap", "hibernate-7.qsnap", "c.qsnap"]
+    assert model.index(0, COL_STATE).data() == "冷层"
+    assert model.index(2, COL_STATE).data() == "就绪"
+
+    model._apply({})
+    assert model.rowCount() == 0
+    del tester
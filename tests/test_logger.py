@@ -0,0 +1,35 @@
+import json
+import logging
+import sys
+
+from quicksave.utils import logger
+
+
+def _through_queue(record):
+    return logger._qh.prepare(record)
+
+
+def _record(msg, *args, exc=False):
+    exc_info = None
+    if exc:
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            exc_info = sys.exc_info()
+    return logging.LogRecord("quicksave", logging.ERROR, __file__, 1, msg, args, exc_info)
+
+
+def test_json_keeps_exception_separate():
+    record = _through_queue(_record("压缩 %s 失败", "a.qsnap", exc=True))
+    assert record.msg == "压缩 %s 失败" and record.args == ("a.qsnap",)
+    assert record.exc_info is None
+    entry = json.loads(logger.JsonFormatter().format(record))
+    assert entry["msg"] == "压缩 a.qsnap 失败"
+    assert "ValueError: boom" in entry["exc"]
+    assert "Traceback" not in entry["msg"]
+
+
+def test_text_still_shows_traceback():
+    record = _through_queue(_record("失败", exc=True))
+    text = logger._TextFormatter("%(ctx)s%(message)s").format(record)
+    assert text.startswith("失败\n") and "ValueError: boom" in text
@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+pytest.importorskip("psutil")
+
+from quicksave.core import outcomes
+
+CRIU_LOG = """\
+(00.001) Version: 3.17
+(00.120) Warn  (criu/files.c:418): Skipping unsupported fd 7
+(00.121) Error (criu/sk-unix.c:734): Unix socket 0x3f2a1 is in bad state 7 (peer 1234)
+(00.122) Error (criu/cr-dump.c:1830): Dumping FAILED.
+"""
+
+
+@pytest.fixture(autouse=True)
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(outcomes, "DB_FILE", tmp_path / "compat.json")
+
+
+def _prof(key="app@1", heuristic_ok=True):
+    return {"key": key, "exe": "/usr/bin/app", "version": "1",
+            "features": ["x11=False", "ipc=0-10"], "heuristic_ok": heuristic_ok}
+
+
+def test_signature_first_error_normalized():
+    assert outcomes.signature(CRIU_LOG) == "sk-unix.c: Unix socket X is in bad state N (peer N)"
+    assert outcomes.signature(CRIU_LOG.encode()) == outcomes.signature(CRIU_LOG)
+
+
+def test_signature_same_class_same_signature():
+    other = CRIU_LOG.replace("0x3f2a1", "0x99").replace("peer 1234", "peer 55")
+    assert outcomes.signature(other) == outcomes.signature(CRIU_LOG)
+
+
+def test_signature_fallback_and_empty():
+    assert outcomes.signature("criu: exited with 127\n") == "criu: exited with N"
+    assert outcomes.signature("") is None
+    assert outcomes.signature(None) is None
+
+
+def test_predict_without_history_uses_heuristic():
+    assert outcomes.predict(_prof(heuristic_ok=True))["probability"] == pytest.approx(0.8)
+    assert outcomes.predict(_prof(heuristic_ok=False))["probability"] == pytest.approx(0.4)
+    assert outcomes.predict(_prof())["samples"] == 0
+
+
+def test_predict_learns_from_outcomes():
+    prof = _prof()
+    outcomes.record("dump", True, prof, snapshot="a.qsnap")
+    for _ in range(5):
+        outcomes.record("verify", False, snapshot="a.qsnap", error=CRIU_LOG)
+    pred = outcomes.predict(prof)
+    assert pred["samples"] == 5
+    assert pred["probability"] < 0.2
+    assert pred["errors"] == [outcomes.signature(CRIU_LOG)]
+
+    for _ in range(10):
+        outcomes.record("restore", True, snapshot="a.qsnap")
+    assert outcomes.predict(prof)["probability"] > 0.5
+
+
+def test_feature_history_shifts_prior_for_unseen_app():
+    for _ in range(10):
+        outcomes.record("verify", False, _prof("other@1"), error=CRIU_LOG)
+    pred = outcomes.predict(_prof("new@1"))
+    assert pred["samples"] == 0
+    assert pred["prior"] < 0.8
+
+
+def test_successful_dumps_do_not_use_window(monkeypatch):
+    monkeypatch.setitem(outcomes.DEFAULTS, "window", 3)
+    prof = _prof()
+    for _ in range(3):
+        outcomes.record("verify", False, prof)
+    for i in range(10):
+        outcomes.record("dump", True, prof, snapshot=f"{i}.qsnap")
+    assert outcomes.predict(prof)["samples"] == 3
+
+
+def test_gate_skips_then_retries(monkeypatch):
+    prof = _prof(heuristic_ok=False)
+    monkeypatch.setattr(outcomes, "profile", lambda pids: prof)
+    assert outcomes.gate([1], "scheduled") == "scheduled"
+    for _ in range(6):
+        outcomes.record("verify", False, prof, error=CRIU_LOG)
+    assert outcomes.gate([1], "scheduled") is None
+
+    # 超过 retry_after 没有新结果：放行一次试探，随后继续跳过
+    monkeypatch.setitem(outcomes.DEFAULTS, "retry_after", 60)
+    later = time.time() + 120
+    monkeypatch.setattr(outcomes.time, "time", lambda: later)
+    assert outcomes.gate([1], "scheduled") == "auto"
+    assert outcomes.gate([1], "scheduled") is None
+
+
+def test_gate_deprioritizes(monkeypatch):
+    prof = _prof()
+    monkeypatch.setattr(outcomes, "profile", lambda pids: prof)
+    for ok in (True, False, False, False):
+        outcomes.record("verify", ok, prof)
+    assert outcomes.gate([1], "interactive") == "auto"
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setitem(outcomes.DEFAULTS, "enabled", False)
+    outcomes.record("verify", False, _prof())
+    assert not outcomes.DB_FILE.exists()
+    assert outcomes.gate([1], "scheduled") == "scheduled"
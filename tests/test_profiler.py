@@ -0,0 +1,63 @@
+import threading
+import tracemalloc
+
+import pytest
+
+from quicksave.utils import profiler
+
+
+@pytest.fixture(autouse=True)
+def profiling(tmp_path, monkeypatch):
+    monkeypatch.setenv(profiler.ENV_VAR, "1")
+    monkeypatch.setattr(profiler, "PROFILE_DIR", tmp_path / "profiles")
+    assert not tracemalloc.is_tracing()
+    yield tmp_path / "profiles"
+    assert not tracemalloc.is_tracing()
+
+
+def test_overlapping_sessions_share_tracemalloc(profiling):
+    first_in, second_done = threading.Event(), threading.Event()
+    errors = []
+
+    def first():
+        try:
+            with profiler.profile_op("first"):
+                first_in.set()
+                assert second_done.wait(5)
+                # 第二个会话已结束，tracemalloc 仍须在运行
+                assert tracemalloc.is_tracing()
+                bytearray(1 << 16)
+        except BaseException as e:      # 线程里的断言失败交回主线程
+            errors.append(e)
+
+    t = threading.Thread(target=first)
+    t.start()
+    assert first_in.wait(5)
+    with profiler.profile_op("second"):
+        assert tracemalloc.is_tracing()
+    second_done.set()
+    t.join(5)
+
+    assert not errors
+    names = sorted(p.name.split("-")[1] for p in profiling.glob("*.txt"))
+    assert names == ["first", "second"]
+
+
+def test_stop_failure_is_not_fatal(profiling, monkeypatch):
+    def boom(self):
+        if self.main is not None:
+            self.main.disable()
+        profiler._trace_release()
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(profiler._Session, "stop", boom)
+    with profiler.profile_op("op"):
+        pass
+    assert profiler._active.get() is None
+    assert not list(profiling.glob("*.txt"))
+
+
+def test_tracemalloc_stopped_elsewhere(profiling):
+    with profiler.profile_op("op"):
+        tracemalloc.stop()
+    assert len(list(profiling.glob("*.txt"))) == 1
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from quicksave.utils import sparse
+
+PAGE = sparse.PAGE
+HOLE_PAGES = sparse.MIN_HOLE // PAGE
+
+
+def _image(tmp_path, pages, tail=b""):
+    """pages 中 True 为零页，False 为数据页"""
+    path = tmp_path / "pages-1.img"
+    with open(path, "wb") as f:
+        for zero in pages:
+            f.write(bytes(PAGE) if zero else os.urandom(PAGE))
+        f.write(tail)
+    return path
+
+
+def _extents(path):
+    with open(path, "rb") as f:
+        return sparse.data_extents(f)
+
+
+def test_all_data(tmp_path):
+    path = _image(tmp_path, [False] * 40)
+    assert _extents(path) == [(0, 40 * PAGE)]
+
+
+def test_all_zero_is_empty(tmp_path):
+    path = _image(tmp_path, [True] * 40)
+    assert _extents(path) == []
+    assert sparse.saved_bytes([], 40 * PAGE) == 40 * PAGE
+
+
+def test_small_file_kept_whole(tmp_path):
+    path = _image(tmp_path, [True] * 2)
+    assert _extents(path) == [(0, 2 * PAGE)]
+
+
+def test_short_zero_runs_not_elided(tmp_path):
+    pages = [False] * 10 + [True] * (HOLE_PAGES - 1) + [False] * 10
+    assert _extents(_image(tmp_path, pages)) == [(0, len(pages) * PAGE)]
+
+
+def test_holes_and_tail(tmp_path):
+    pages = [False] * 3 + [True] * HOLE_PAGES + [False] * 2 + [True] * (HOLE_PAGES + 5)
+    path = _image(tmp_path, pages, tail=b"tail")
+    size = len(pages) * PAGE + 4
+    assert _extents(path) == [(0, 3 * PAGE),
+                              ((3 + HOLE_PAGES) * PAGE, 2 * PAGE),
+                              (size - 4, 4)]
+    assert sparse.saved_bytes(_extents(path), size) == size - 5 * PAGE - 4
+
+
+@pytest.mark.parametrize("zero", [
+    [],
+    [True],
+    [False, True, True, False, True],
+    [True] * 7 + [False] * 3 + [True] * 2,
+])
+def test_zero_runs_numpy_matches_bytes(zero):
+    numpy = pytest.importorskip("numpy")
+    assert sparse._zero_runs_numpy(numpy.array(zero, dtype=bool)) == sparse._zero_runs_bytes(zero)
+
+
+def test_extent_reader_writer_round_trip(tmp_path):
+    pages = [False] + [True] * HOLE_PAGES + [False]
+    src = _image(tmp_path, pages, tail=b"xyz")
+    extents = _extents(src)
+    with open(src, "rb") as f:
+        reader = sparse.ExtentReader(f, extents)
+        stream = b"".join(iter(lambda: reader.read(1000), b""))
+    assert len(stream) == sum(length for _off, length in extents)
+
+    dst = tmp_path / "out.img"
+    with open(dst, "wb") as out:
+        writer = sparse.ExtentWriter(out, extents, src.stat().st_size)
+        writer.write(stream)
+        writer.close()
+    assert dst.read_bytes() == src.read_bytes()
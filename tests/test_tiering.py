@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+pytest.importorskip("psutil")
+
+from quicksave.core import QS_DIR, tiering
+from quicksave.utils import fileio
+from quicksave.utils.compress import compress_dir, read_snapshot_header
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    src = tmp_path / "images"
+    src.mkdir()
+    (src / "pages-1.img").write_bytes(os.urandom(8192) * 4)
+    (src / "core-1.img").write_bytes(b"core" * 64)
+    path = QS_DIR / "tier_test.qsnap"
+    compress_dir(src, path, samples=False)
+    yield src, path
+    for p in QS_DIR.glob("tier_*.qsnap"):
+        p.unlink()
+
+
+def _cfg(cold=""):
+    return dict(tiering.DEFAULTS, codec="zstd", level=3, dir=str(cold))
+
+
+def test_demote_keeps_id(snapshot, tmp_path):
+    _src, path = snapshot
+    before = read_snapshot_header(path)["id"]
+    target = tiering.demote(path, _cfg(tmp_path / "cold"))
+    assert not path.exists()
+    header = read_snapshot_header(target)
+    assert header["id"] == before
+    assert header["tier"] == tiering.TIER_COLD
+
+
+def test_demote_aborts_when_referenced(snapshot, tmp_path):
+    src, path = snapshot
+    delta = QS_DIR / "tier_delta.qsnap"
+    compress_dir(src, delta, samples=False, ref=path)
+    assert read_snapshot_header(delta)["ref"]["name"] == path.name
+    with pytest.raises(fileio.SnapshotBusy):
+        tiering.demote(path, _cfg(tmp_path / "cold"))
+    assert path.exists()
+    assert read_snapshot_header(path)["tier"] == tiering.TIER_HOT
+    assert not list((tmp_path / "cold").glob(".*.tier"))
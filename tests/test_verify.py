@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("psutil")
+
+from quicksave.core import verify
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(verify, "VERDICT_FILE", tmp_path / "verdicts.json")
+    path = tmp_path / "a.qsnap"
+    path.write_bytes(b"snapshot")
+    return path
+
+
+def _run(monkeypatch, snapshot, ok):
+    calls = []
+
+    def fake(path, isolate):
+        calls.append(path)
+        return ok
+    monkeypatch.setattr(verify, "verify_only", fake)
+    result = verify.verify_many([snapshot], jobs=1)[0]
+    return result, calls
+
+
+def test_success_is_cached(monkeypatch, snapshot):
+    result, calls = _run(monkeypatch, snapshot, True)
+    assert result["ok"] and not result["cached"] and calls
+    result, calls = _run(monkeypatch, snapshot, True)
+    assert result["ok"] and result["cached"] and not calls
+
+
+def test_failure_is_not_cached(monkeypatch, snapshot):
+    result, calls = _run(monkeypatch, snapshot, False)
+    assert not result["ok"] and calls
+    result, calls = _run(monkeypatch, snapshot, True)
+    assert result["ok"] and not result["cached"] and calls
+
+
+def test_failure_drops_previous_success(monkeypatch, snapshot):
+    _run(monkeypatch, snapshot, True)
+    monkeypatch.setattr(verify, "verify_only", lambda path, isolate: False)
+    assert not verify.verify_many([snapshot], force=True)[0]["ok"]
+    result, calls = _run(monkeypatch, snapshot, True)
+    assert not result["cached"] and calls
@@ -0,0 +1,113 @@
+import os
+import shutil
+
+import pytest
+
+if shutil.which("zstd") is None:
+    pytest.skip("需要 zstd 命令行工具", allow_module_level=True)
+
+from quicksave.utils import zdict
+from quicksave.utils.compress import compress_dir, decompress_file, read_snapshot_header
+
+APP = "app-0123456789"
+
+
+@pytest.fixture(autouse=True)
+def dict_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(zdict, "DICT_DIR", tmp_path / "dicts")
+    return tmp_path / "dicts"
+
+
+def _train(version):
+    samples = zdict.DICT_DIR / APP / "samples"
+    samples.mkdir(parents=True, exist_ok=True)
+    for i in range(200):
+        (samples / f"core-{i}.img").write_bytes(b"core entry %d " % i * 40 + os.urandom(16))
+    zdict._zstd("--train", "-r", str(samples), "--maxdict=8192",
+                "-o", str(zdict.dict_path(APP, version)))
+
+
+def _images(root):
+    root.mkdir()
+    (root / "pages-1.img").write_bytes(os.urandom(8192))
+    for pid in (1, 2):
+        (root / f"core-{pid}.img").write_bytes(b"core entry %d " % pid * 50)
+    return {p.name: p.read_bytes() for p in root.iterdir()}
+
+
+def test_dictionary_travels_with_snapshot(tmp_path, dict_dir):
+    _train(1)
+    original = _images(tmp_path / "src")
+    qsnap = tmp_path / "a.qsnap"
+    compress_dir(tmp_path / "src", qsnap, app=APP, samples=False)
+    members = read_snapshot_header(qsnap)["members"]
+    assert "core-1.img.zst" in members and zdict.EMBED_NAME in members
+
+    # 复制到没有本机字典的环境
+    shutil.rmtree(dict_dir)
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    decompress_file(qsnap, dst)
+    for name, data in original.items():
+        assert (dst / name).read_bytes() == data, name
+    assert not (dst / zdict.EMBED_NAME).exists()
+    assert "dictionary" not in zdict.read_meta(dst)
+
+
+def test_local_dictionary_fallback_checks_id(tmp_path):
+    _train(1)
+    path = zdict.dict_path(APP, 1)
+    info = {"app": APP, "version": 1, "id": zdict.dict_id(path)}
+    bogus = tmp_path / "bogus.zdict"
+    bogus.write_bytes(b"\x37\xa4\x30\xec" + (info["id"] + 1).to_bytes(4, "little"))
+    assert zdict._dictionary(info, bogus) == path
+    path.unlink()
+    with pytest.raises(FileNotFoundError):
+        zdict._dictionary(info, bogus)
+
+
+def test_prune_keeps_latest_and_used_versions():
+    base = zdict.DICT_DIR / APP
+    base.mkdir(parents=True)
+    for v in (1, 2, 3, 4):
+        zdict.dict_path(APP, v).write_bytes(b"")
+    assert zdict.prune({APP: {2}}) == 2
+    assert zdict._versions(APP) == [2, 4]
+
+
+def test_in_use_only_counts_snapshots_without_embedded_copy(tmp_path):
+    pytest.importorskip("psutil")
+    from quicksave.core import QS_DIR, dicts
+
+    _train(1)
+    _images(tmp_path / "new")
+    compress_dir(tmp_path / "new", QS_DIR / "new.qsnap", app=APP, samples=False)
+    # 内嵌字典之前写出的快照
+    _images(tmp_path / "old")
+    zdict.write_meta(tmp_path / "old", zdict.compress_members(tmp_path / "old", APP))
+    (tmp_path / "old" / zdict.EMBED_NAME).unlink()
+    compress_dir(tmp_path / "old", QS_DIR / "old.qsnap", samples=False)
+    try:
+        assert dicts.in_use() == {APP: {1}}
+        (QS_DIR / "old.qsnap").unlink()
+        assert dicts.in_use() == {}
+    finally:
+        for name in ("new.qsnap", "old.qsnap"):
+            (QS_DIR / name).unlink(missing_ok=True)
+
+
+@pytest.mark.parametrize("in_process", [True, False])
+def test_decompress_blobs(tmp_path, monkeypatch, in_process):
+    if in_process:
+        pytest.importorskip("zstandard")
+    else:
+        monkeypatch.setattr(zdict, "zstandard", None)
+    _train(1)
+    original = _images(tmp_path / "src")
+    meta = zdict.compress_members(tmp_path / "src", APP)
+    embedded = (tmp_path / "src" / zdict.EMBED_NAME).read_bytes()
+    blobs = {name: (tmp_path / "src" / f"{name}.zst").read_bytes()
+             for name in meta["dict_members"]}
+    shutil.rmtree(zdict.DICT_DIR)
+    out = zdict.decompress_blobs(blobs, meta, embedded)
+    assert out == {name: original[name] for name in meta["dict_members"]}